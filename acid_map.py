@@ -1,8 +1,7 @@
+from knowledge_base import get_knowledge_base
+
+NO_ACIDS = ("No specific acids found",)
+
 def get_acids_for_skin_problem(skin_problem):
-    acids = {
-        "acne": ["Salicylic Acid", "Niacinamide", "Tea Tree Oil"],
-        "pigmentation": ["Kojic Acid", "Glycolic Acid", "Alpha Arbutin"],
-        "wrinkles": ["Retinol", "Peptides", "Hyaluronic Acid"],
-        "dark spots": ["Vitamin C", "Tranexamic Acid", "Licorice Extract"]
-    }
-    return acids.get(skin_problem.lower(), ["No specific acids found"])
+    entry = get_knowledge_base().get(skin_problem)
+    return entry["acids"] if entry is not None else NO_ACIDS
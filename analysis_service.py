@@ -0,0 +1,152 @@
+# app/analysis_service.py
+#
+# The classification + recommendation path shared by the Streamlit app and the
+# HTTP API (api_server.py): one registry-loaded model per process, micro-batched
+# across concurrent requests, the inference cache and the product ranking.
+#
+#   service = AnalysisService("torch", "D:/Aura_derm/models/skin_classifier.pth", "skin_classifier")
+#   result = service.classify(upload_bytes)              # InferenceResult
+#   service.analyze(upload_bytes, skin_type="oily")      # JSON-ready dict
+
+import os
+
+import numpy as np
+
+from batch_scheduler import get_batcher
+from capabilities import get_capabilities
+from inference_cache import get_inference_cache
+from knowledge_base import lookup, thaw
+from model_registry import get_registry
+from preprocess import prepare_upload, to_model_input
+from product_ranker import get_catalog
+from constants import CLASS_NAMES
+from tracing import span
+
+
+class AnalysisService:
+    """
+    backend is "torch" (weights_path is a .pth, optionally optimized with
+    inference_mode) or "onnx" (weights_path is an exported .onnx model).
+    Nothing heavy is imported until the model is first needed.
+    """
+
+    def __init__(self, backend, weights_path, registry_key, arch="resnet18", inference_mode="fp32",
+                 calibration_dir=None, class_names=CLASS_NAMES, catalog_path=None, decode_tier="balanced",
+                 batch_max_size=16, batch_max_wait_ms=10.0, batch_max_queue=256):
+        self.backend = backend
+        self.capability = "torch" if backend == "torch" else "onnxruntime"
+        self.weights_path = weights_path
+        self.registry_key = registry_key
+        self.arch = arch
+        self.inference_mode = inference_mode
+        self.calibration_dir = calibration_dir
+        self.class_names = list(class_names)
+        self.catalog_path = catalog_path
+        self.decode_tier = decode_tier
+        self.batch_settings = {
+            "max_batch_size": batch_max_size,
+            "max_wait_ms": batch_max_wait_ms,
+            "max_queue": batch_max_queue,
+        }
+
+    # === Model ===
+
+    def installed(self):
+        """True if the backend package is installed (checked without importing it)."""
+        return get_capabilities().installed(self.capability)
+
+    def ready(self):
+        return self.installed() and os.path.exists(self.weights_path)
+
+    def model_entry(self):
+        """Registry entry for the model; imports the backend and loads the weights on the first call."""
+        if self.backend == "torch":
+            from inference_modes import make_loader
+            return get_registry().get(self.registry_key, self.weights_path,
+                                      loader=make_loader(self.inference_mode, self.calibration_dir, self.arch))
+        from onnx_backend import load_onnx_classifier
+        return get_registry().get(self.registry_key, self.weights_path, loader=load_onnx_classifier,
+                                  warmup_shape=None)
+
+    def loaded_stats(self):
+        """Stats of the model if it is already loaded; never loads it."""
+        return get_registry().stats().get(self.registry_key)
+
+    def prewarm(self):
+        if self.ready():
+            self.model_entry()
+
+    def batcher(self):
+        """
+        The micro-batcher for this service's model, shared by every service in
+        the process with the same backend, registry key and weights.
+        """
+        key = (self.backend, self.registry_key, self.weights_path)
+        return get_batcher(lambda: self.model_entry().model, key=key, **self.batch_settings)
+
+    def infer_array(self, model_array):
+        """(logits, probabilities) for a 224px uint8 array, without the inference cache (e.g. video frames)."""
+        with span("transform"):
+            model_input = to_model_input(model_array)
+            if self.backend == "torch":
+                torch = get_capabilities().load("torch")
+                model_input = torch.from_numpy(model_input)
+        # Batched with concurrent sessions / requests by the shared background worker
+        with span("model"):
+            logits = self.batcher().infer(model_input)
+        if self.backend == "torch":
+            return logits.numpy(), torch.softmax(logits, dim=0).numpy()
+        from onnx_backend import softmax_numpy
+        return logits, softmax_numpy(logits)
+
+    def classify(self, data, model_array=None):
+        """
+        InferenceResult for the image bytes. model_array is the 224px uint8
+        array if the caller already decoded the upload; otherwise it is decoded
+        here only when the result is not cached.
+        """
+        with span("model.load"):
+            entry = self.model_entry()
+
+        def run_model():
+            array = model_array
+            if array is None:
+                with span("decode"):
+                    array = prepare_upload(data, tier=self.decode_tier).model_array
+            return self.infer_array(array)
+
+        # One forward pass per (image, model version)
+        with span("inference"):
+            return get_inference_cache().get_or_compute(data, entry.version, run_model)
+
+    # === Recommendations ===
+
+    def catalog(self):
+        with span("recommend.catalog"):
+            return get_catalog(self.catalog_path, self.class_names)
+
+    def recommend(self, probabilities, k=4, **filters):
+        """Products ranked on the full probability vector, plus the top class's acids and diet."""
+        predicted_class = self.class_names[int(np.argmax(probabilities))]
+        with span("recommend.lookup"):
+            recommendations = lookup(predicted_class)
+        catalog = self.catalog()
+        with span("recommend.rank"):
+            products = catalog.recommend(probabilities, k=k, **filters)
+        return {
+            "predicted_class": predicted_class,
+            "products": products,
+            "acids": recommendations["acids"],
+            "diet": recommendations["diet"],
+        }
+
+    def analyze(self, data, k=4, **filters):
+        """classify() + recommend() as a JSON-ready dict."""
+        result = self.classify(data)
+        probabilities = result.probabilities.tolist()
+        analysis = thaw(self.recommend(probabilities, k, **filters))
+        analysis["probabilities"] = {
+            name: round(float(p), 4) for name, p in zip(self.class_names, probabilities)
+        }
+        analysis["model_version"] = result.model_version
+        return analysis
@@ -0,0 +1,117 @@
+# app/api_loadtest.py
+#
+# Closed-loop load test for api_server.py using only the standard library:
+# `concurrency` clients each send their next request as soon as the previous
+# one returns.
+#
+#   python api_server.py --port 8000 --workers 2 &
+#   python api_loadtest.py --url http://127.0.0.1:8000 --image face.jpg --concurrency 16 --requests 500
+#   python api_loadtest.py --image face.jpg --batch 8 --unique     # batch endpoint, no inference cache hits
+#
+# --unique appends a few random bytes after the image data, which decoders
+# ignore but which changes the content hash, so every request runs the model.
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def multipart_body(field, files):
+    """(body, content_type) for a multipart/form-data upload of (filename, bytes) pairs under `field`."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode("utf-8")
+        )
+        parts.append(data)
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def run(url, image, concurrency=8, requests=200, batch=1, unique=False, query="", timeout=60.0):
+    with open(image, "rb") as f:
+        data = f.read()
+    filename = os.path.basename(image)
+    if batch > 1:
+        endpoint, field = f"{url.rstrip('/')}/v1/analyze/batch", "images"
+    else:
+        endpoint, field = f"{url.rstrip('/')}/v1/analyze", "image"
+    if query:
+        endpoint += "?" + query
+
+    def one(_):
+        files = [(filename, data + os.urandom(8) if unique else data) for _ in range(batch)]
+        body, content_type = multipart_body(field, files)
+        request = urllib.request.Request(endpoint, data=body, headers={"Content-Type": content_type})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as exc:
+            status = exc.code
+        except (urllib.error.URLError, OSError) as exc:
+            status = type(exc).__name__
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(str(status) for status, _ in results)
+    ok_ms = np.array([seconds for status, seconds in results if status == 200]) * 1000.0
+    ok = len(ok_ms)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "images_per_request": batch,
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_s": round(ok / elapsed, 2),
+        "images_per_s": round(ok * batch / elapsed, 2),
+        "statuses": dict(statuses),
+        "latency_ms_p50": round(float(np.percentile(ok_ms, 50)), 2) if ok else None,
+        "latency_ms_p95": round(float(np.percentile(ok_ms, 95)), 2) if ok else None,
+        "latency_ms_p99": round(float(np.percentile(ok_ms, 99)), 2) if ok else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Aura Derm HTTP API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--image", required=True)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1, help="Images per request (>1 uses /v1/analyze/batch)")
+    parser.add_argument("--unique", action="store_true", help="Make every upload unique to bypass the inference cache")
+    parser.add_argument("--query", default="", help="Extra query string, e.g. 'skin_type=oily&k=8'")
+    args = parser.parse_args(argv)
+
+    try:
+        with urllib.request.urlopen(f"{args.url.rstrip('/')}/health", timeout=10) as response:
+            health = json.loads(response.read())
+    except (urllib.error.URLError, OSError) as exc:
+        print(f"❌ API not reachable at {args.url}: {exc}", file=sys.stderr)
+        sys.exit(1)
+    if health.get("status") != "ok":
+        print(f"⚠️ API health is {health.get('status')!r}; results will be errors", file=sys.stderr)
+
+    print(json.dumps(run(args.url, args.image, args.concurrency, args.requests, args.batch,
+                         args.unique, args.query), indent=2))
+
+
+if __name__ == "__main__":
+    main()
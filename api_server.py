@@ -0,0 +1,320 @@
+# app/api_server.py
+#
+# Headless HTTP API over the same model, inference cache and recommendation
+# logic as the Streamlit app (analysis_service.py), for the mobile client and
+# partner integrations. Needs fastapi, uvicorn and python-multipart:
+#
+#   pip install fastapi uvicorn python-multipart
+#   python api_server.py --port 8000 --workers 2        # one loaded model per worker process
+#
+#   curl -F image=@face.jpg "http://127.0.0.1:8000/v1/analyze?skin_type=oily&max_price=40"
+#   curl -F images=@a.jpg -F images=@b.jpg http://127.0.0.1:8000/v1/analyze/batch
+#   curl -F image=@face.jpg -o report.pdf "http://127.0.0.1:8000/v1/report?username=pooja"
+#   python api_loadtest.py --url http://127.0.0.1:8000 --image face.jpg --concurrency 16
+#
+# Requests are handled asynchronously; decoding and inference run on a bounded
+# thread pool, where concurrent requests are micro-batched into shared forward
+# passes. At most API_MAX_PENDING images are in flight per worker, beyond that
+# requests get 503 + Retry-After instead of queueing without bound.
+#
+# Settings are the app's AURA_* environment variables (model, backend, catalog,
+# report workers), so both front ends serve the same model.
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse, Response
+from PIL import Image, UnidentifiedImageError
+
+from analysis_service import AnalysisService
+from prescription_store import get_prescription_store, report_key
+from product_ranker import SKIN_TYPES
+from constants import CLASS_NAMES, DOWNLOAD_FOLDER
+from report_jobs import get_report_queue
+from tracing import get_tracer, set_enabled
+
+# === Configuration ===
+# Same variables and defaults as streamlit_app.py, plus AURA_MODEL_PATH / AURA_ONNX_MODEL_PATH overrides
+INFERENCE_BACKEND = os.environ.get("AURA_INFERENCE_BACKEND", "torch")
+MODEL_ARCH = os.environ.get("AURA_MODEL_ARCH", "resnet18")
+MODEL_NAME = "skin_classifier" if MODEL_ARCH == "resnet18" else f"skin_classifier_{MODEL_ARCH}"
+MODEL_PATH = os.environ.get("AURA_MODEL_PATH", f"D:/Aura_derm/models/{MODEL_NAME}.pth")
+ONNX_MODEL_PATH = os.environ.get("AURA_ONNX_MODEL_PATH", f"D:/Aura_derm/models/{MODEL_NAME}.onnx")
+INFERENCE_MODE = os.environ.get("AURA_INFERENCE_MODE", "fp32")
+CALIBRATION_DIR = os.environ.get("AURA_CALIBRATION_DIR", "D:/Aura_derm/data set/")
+MODEL_KEY = MODEL_NAME if INFERENCE_MODE == "fp32" else f"{MODEL_NAME}_{INFERENCE_MODE}"
+DECODE_TIER = os.environ.get("AURA_DECODE_TIER", "balanced")
+CATALOG_PATH = os.environ.get("AURA_CATALOG_PATH", "D:/Aura_derm/data/products.csv")
+PRODUCT_TOP_K = int(os.environ.get("AURA_PRODUCT_TOP_K", 4))
+REPORT_WORKERS = int(os.environ.get("AURA_REPORT_WORKERS", 2))
+PRESCRIPTION_MAX_MB = float(os.environ.get("AURA_PRESCRIPTION_MAX_MB", 500))
+PRESCRIPTION_MAX_AGE_DAYS = float(os.environ.get("AURA_PRESCRIPTION_MAX_AGE_DAYS", 365))
+BATCH_MAX_SIZE = int(os.environ.get("AURA_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("AURA_BATCH_MAX_WAIT_MS", 10))
+BATCH_MAX_QUEUE = int(os.environ.get("AURA_BATCH_MAX_QUEUE", 256))
+# Threads doing decode + inference per worker process; the micro-batcher groups their forwards
+API_THREADS = int(os.environ.get("AURA_API_THREADS", 8))
+# Images in flight per worker before new requests are rejected with 503
+API_MAX_PENDING = int(os.environ.get("AURA_API_MAX_PENDING", 64))
+API_MAX_BATCH = int(os.environ.get("AURA_API_MAX_BATCH", 32))
+API_MAX_UPLOAD_MB = float(os.environ.get("AURA_API_MAX_UPLOAD_MB", 10))
+
+service = AnalysisService(
+    INFERENCE_BACKEND,
+    MODEL_PATH if INFERENCE_BACKEND == "torch" else ONNX_MODEL_PATH,
+    MODEL_KEY if INFERENCE_BACKEND == "torch" else f"{MODEL_NAME}_onnx",
+    arch=MODEL_ARCH,
+    inference_mode=INFERENCE_MODE,
+    calibration_dir=CALIBRATION_DIR,
+    class_names=CLASS_NAMES,
+    catalog_path=CATALOG_PATH,
+    decode_tier=DECODE_TIER,
+    batch_max_size=BATCH_MAX_SIZE,
+    batch_max_wait_ms=BATCH_MAX_WAIT_MS,
+    batch_max_queue=BATCH_MAX_QUEUE,
+)
+
+
+class Admission:
+    """
+    Counts images in flight and rejects work past the limit. Only touched
+    from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.pending = 0
+        self.rejected = 0
+
+    @contextlib.contextmanager
+    def admit(self, n=1):
+        if self.pending + n > self.limit:
+            self.rejected += 1
+            raise HTTPException(503, "Server busy, retry shortly", headers={"Retry-After": "1"})
+        self.pending += n
+        try:
+            yield
+        finally:
+            self.pending -= n
+
+
+admission = Admission(API_MAX_PENDING)
+_executor = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api-inference")
+    if service.ready():
+        # Load the model before accepting traffic, once per worker process
+        await asyncio.get_running_loop().run_in_executor(_executor, service.prewarm)
+    else:
+        print(f"⚠️ No model at {service.weights_path} (or {service.capability} missing); /v1 endpoints return 503")
+    yield
+    _executor.shutdown(wait=False)
+    get_report_queue(REPORT_WORKERS).shutdown(wait=False)
+
+
+app = FastAPI(title="Aura Derm API", version="1", lifespan=lifespan)
+
+
+async def _blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def _filters(skin_type, max_price, exclude):
+    if skin_type is not None and skin_type.lower() not in SKIN_TYPES:
+        raise HTTPException(422, f"skin_type must be one of {', '.join(SKIN_TYPES)}")
+    return {
+        "skin_type": skin_type,
+        "max_price": max_price,
+        "exclude_ingredients": [i for i in (exclude or "").split(";") if i.strip()],
+    }
+
+
+async def _read(upload):
+    data = await upload.read()
+    if not data:
+        raise HTTPException(400, f"{upload.filename or 'image'} is empty")
+    if len(data) > API_MAX_UPLOAD_MB * 2**20:
+        raise HTTPException(413, f"{upload.filename or 'image'} is larger than {API_MAX_UPLOAD_MB:g} MB")
+    return data
+
+
+async def _analyze(data, k, filters):
+    if not service.ready():
+        raise HTTPException(503, "Model not available")
+    try:
+        return await _blocking(service.analyze, data, k, **filters)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as exc:
+        raise HTTPException(400, f"Could not decode image: {exc}")
+
+
+async def _report(analysis, username):
+    """RenderedReport for an analysis, from the prescription store or a report worker."""
+    store = get_prescription_store(DOWNLOAD_FOLDER, int(PRESCRIPTION_MAX_MB * 2**20), PRESCRIPTION_MAX_AGE_DAYS)
+    inputs = {
+        "predicted_class": analysis["predicted_class"],
+        "products": analysis["products"],
+        "acids": analysis["acids"],
+        "diet": analysis["diet"],
+        "username": username,
+        "probabilities": [analysis["probabilities"][name] for name in CLASS_NAMES],
+        "class_names": CLASS_NAMES,
+    }
+    key = report_key(**inputs)
+    report = await _blocking(store.get, key)
+    if report is None:
+        report = await get_report_queue(REPORT_WORKERS).submit(**inputs).result_async()
+        await _blocking(store.put, key, report, username, analysis["predicted_class"])
+    return report
+
+
+# === Endpoints ===
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok" if service.ready() else "unavailable",
+        "backend": service.backend,
+        "model": service.loaded_stats(),
+        "pending": admission.pending,
+        "max_pending": admission.limit,
+        "rejected": admission.rejected,
+        "threads": API_THREADS,
+    }
+
+
+@app.get("/v1/classes")
+async def classes():
+    return {"classes": CLASS_NAMES, "skin_types": list(SKIN_TYPES)}
+
+
+@app.post("/v1/analyze")
+async def analyze(
+    image: UploadFile = File(...),
+    k: int = Query(PRODUCT_TOP_K, ge=1, le=50),
+    skin_type: str = Query(None),
+    max_price: float = Query(None, gt=0),
+    exclude: str = Query(None, description="Semicolon-separated ingredients to avoid"),
+    include_report: bool = Query(False, description="Embed the prescription (base64) in the response"),
+    username: str = Query("user", pattern=r"^[\w .-]{1,64}$"),
+):
+    start = time.perf_counter()
+    filters = _filters(skin_type, max_price, exclude)
+    data = await _read(image)
+    with admission.admit():
+        analysis = await _analyze(data, k, filters)
+        if include_report:
+            report = await _report(analysis, username)
+            analysis["report"] = {
+                "filename": report.filename,
+                "mime": report.mime,
+                "data_base64": base64.b64encode(report.data).decode("ascii"),
+            }
+    get_tracer().record("api.analyze", time.perf_counter() - start)
+    return analysis
+
+
+@app.post("/v1/analyze/batch")
+async def analyze_batch(
+    images: list[UploadFile] = File(...),
+    k: int = Query(PRODUCT_TOP_K, ge=1, le=50),
+    skin_type: str = Query(None),
+    max_price: float = Query(None, gt=0),
+    exclude: str = Query(None),
+):
+    """One result per image, in upload order; an image that fails gets an "error" entry instead."""
+    start = time.perf_counter()
+    if len(images) > API_MAX_BATCH:
+        raise HTTPException(413, f"At most {API_MAX_BATCH} images per batch")
+    filters = _filters(skin_type, max_price, exclude)
+
+    async def one(upload):
+        result = await _analyze(await _read(upload), k, filters)
+        result["filename"] = upload.filename
+        return result
+
+    # Admitted as a whole, so a batch is never half-rejected; every image finishes
+    # before the slots are released, even when some of them fail
+    with admission.admit(len(images)):
+        outcomes = await asyncio.gather(*(one(upload) for upload in images), return_exceptions=True)
+
+    results = []
+    for upload, outcome in zip(images, outcomes):
+        if isinstance(outcome, HTTPException) and outcome.status_code == 503:
+            raise outcome
+        if isinstance(outcome, HTTPException):
+            outcome = {"filename": upload.filename, "error": outcome.detail}
+        elif isinstance(outcome, Exception):
+            outcome = {"filename": upload.filename, "error": f"{type(outcome).__name__}: {outcome}"}
+        results.append(outcome)
+    get_tracer().record("api.analyze_batch", time.perf_counter() - start)
+    return {"results": results}
+
+
+@app.post("/v1/report")
+async def report(
+    image: UploadFile = File(...),
+    k: int = Query(PRODUCT_TOP_K, ge=1, le=50),
+    skin_type: str = Query(None),
+    max_price: float = Query(None, gt=0),
+    exclude: str = Query(None),
+    username: str = Query("user", pattern=r"^[\w .-]{1,64}$"),
+):
+    """The prescription file itself (PDF, or text when fpdf is unavailable)."""
+    filters = _filters(skin_type, max_price, exclude)
+    data = await _read(image)
+    with admission.admit():
+        rendered = await _report(await _analyze(data, k, filters), username)
+    return Response(
+        rendered.data, media_type=rendered.mime,
+        headers={"Content-Disposition": f'attachment; filename="{rendered.filename}"'},
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(get_tracer().export_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics.json")
+async def metrics_json():
+    return JSONResponse({"stages": get_tracer().snapshot(), "health": await health()})
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the Aura Derm analysis API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own model")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default=None)
+    parser.add_argument("--weights", default=None, help="Model file (.pth, or .onnx with --backend onnx)")
+    parser.add_argument("--tracing", action="store_true", help="Collect stage timings for /metrics")
+    args = parser.parse_args(argv)
+
+    # Workers import this module afresh, so settings travel as environment variables
+    if args.backend:
+        os.environ["AURA_INFERENCE_BACKEND"] = args.backend
+    if args.weights:
+        backend = args.backend or INFERENCE_BACKEND
+        os.environ["AURA_MODEL_PATH" if backend == "torch" else "AURA_ONNX_MODEL_PATH"] = args.weights
+    if args.tracing:
+        os.environ["AURA_TRACING"] = "1"
+        # A single worker runs in this process, where tracing.py is already imported
+        set_enabled(True)
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# app/batch_scheduler.py
+
+import contextlib
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+# A worker with nothing queued for this long exits (it restarts on the next
+# request), and get_batcher() drops batchers unused for as long
+IDLE_TIMEOUT_S = 300.0
+# Most batchers kept by get_batcher(); the least recently used goes first
+MAX_BATCHERS = 8
+
+
+class _Request:
+    __slots__ = ("tensor", "future", "enqueued_at")
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def _stack(tensors):
+    """Stack requests into a batch; numpy inputs (ONNX Runtime) never import torch."""
+    if isinstance(tensors[0], np.ndarray):
+        return np.stack(tensors), contextlib.nullcontext()
+    import torch
+    return torch.stack(tensors), torch.inference_mode()
+
+
+class MicroBatcher:
+    """
+    Background worker that groups single-image inference requests from many
+    sessions into one batched forward pass.
+
+    A batch is dispatched as soon as it holds `max_batch_size` requests or the
+    oldest request has waited `max_wait_ms`. Each caller gets back its own row
+    of the batch logits. `get_model` is called once per batch, so a model that
+    was hot-reloaded in the registry is picked up on the next batch.
+    Requests may be torch tensors or numpy arrays, but not mixed in one batcher.
+    The worker thread exits after `idle_timeout` seconds without requests.
+    """
+
+    def __init__(self, get_model, max_batch_size=16, max_wait_ms=10.0, max_queue=256, history=1024,
+                 idle_timeout=IDLE_TIMEOUT_S):
+        self.get_model = get_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.idle_timeout = idle_timeout
+        self.last_used = time.monotonic()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Guards the metrics below: the worker appends while stats() reads
+        self._metrics_lock = threading.Lock()
+
+        # === Metrics ===
+        self.requests = 0
+        self.batches = 0
+        self.failures = 0
+        self.batch_sizes = Counter()
+        self._waits = deque(maxlen=history)
+        self._forward_times = deque(maxlen=history)
+
+    def submit(self, tensor, timeout=None):
+        """
+        Queue a (3, H, W) image tensor and return a Future resolving to its logits.
+        Raises queue.Full if the queue stays full for `timeout` seconds.
+        """
+        if tensor.ndim == 4:
+            tensor = tensor.squeeze(0)
+        self.last_used = time.monotonic()
+        self._ensure_started()
+        request = _Request(tensor)
+        self._queue.put(request, timeout=timeout)
+        # The worker may have idled out between the check above and the put
+        self._ensure_started()
+        return request.future
+
+    def infer(self, tensor, timeout=None):
+        return self.submit(tensor, timeout=timeout).result(timeout=timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="aura-micro-batcher", daemon=True)
+                self._thread.start()
+
+    def _exit_if_idle(self):
+        # Under the start lock, so a submit() either lands before this check or restarts the worker
+        with self._start_lock:
+            if not self._queue.empty():
+                return False
+            self._thread = None
+            return True
+
+    def _collect_batch(self):
+        """The next batch, or None once the worker has been idle for idle_timeout."""
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.idle_timeout)]
+                break
+            except queue.Empty:
+                if self._exit_if_idle():
+                    return None
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Past the deadline: only take what is already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            dispatched_at = time.perf_counter()
+            try:
+                model = self.get_model()
+                inputs, context = _stack([request.tensor for request in batch])
+                with context:
+                    logits = model(inputs)
+            except Exception as exc:
+                with self._metrics_lock:
+                    self.failures += len(batch)
+                for request in batch:
+                    request.future.set_exception(exc)
+                continue
+
+            forward_time = time.perf_counter() - dispatched_at
+            with self._metrics_lock:
+                self._forward_times.append(forward_time)
+                self._waits.extend(dispatched_at - request.enqueued_at for request in batch)
+                self.batch_sizes[len(batch)] += 1
+                self.batches += 1
+                self.requests += len(batch)
+            for i, request in enumerate(batch):
+                request.future.set_result(logits[i].copy() if isinstance(logits, np.ndarray) else logits[i].clone())
+
+    def stats(self):
+        with self._metrics_lock:
+            waits_ms = np.array(list(self._waits)) * 1000.0
+            forward_ms = np.array(list(self._forward_times)) * 1000.0
+            requests, batches, failures = self.requests, self.batches, self.failures
+            histogram = dict(sorted(self.batch_sizes.items()))
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "requests": requests,
+            "batches": batches,
+            "failures": failures,
+            "mean_batch_size": round(requests / batches, 2) if batches else 0.0,
+            "batch_size_histogram": histogram,
+            "wait_ms_p50": round(float(np.percentile(waits_ms, 50)), 3) if len(waits_ms) else None,
+            "wait_ms_p95": round(float(np.percentile(waits_ms, 95)), 3) if len(waits_ms) else None,
+            "forward_ms_p50": round(float(np.percentile(forward_ms, 50)), 3) if len(forward_ms) else None,
+            "forward_ms_p95": round(float(np.percentile(forward_ms, 95)), 3) if len(forward_ms) else None,
+        }
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def _evict_batchers():
+    # Called under _batchers_lock. An evicted batcher still serves whoever holds
+    # it; its worker exits once idle, and the next get_batcher() builds a new one.
+    now = time.monotonic()
+    for key in [key for key, batcher in _batchers.items() if now - batcher.last_used > IDLE_TIMEOUT_S]:
+        del _batchers[key]
+    while len(_batchers) >= MAX_BATCHERS:
+        del _batchers[min(_batchers, key=lambda key: _batchers[key].last_used)]
+
+
+def get_batcher(get_model, max_batch_size=16, max_wait_ms=10.0, max_queue=256, key="default"):
+    """
+    Process-wide MicroBatcher per key (one per model); the get_model and
+    settings of the first call for a key win. At most MAX_BATCHERS are kept,
+    and batchers unused for IDLE_TIMEOUT_S are dropped.
+    """
+    batcher = _batchers.get(key)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(key)
+            if batcher is None:
+                _evict_batchers()
+                batcher = _batchers[key] = MicroBatcher(get_model, max_batch_size, max_wait_ms, max_queue)
+    return batcher
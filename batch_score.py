@@ -0,0 +1,214 @@
+# app/batch_score.py
+#
+# Offline bulk scoring of archived face images with the current classifier:
+#
+#   python batch_score.py "D:/Aura_derm/archive" --weights models/skin_classifier.pth \
+#       --out scores.jsonl --batch-size 64 --workers 4
+#
+# Re-running with the same --out skips images already scored by the same weights.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+
+from main import CLASS_NAMES, build_transform
+from model_registry import get_registry
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def collect_images(inputs):
+    """Expand directories (recursively) and .txt file lists into image paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(
+                    os.path.join(root, name) for name in sorted(files)
+                    if name.lower().endswith(IMAGE_EXTENSIONS)
+                )
+        elif item.lower().endswith(".txt"):
+            with open(item) as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        else:
+            paths.append(item)
+    return paths
+
+
+def load_scored_paths(out_path, fmt, model_version):
+    """Paths already scored by this model version in a previous (possibly interrupted) run."""
+    if not os.path.exists(out_path):
+        return set()
+    done = set()
+    with open(out_path, newline="") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                # A row cut off mid-write still parses, with the missing columns set to None
+                if None in row or None in row.values():
+                    continue
+                if row.get("model_version") == model_version:
+                    done.add(row["path"])
+        else:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record["model_version"] == model_version:
+                        done.add(record["path"])
+                except (ValueError, KeyError):
+                    # Truncated last line from a crash; it will be re-scored
+                    continue
+    return done
+
+
+class ImagePathDataset(Dataset):
+    def __init__(self, paths, transform):
+        self.paths = paths
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        path = self.paths[index]
+        try:
+            image = Image.open(path).convert("RGB")
+        except Exception as exc:
+            return None, path, str(exc)
+        return self.transform(image), path, None
+
+
+def collate_scored(batch):
+    tensors = [t for t, _, err in batch if err is None]
+    paths = [p for _, p, err in batch if err is None]
+    failed = [(p, err) for _, p, err in batch if err is not None]
+    images = torch.stack(tensors) if tensors else None
+    return images, paths, failed
+
+
+def truncate_partial_line(path, chunk_size=65536):
+    """Cut a last line without a trailing newline (a crash mid-write); returns the bytes removed."""
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            end = start
+        else:
+            keep = 0
+        f.truncate(keep)
+    return size - keep
+
+
+class ResultWriter:
+    def __init__(self, out_path, fmt):
+        self.fmt = fmt
+        new_file = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
+        self.file = open(out_path, "a", newline="")
+        self.csv = None
+        if fmt == "csv":
+            fields = ["path", "prediction", "confidence", "model_version"] + [f"prob_{c}" for c in CLASS_NAMES]
+            self.csv = csv.DictWriter(self.file, fieldnames=fields)
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, path, probs, model_version):
+        pred = int(probs.argmax())
+        if self.csv is not None:
+            row = {"path": path, "prediction": CLASS_NAMES[pred],
+                   "confidence": f"{probs[pred]:.6f}", "model_version": model_version}
+            row.update({f"prob_{c}": f"{p:.6f}" for c, p in zip(CLASS_NAMES, probs.tolist())})
+            self.csv.writerow(row)
+        else:
+            record = {
+                "path": path,
+                "prediction": CLASS_NAMES[pred],
+                "confidence": round(float(probs[pred]), 6),
+                "probabilities": {c: round(p, 6) for c, p in zip(CLASS_NAMES, probs.tolist())},
+                "model_version": model_version,
+            }
+            self.file.write(json.dumps(record) + "\n")
+
+    def flush(self):
+        # Flushed once per batch so a crash loses at most the batch in flight
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def score(paths, weights_path, out_path, fmt="jsonl", batch_size=64, workers=4, log_every=10):
+    entry = get_registry().get("skin_classifier", weights_path)
+    model = entry.model
+
+    # Before reading what is done, so a line cut off by a crash is re-scored rather than skipped
+    if os.path.exists(out_path) and truncate_partial_line(out_path):
+        print(f"Dropped a partially written last line in {out_path}; it will be re-scored", file=sys.stderr)
+    done = load_scored_paths(out_path, fmt, entry.version)
+    todo = [p for p in paths if p not in done]
+    print(f"{len(paths)} images found, {len(done)} already scored, {len(todo)} to score", file=sys.stderr)
+    if not todo:
+        return 0
+
+    loader = DataLoader(
+        ImagePathDataset(todo, build_transform()),
+        batch_size=batch_size,
+        num_workers=workers,
+        collate_fn=collate_scored,
+        persistent_workers=workers > 0,
+    )
+    writer = ResultWriter(out_path, fmt)
+    scored = 0
+    start = time.perf_counter()
+    try:
+        for step, (images, batch_paths, failed) in enumerate(loader, 1):
+            for path, err in failed:
+                print(f"Skipping unreadable image {path}: {err}", file=sys.stderr)
+            if images is not None:
+                with torch.inference_mode():
+                    probs = torch.softmax(model(images), dim=1).numpy()
+                for path, row in zip(batch_paths, probs):
+                    writer.write(path, row, entry.version)
+                scored += len(batch_paths)
+            writer.flush()
+            if step % log_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{scored}/{len(todo)} images, {scored / elapsed:.1f} images/sec", file=sys.stderr)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Scored {scored} images in {elapsed:.1f}s ({scored / max(elapsed, 1e-9):.1f} images/sec) -> {out_path}",
+          file=sys.stderr)
+    return scored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-score face images with SkinClassifier.")
+    parser.add_argument("inputs", nargs="+", help="Image directories, image files or .txt file lists")
+    parser.add_argument("--weights", default="D:/Aura_derm/models/skin_classifier.pth")
+    parser.add_argument("--out", required=True, help="Output .jsonl or .csv file (appended to on resume)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                        help="Output format (default: inferred from --out)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.out.lower().endswith(".csv") else "jsonl")
+    score(collect_images(args.inputs), args.weights, args.out, fmt, args.batch_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
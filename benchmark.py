@@ -0,0 +1,265 @@
+# app/benchmark.py
+#
+# Reproducible per-stage benchmark of the analysis pipeline on synthetic images:
+#
+#   python benchmark.py --out bench_results.json
+#   python benchmark.py --stages forward,pdf --iterations 50 --batch-sizes 1,8,32
+#
+# Results are written as JSON (one record per stage/parameter combination)
+# together with the git commit and hardware details, so runs can be diffed
+# across commits and machines.
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from constants import CLASS_NAMES
+
+RESOLUTIONS = {
+    "12mp": (4000, 3000),
+    "1080p": (1920, 1080),
+    "720p": (1280, 720),
+    "vga": (640, 480),
+    "224": (224, 224),
+}
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+STAGES = ["decode", "crop", "transform", "forward", "segment", "recommend", "rank", "pdf"]
+
+
+def synthetic_image(width, height, seed=0):
+    """Deterministic face-sized image with smooth gradients plus noise, so JPEG sizes are realistic."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        180 + 40 * np.sin(x / max(width, 1) * 3.1),
+        140 + 30 * np.cos(y / max(height, 1) * 2.7),
+        120 + 20 * np.sin((x + y) / max(width + height, 1) * 5.3),
+    ], axis=-1)
+    noise = rng.normal(0, 8, size=base.shape).astype(np.float32)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def jpeg_bytes(image, quality=90):
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def measure(fn, iterations, warmup, items=1):
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    ms = timings * 1000.0
+    return {
+        "iterations": iterations,
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p90_ms": round(float(np.percentile(ms, 90)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "min_ms": round(float(ms.min()), 4),
+        "throughput_per_s": round(items * iterations / float(timings.sum()), 2),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    env = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+        env["torch"] = torch.__version__
+        env["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        env["torch"] = None
+    return env
+
+
+# === Stages ===
+# Each stage yields (params, fn, items) tuples, or raises ImportError/OSError
+# to be recorded as skipped.
+
+def stage_decode(args):
+    for res in args.resolutions:
+        data = jpeg_bytes(synthetic_image(*RESOLUTIONS[res]))
+        yield {"resolution": res, "jpeg_kb": round(len(data) / 1024, 1)}, \
+            lambda data=data: Image.open(io.BytesIO(data)).convert("RGB"), 1
+
+
+def stage_crop(args):
+    from face_cropper import crop_face_from_pil
+    for res in args.resolutions:
+        image = synthetic_image(*RESOLUTIONS[res])
+        yield {"resolution": res}, lambda image=image: crop_face_from_pil(image), 1
+
+
+def stage_transform(args):
+    from main import build_transform
+    transform = build_transform()
+    for res in args.resolutions:
+        image = synthetic_image(*RESOLUTIONS[res])
+        yield {"resolution": res}, lambda image=image: transform(image), 1
+
+
+def stage_forward(args):
+    import torch
+    from main import SkinClassifier
+    model = SkinClassifier(arch=args.arch)
+    if args.weights:
+        model.load_state_dict(torch.load(args.weights, map_location="cpu"))
+    model.eval()
+
+    def run(batch):
+        with torch.inference_mode():
+            model(batch)
+
+    for batch_size in args.batch_sizes:
+        batch = torch.rand(batch_size, 3, 224, 224, generator=torch.Generator().manual_seed(0))
+        yield {"batch_size": batch_size}, lambda batch=batch: run(batch), batch_size
+
+
+def stage_segment(args):
+    if not args.segmenter_weights:
+        raise OSError("no --segmenter-weights given")
+    from skin_segmentar import SkinSegmenter
+    segmenter = SkinSegmenter(args.segmenter_weights)
+    with tempfile.TemporaryDirectory() as tmp:
+        for res in args.resolutions:
+            path = os.path.join(tmp, f"{res}.jpg")
+            synthetic_image(*RESOLUTIONS[res]).save(path, quality=90)
+            yield {"resolution": res}, lambda path=path: segmenter.analyze(path), 1
+
+
+def stage_recommend(args):
+    from recommender import get_products
+    from food_map import get_diet
+    from acid_map import get_acids_for_skin_problem
+
+    def run():
+        for name in CLASS_NAMES:
+            get_products(name)
+            get_acids_for_skin_problem(name)
+            get_diet(name)
+
+    yield {"lookups": 3 * len(CLASS_NAMES)}, run, 3 * len(CLASS_NAMES)
+
+
+def stage_rank(args):
+    from product_ranker import synthetic_catalog
+
+    probabilities = np.array([0.55, 0.25, 0.15, 0.05], dtype=np.float32)
+    for n_products in (1000, 50000):
+        catalog = synthetic_catalog(n_products, CLASS_NAMES)
+        yield {"products": n_products, "filtered": False}, \
+            lambda catalog=catalog: catalog.top_k(probabilities, 10), 1
+        yield {"products": n_products, "filtered": True}, lambda catalog=catalog: catalog.top_k(
+            probabilities, 10, catalog.filter_mask(skin_type="oily", max_price=60.0, exclude_ingredients=["retinol"])
+        ), 1
+
+
+def stage_pdf(args):
+    import report
+    from recommender import get_products
+    from food_map import get_diet
+    from acid_map import get_acids_for_skin_problem
+
+    products = get_products("acne")
+    acids = get_acids_for_skin_problem("acne")
+    diet = get_diet("acne")
+
+    def render(probabilities, fresh_chart):
+        if fresh_chart:
+            report._chart_png.cache_clear()
+        return report.render_report("acne", products, acids, diet, username="bench", probabilities=probabilities)
+
+    # "cached" reuses the chart of an identical prediction, "fresh" redraws it every time
+    for chart in ("none", "fresh", "cached"):
+        probabilities = None if chart == "none" else [0.7, 0.15, 0.1, 0.05]
+        yield {"chart": chart}, lambda p=probabilities, fresh=chart == "fresh": render(p, fresh), 1
+
+
+STAGE_FUNCS = {
+    "decode": stage_decode,
+    "crop": stage_crop,
+    "transform": stage_transform,
+    "forward": stage_forward,
+    "segment": stage_segment,
+    "recommend": stage_recommend,
+    "rank": stage_rank,
+    "pdf": stage_pdf,
+}
+
+
+def run_benchmarks(args):
+    results = []
+    for stage in args.stages:
+        try:
+            for params, fn, items in STAGE_FUNCS[stage](args):
+                stats = measure(fn, args.iterations, args.warmup, items)
+                results.append({"stage": stage, "params": params, **stats})
+                print(f"{stage:<10} {json.dumps(params):<40} p50={stats['p50_ms']:.2f}ms "
+                      f"p99={stats['p99_ms']:.2f}ms {stats['throughput_per_s']:.1f}/s", file=sys.stderr)
+        except (ImportError, OSError) as exc:
+            results.append({"stage": stage, "skipped": str(exc)})
+            print(f"{stage:<10} skipped: {exc}", file=sys.stderr)
+    return {"environment": environment(), "config": {
+        "iterations": args.iterations, "warmup": args.warmup,
+        "resolutions": args.resolutions, "batch_sizes": args.batch_sizes,
+    }, "results": results}
+
+
+def _csv_list(value, cast=str):
+    return [cast(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the Aura Derm analysis pipeline.")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--stages", type=_csv_list, default=STAGES,
+                        help=f"Comma-separated subset of: {','.join(STAGES)}")
+    parser.add_argument("--resolutions", type=_csv_list, default=list(RESOLUTIONS),
+                        help=f"Comma-separated subset of: {','.join(RESOLUTIONS)}")
+    parser.add_argument("--batch-sizes", type=lambda v: _csv_list(v, int), default=BATCH_SIZES)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--weights", default=None, help="Classifier weights (random init if omitted)")
+    parser.add_argument("--arch", default="resnet18", help="Classifier backbone, see main.ARCHITECTURES")
+    parser.add_argument("--segmenter-weights", default=None)
+    args = parser.parse_args(argv)
+
+    unknown = set(args.stages) - set(STAGES) | set(args.resolutions) - set(RESOLUTIONS)
+    if unknown:
+        parser.error(f"unknown stage/resolution: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(args)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# app/capabilities.py
+#
+# Optional heavy dependencies, resolved lazily on first use.
+#
+# A capability names the modules it needs. Nothing is imported until a caller
+# asks: installed() only looks the packages up on disk, available() / load()
+# import them once per process and record how long that took and how much RSS
+# it added. prewarm() does the imports on a background thread, e.g. once the
+# first page has been sent to the browser.
+#
+#   caps = get_capabilities()
+#   if caps.available("fpdf"):
+#       FPDF = caps.load("fpdf").FPDF
+#
+#   python capabilities.py          # cold import time of each capability, one fresh interpreter each
+
+import argparse
+import importlib
+import importlib.util
+import json
+import subprocess
+import sys
+import threading
+import time
+
+from process_stats import rss_bytes
+
+# name -> modules imported together; load() returns the first one
+CAPABILITIES = {
+    "torch": ("torch", "torchvision"),
+    "onnxruntime": ("onnxruntime",),
+    "matplotlib": ("matplotlib.figure", "matplotlib.backends.backend_agg"),
+    "fpdf": ("fpdf",),
+    "yaml": ("yaml",),
+    "bcrypt": ("bcrypt",),
+    "authenticator": ("streamlit_authenticator",),
+    "opencv": ("cv2",),
+}
+
+
+class Capability:
+    """One optional dependency; imported at most once, by whichever thread asks first."""
+
+    def __init__(self, name, modules):
+        self.name = name
+        self.modules = tuple(modules)
+        self._lock = threading.Lock()
+        self._installed = None
+        self._module = None
+        self.resolved = False
+        self.error = None
+        self.import_seconds = None
+        self.rss_delta = None
+        self.loaded_by = None
+
+    def installed(self):
+        """True if every top-level package can be found. Imports nothing."""
+        if self._installed is None:
+            try:
+                self._installed = all(
+                    importlib.util.find_spec(module.partition(".")[0]) is not None for module in self.modules
+                )
+            except (ImportError, ValueError):
+                self._installed = False
+        return self._installed
+
+    def resolve(self):
+        """Import the modules on first call; the loaded module, or None if the import failed."""
+        if self.resolved:
+            return self._module
+        with self._lock:
+            if not self.resolved:
+                rss_before = rss_bytes()
+                start = time.perf_counter()
+                try:
+                    self._module = [importlib.import_module(module) for module in self.modules][0]
+                except ImportError as exc:
+                    self.error = str(exc)
+                self.import_seconds = time.perf_counter() - start
+                rss_after = rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    self.rss_delta = rss_after - rss_before
+                self.loaded_by = threading.current_thread().name
+                self.resolved = True
+        return self._module
+
+    def available(self):
+        return self.installed() and self.resolve() is not None
+
+    def load(self):
+        """The imported module; raises ImportError if the capability is missing."""
+        module = self.resolve() if self.installed() else None
+        if module is None:
+            raise ImportError(f"Optional dependency '{self.name}' is not available: {self.error or 'not installed'}")
+        return module
+
+    def stats(self):
+        if not self.resolved:
+            state = "installed" if self.installed() else "missing"
+        else:
+            state = "loaded" if self._module is not None else "failed"
+        return {
+            "state": state,
+            "import_ms": None if self.import_seconds is None else round(self.import_seconds * 1000.0, 1),
+            "rss_mb": None if self.rss_delta is None else round(self.rss_delta / 2**20, 1),
+            "loaded_by": self.loaded_by,
+            "error": self.error,
+        }
+
+
+class CapabilityRegistry:
+    """
+    The process's optional dependencies plus startup milestones. mark() records
+    the first time a label is reached (later calls are ignored), so a
+    Streamlit rerun does not overwrite the cold-start timings.
+    """
+
+    def __init__(self, capabilities=CAPABILITIES):
+        self._capabilities = {name: Capability(name, modules) for name, modules in capabilities.items()}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._marks = {}
+        self._prewarm_thread = None
+        self._prewarm_seconds = None
+        self._prewarm_errors = []
+
+    def __getitem__(self, name):
+        return self._capabilities[name]
+
+    def installed(self, name):
+        return self._capabilities[name].installed()
+
+    def available(self, name):
+        return self._capabilities[name].available()
+
+    def load(self, name):
+        return self._capabilities[name].load()
+
+    def mark(self, label):
+        """Seconds since the registry was created, recorded the first time `label` is reached."""
+        with self._lock:
+            return self._marks.setdefault(label, time.perf_counter() - self._started)
+
+    def prewarm(self, names, then=()):
+        """
+        Resolve the installed capabilities in `names`, then call each of `then`,
+        on one background daemon thread. Only the first call starts a thread;
+        errors are recorded in report() instead of raised.
+        """
+        with self._lock:
+            if self._prewarm_thread is not None:
+                return False
+            self._prewarm_thread = threading.Thread(
+                target=self._prewarm, args=(tuple(names), tuple(then)), name="capability-prewarm", daemon=True
+            )
+        self._prewarm_thread.start()
+        return True
+
+    def _prewarm(self, names, then):
+        start = time.perf_counter()
+        for name in names:
+            if self.installed(name):
+                self._capabilities[name].resolve()
+        for step in then:
+            try:
+                step()
+            except Exception as exc:
+                self._prewarm_errors.append(f"{getattr(step, '__name__', step)}: {exc}")
+        self._prewarm_seconds = time.perf_counter() - start
+
+    def report(self):
+        """Startup milestones, prewarm state and per-capability import cost."""
+        if self._prewarm_thread is None:
+            prewarm = "not started"
+        else:
+            prewarm = "running" if self._prewarm_thread.is_alive() else "done"
+        rss = rss_bytes()
+        return {
+            "uptime_s": round(time.perf_counter() - self._started, 2),
+            "rss_mb": None if rss is None else round(rss / 2**20, 1),
+            "marks_ms": {label: round(seconds * 1000.0, 1) for label, seconds in self._marks.items()},
+            "prewarm": prewarm,
+            "prewarm_s": None if self._prewarm_seconds is None else round(self._prewarm_seconds, 2),
+            "prewarm_errors": list(self._prewarm_errors),
+            "capabilities": {name: capability.stats() for name, capability in self._capabilities.items()},
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_capabilities():
+    """Process-wide CapabilityRegistry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CapabilityRegistry()
+    return _registry
+
+
+# === Cold import report ===
+
+def cold_import_seconds(modules):
+    """Import `modules` in a fresh interpreter; seconds taken, or None if the import fails."""
+    code = (
+        "import importlib, time\n"
+        "start = time.perf_counter()\n"
+        f"for m in {list(modules)!r}: importlib.import_module(m)\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold import cost of the app's optional dependencies.")
+    parser.add_argument("names", nargs="*", default=list(CAPABILITIES), help="Capabilities to time (default: all)")
+    parser.add_argument("--extra", nargs="*", default=["streamlit"], help="Other modules to time, one per run")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.names:
+        seconds = cold_import_seconds(CAPABILITIES[name])
+        results[name] = None if seconds is None else round(seconds * 1000.0, 1)
+    for module in args.extra:
+        seconds = cold_import_seconds([module])
+        results[module] = None if seconds is None else round(seconds * 1000.0, 1)
+    print(json.dumps({"cold_import_ms": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# app/constants.py
+#
+# Values shared by the app, the API, the model code and the report renderer.
+# Kept free of heavy imports so any module can use them.
+
+CLASS_NAMES = ['acne', 'dark spots', 'pigmentation', 'wrinkles']
+DOWNLOAD_FOLDER = "D:/Aura_derm/prescriptions"
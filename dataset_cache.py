@@ -0,0 +1,179 @@
+# app/dataset_cache.py
+#
+# One-time ingestion of an ImageFolder tree into memory-mapped uint8 shards:
+#
+#   python dataset_cache.py --data-dir "D:/Aura_derm/data set/" --cache-dir "D:/Aura_derm/cache/train"
+#
+# Layout of the cache directory:
+#   index.json          classes, image size, shard list and the source fingerprint
+#   labels.npy          int64 label per sample
+#   images_00000.npy    (N, size, size, 3) uint8, one file per shard
+#
+# index.json is written last, so a half-written cache is never picked up, and
+# it is rebuilt automatically whenever files under the source folder change.
+
+import argparse
+import bisect
+import functools
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import datasets
+
+INDEX_FILE = "index.json"
+LABELS_FILE = "labels.npy"
+
+
+def folder_fingerprint(data_dir, size):
+    """Hash of every file path, size and mtime under data_dir plus the target size."""
+    digest = hashlib.sha1(f"size={size}".encode())
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            rel = os.path.relpath(path, data_dir).replace(os.sep, "/")
+            digest.update(f"{rel}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _decode_resized(path, size):
+    # Same PIL bilinear resize as transforms.Resize((size, size))
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB").resize((size, size), Image.BILINEAR), dtype=np.uint8)
+
+
+def _keep_list(batch):
+    return batch
+
+
+def build_cache(data_dir, cache_dir, size=224, shard_size=4096, workers=4, fingerprint=None):
+    """Decode and resize every image once and write the shards and index."""
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+    folder = datasets.ImageFolder(root=data_dir, loader=functools.partial(_decode_resized, size=size))
+    labels = np.asarray(folder.targets, dtype=np.int64)
+    loader = DataLoader(folder, batch_size=64, num_workers=workers, collate_fn=_keep_list)
+
+    start = time.perf_counter()
+    shards = []
+    shard, shard_fill = None, 0
+    for batch in loader:
+        for image, _ in batch:
+            if shard is None or shard_fill == shard.shape[0]:
+                if shard is not None:
+                    shard.flush()
+                count = min(shard_size, len(labels) - sum(s["count"] for s in shards))
+                name = f"images_{len(shards):05d}.npy"
+                shard = np.lib.format.open_memmap(
+                    os.path.join(cache_dir, name), mode="w+", dtype=np.uint8, shape=(count, size, size, 3)
+                )
+                shards.append({"file": name, "count": count})
+                shard_fill = 0
+            shard[shard_fill] = image
+            shard_fill += 1
+    if shard is not None:
+        shard.flush()
+        del shard
+
+    np.save(os.path.join(cache_dir, LABELS_FILE), labels)
+    index = {
+        "fingerprint": fingerprint or folder_fingerprint(data_dir, size),
+        "data_dir": os.path.abspath(data_dir),
+        "size": size,
+        "classes": folder.classes,
+        "num_samples": int(len(labels)),
+        "shards": shards,
+        "created": time.time(),
+        "ingest_seconds": round(time.perf_counter() - start, 2),
+    }
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(index_path + ".tmp", index_path)
+    return index
+
+
+def load_or_build_cache(data_dir, cache_dir, size=224, shard_size=4096, workers=4):
+    """Return the cache index, rebuilding the cache if the source folder changed."""
+    fingerprint = folder_fingerprint(data_dir, size)
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get("fingerprint") == fingerprint:
+            return index
+        print("Source folder changed; rebuilding dataset cache in", cache_dir)
+    else:
+        print("Building dataset cache in", cache_dir)
+    return build_cache(data_dir, cache_dir, size, shard_size, workers, fingerprint)
+
+
+class MemmapImageDataset(Dataset):
+    """
+    Dataset over the memory-mapped shards. Samples are returned as (3, H, W)
+    uint8 tensors that view the mapped pages directly; convert batches with
+    images.float().div_(255) to match ToTensor().
+
+    Shards are opened lazily, so each DataLoader worker maps them itself after
+    it starts and the OS page cache is shared between workers.
+    """
+
+    def __init__(self, cache_dir, index=None):
+        if index is None:
+            with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+                index = json.load(f)
+        self.cache_dir = cache_dir
+        self.index = index
+        self.classes = index["classes"]
+        self.labels = np.load(os.path.join(cache_dir, LABELS_FILE))
+        self.targets = self.labels.tolist()
+        self._offsets = np.cumsum([0] + [s["count"] for s in index["shards"]]).tolist()
+        self._shards = None
+
+    def __len__(self):
+        return self.index["num_samples"]
+
+    def _open(self):
+        # Copy-on-write mapping: writable views for torch without copying the file
+        self._shards = [
+            np.load(os.path.join(self.cache_dir, s["file"]), mmap_mode="c") for s in self.index["shards"]
+        ]
+
+    def __getitem__(self, i):
+        if self._shards is None:
+            self._open()
+        shard = bisect.bisect_right(self._offsets, i) - 1
+        image = torch.from_numpy(self._shards[shard][i - self._offsets[shard]]).permute(2, 0, 1)
+        return image, int(self.labels[i])
+
+    def __getstate__(self):
+        # Do not pickle open mappings into worker processes
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-decode an ImageFolder dataset into memory-mapped shards.")
+    parser.add_argument("--data-dir", default="D:/Aura_derm/data set/")
+    parser.add_argument("--cache-dir", default="D:/Aura_derm/cache/train")
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--shard-size", type=int, default=4096)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args(argv)
+
+    index = load_or_build_cache(args.data_dir, args.cache_dir, args.size, args.shard_size, args.workers)
+    print(f"✅ {index['num_samples']} images in {len(index['shards'])} shard(s), classes: {index['classes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# app/distill_report.py
+#
+# Compare a compact student SkinClassifier with the teacher it was distilled from:
+#
+#   python distill_report.py --teacher models/skin_classifier.pth \
+#       --student models/skin_classifier_mobilenet_v3_small.pth --student-arch mobilenet_v3_small \
+#       --samples "D:/Aura_derm/data set/" --out models/distill_report.json
+#
+# train_skin_model.py --teacher writes the same report next to the student.
+
+import argparse
+import json
+import os
+import time
+
+import torch
+
+from main import CLASS_NAMES, SkinClassifier
+
+
+def parameter_count(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+def _ms_per_image(model, batch, repeats):
+    with torch.inference_mode():
+        model(batch)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(batch)
+    return (time.perf_counter() - start) / repeats / len(batch) * 1000.0
+
+
+def _logits(model, samples, batch_size):
+    with torch.inference_mode():
+        return torch.cat([model(samples[i:i + batch_size]) for i in range(0, len(samples), batch_size)])
+
+
+def compare(teacher, student, samples, batch_size=16, repeats=5, labels=None):
+    """
+    Latency (batch 1 and batch_size), parameter count and prediction agreement
+    of `student` against `teacher` on a (N, 3, 224, 224) float batch, plus each
+    model's accuracy if the true `labels` are given.
+    """
+    teacher.eval()
+    student.eval()
+    teacher_logits = _logits(teacher, samples, batch_size)
+    student_logits = _logits(student, samples, batch_size)
+    teacher_probs = torch.softmax(teacher_logits, dim=1)
+    student_probs = torch.softmax(student_logits, dim=1)
+
+    report = {"samples": len(samples)}
+    for role, model in (("teacher", teacher), ("student", student)):
+        params = parameter_count(model)
+        report[role] = {
+            "arch": getattr(model, "arch", type(model).__name__),
+            "params": params,
+            "size_mb": round(params * 4 / 2**20, 2),
+            "ms_per_image_batch1": round(_ms_per_image(model, samples[:1], repeats), 3),
+            f"ms_per_image_batch{batch_size}": round(_ms_per_image(model, samples[:batch_size], repeats), 3),
+        }
+    report["param_ratio"] = round(report["student"]["params"] / report["teacher"]["params"], 4)
+    report["speedup_batch1"] = round(
+        report["teacher"]["ms_per_image_batch1"] / report["student"]["ms_per_image_batch1"], 2
+    )
+    report["top1_agreement"] = float((teacher_logits.argmax(1) == student_logits.argmax(1)).float().mean())
+    report["mean_prob_drift"] = float((teacher_probs - student_probs).abs().sum(1).mean() / 2)
+    report["max_prob_drift"] = float((teacher_probs - student_probs).abs().max())
+    if labels is not None:
+        report["teacher"]["accuracy"] = float((teacher_logits.argmax(1) == labels).float().mean())
+        report["student"]["accuracy"] = float((student_logits.argmax(1) == labels).float().mean())
+    return report
+
+
+def main(argv=None):
+    from inference_modes import load_samples
+
+    parser = argparse.ArgumentParser(description="Compare a distilled student classifier with its teacher.")
+    parser.add_argument("--teacher", default="D:/Aura_derm/models/skin_classifier.pth")
+    parser.add_argument("--teacher-arch", default="resnet18")
+    parser.add_argument("--student", required=True)
+    parser.add_argument("--student-arch", default="mobilenet_v3_small")
+    parser.add_argument("--samples", required=True, help="Directory of face images")
+    parser.add_argument("--limit", type=int, default=256)
+    parser.add_argument("--out", default=None, help="Optional JSON file for the report")
+    args = parser.parse_args(argv)
+
+    models = []
+    for path, arch in ((args.teacher, args.teacher_arch), (args.student, args.student_arch)):
+        model = SkinClassifier(num_classes=len(CLASS_NAMES), arch=arch)
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+        models.append(model)
+    report = compare(*models, load_samples(args.samples, args.limit))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
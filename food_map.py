@@ -1,26 +1,9 @@
 # app/food_map.py
 
-def get_diet(skin_issue):
-    skin_issue = skin_issue.lower()
+from knowledge_base import get_knowledge_base
 
-    diet_map = {
-        "acne": {
-            "eat": ["Green leafy vegetables", "Berries", "Whole grains", "Zinc-rich foods"],
-            "avoid": ["Sugar", "Dairy products", "Refined carbs", "Fast food"]
-        },
-        "wrinkles": {
-            "eat": ["Blueberries", "Avocados", "Nuts", "Green tea"],
-            "avoid": ["Red meat", "Alcohol", "Deep-fried snacks"]
-        },
-        "dark spots": {
-            "eat": ["Citrus fruits", "Papaya", "Tomatoes", "Pumpkin seeds"],
-            "avoid": ["Sugary drinks", "Greasy food", "Processed snacks"]
-        },
-        "pigmentation": {
-            "eat": ["Carrots", "Spinach", "Almonds", "Sunflower seeds"],
-            "avoid": ["Soda", "White bread", "Overcooked meat"]
-        }
-    }
+NO_DIET = {"eat": ("No data",), "avoid": ("No data",)}
 
-    return diet_map.get(skin_issue, {"eat": ["No data"], "avoid": ["No data"]})
-    st.markdown("Here are some dietary suggestions to help improve your skin condition:")       
\ No newline at end of file
+def get_diet(skin_issue):
+    entry = get_knowledge_base().get(skin_issue)
+    return entry["diet"] if entry is not None else NO_DIET
@@ -0,0 +1,93 @@
+# app/inference_cache.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def image_digest(image_bytes):
+    """Content hash used to key cached results for an uploaded image."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class InferenceResult:
+    """Logits and softmax probabilities for one image under one model version."""
+
+    def __init__(self, logits, probabilities, model_version):
+        self.logits = np.asarray(logits, dtype=np.float32).reshape(-1)
+        self.probabilities = np.asarray(probabilities, dtype=np.float32).reshape(-1)
+        self.model_version = model_version
+
+    @property
+    def pred_index(self):
+        return int(self.probabilities.argmax())
+
+    def predicted_class(self, class_names):
+        return class_names[self.pred_index]
+
+
+class InferenceCache:
+    """
+    Bounded LRU cache of InferenceResult objects keyed by
+    (image content hash, model version), shared by all sessions.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, image_bytes, model_version, compute):
+        """
+        Return the cached result for these image bytes and model version, or
+        call `compute()` -> (logits, probabilities) and cache what it returns.
+        """
+        key = (image_digest(image_bytes), model_version)
+        result = self.get(key)
+        if result is None:
+            logits, probabilities = compute()
+            result = InferenceResult(logits, probabilities, model_version)
+            self.put(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache = InferenceCache()
+
+
+def get_inference_cache():
+    return _cache
@@ -0,0 +1,282 @@
+# app/inference_modes.py
+#
+# Optional CPU inference backends for SkinClassifier. Every non-fp32 mode is
+# calibrated on sample images and must pass an accuracy-parity check against
+# the eager fp32 model before it is used:
+#
+#   python inference_modes.py --weights models/skin_classifier.pth --samples "data set" --modes all
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from main import build_transform
+
+MODES = ["fp32", "channels_last", "int8_dynamic", "int8_static", "torchscript"]
+
+# Parity tolerances against the fp32 model
+MIN_TOP1_AGREEMENT = 0.98
+MAX_PROB_DRIFT = 0.05
+
+# Parity report of the most recent build per mode, shown in the app's model info
+PARITY_REPORTS = {}
+
+
+class ParityError(ValueError):
+    """Raised when an optimized mode disagrees too much with the fp32 model."""
+
+    def __init__(self, report):
+        super().__init__(
+            f"{report['mode']} failed parity: top-1 agreement {report['top1_agreement']:.3f} "
+            f"(min {report['min_top1_agreement']}), max prob drift {report['max_prob_drift']:.4f} "
+            f"(max {report['max_allowed_drift']})"
+        )
+        self.report = report
+
+
+def _sample_folders(sample_dir):
+    """Sorted image paths of each (sub)folder that has any."""
+    if not sample_dir or not os.path.isdir(sample_dir):
+        raise ValueError(f"Calibration needs a directory of sample images, got {sample_dir!r}")
+    folders = []
+    for root, dirs, files in os.walk(sample_dir):
+        dirs.sort()
+        images = [os.path.join(root, name) for name in sorted(files)
+                  if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+        if images:
+            folders.append(images)
+    if not folders:
+        raise ValueError(f"No sample images found in {sample_dir!r}")
+    return folders
+
+
+def _round_robin(folders, limit):
+    """Preprocessed batch of up to `limit` images taken round-robin across the folders."""
+    paths = []
+    for i in range(max(map(len, folders), default=0)):
+        paths.extend(images[i] for images in folders if i < len(images))
+    transform = build_transform()
+    return torch.stack([transform(Image.open(path).convert("RGB")) for path in paths[:limit]])
+
+
+def load_samples(sample_dir, limit=64):
+    """
+    Preprocessed (N, 3, 224, 224) batch of sample images. Images are taken
+    round-robin across the subfolders (one per class in a dataset folder), so
+    a limit never fills up from a single class.
+    """
+    return _round_robin(_sample_folders(sample_dir), limit)
+
+
+def load_calibration_split(sample_dir, limit=64):
+    """
+    (calibration, holdout) batches of up to limit // 2 images each: every
+    folder's images alternate between the two, so both stay stratified and the
+    parity check runs on images the observers never saw.
+    """
+    folders = _sample_folders(sample_dir)
+    if sum(map(len, folders)) < 2:
+        raise ValueError(f"Calibration needs at least 2 sample images in {sample_dir!r}")
+    half = max(1, limit // 2)
+    calibration = _round_robin([images[0::2] for images in folders], half)
+    holdout = _round_robin([images[1::2] for images in folders if len(images) > 1], half)
+    return calibration, holdout
+
+
+class ChannelsLast(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = copy.deepcopy(model).to(memory_format=torch.channels_last)
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def _quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine available on this build of torch")
+
+
+def _batches(samples, batch_size=16):
+    for i in range(0, len(samples), batch_size):
+        yield samples[i:i + batch_size]
+
+
+# === Builders ===
+# Each builder takes the fp32 eval model and the calibration batch and returns
+# a module with the same input/output contract.
+
+def _build_fp32(model, samples):
+    return model
+
+
+def _build_channels_last(model, samples):
+    optimized = ChannelsLast(model).eval()
+    with torch.inference_mode():
+        optimized(samples[:1])
+    return optimized
+
+
+def _build_int8_dynamic(model, samples):
+    # Only the classifier head is a Linear layer; convs stay fp32 in this mode
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def _build_int8_static(model, samples):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = _quantized_engine()
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (samples[:1],))
+    with torch.inference_mode():
+        for batch in _batches(samples):
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def _build_torchscript(model, samples):
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, samples[:1])
+    frozen = torch.jit.freeze(traced.eval())
+    frozen = torch.jit.optimize_for_inference(frozen)
+    with torch.inference_mode():
+        # The first calls run the profiling executor; calibrate it on real inputs
+        for batch in _batches(samples):
+            frozen(batch)
+    return frozen
+
+
+BUILDERS = {
+    "fp32": _build_fp32,
+    "channels_last": _build_channels_last,
+    "int8_dynamic": _build_int8_dynamic,
+    "int8_static": _build_int8_static,
+    "torchscript": _build_torchscript,
+}
+
+
+def _predict(model, samples):
+    with torch.inference_mode():
+        return torch.cat([torch.softmax(model(batch), dim=1) for batch in _batches(samples)])
+
+
+def _latency_ms(model, samples, repeats=3):
+    batch = samples[:16]
+    with torch.inference_mode():
+        model(batch)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(batch)
+    return (time.perf_counter() - start) / repeats / len(batch) * 1000.0
+
+
+def parity_report(mode, reference, candidate, samples, min_agreement=MIN_TOP1_AGREEMENT, max_drift=MAX_PROB_DRIFT):
+    ref_probs = _predict(reference, samples)
+    probs = _predict(candidate, samples)
+    drift = (probs - ref_probs).abs()
+    agreement = (probs.argmax(dim=1) == ref_probs.argmax(dim=1)).float().mean().item()
+    report = {
+        "mode": mode,
+        "parity_samples": len(samples),
+        "top1_agreement": round(agreement, 4),
+        "max_prob_drift": round(drift.max().item(), 6),
+        "mean_prob_drift": round(drift.mean().item(), 6),
+        "min_top1_agreement": min_agreement,
+        "max_allowed_drift": max_drift,
+        "fp32_ms_per_image": round(_latency_ms(reference, samples), 3),
+        "ms_per_image": round(_latency_ms(candidate, samples), 3),
+    }
+    report["passed"] = agreement >= min_agreement and report["max_prob_drift"] <= max_drift
+    return report
+
+
+def build_inference_model(model, mode, samples, holdout=None, min_agreement=MIN_TOP1_AGREEMENT,
+                          max_drift=MAX_PROB_DRIFT):
+    """
+    Calibrate `mode` on `samples` and check it against the fp32 `model` on
+    `holdout` (see load_calibration_split), or on `samples` if none is given.
+    Returns (optimized_model, report); raises ParityError if the check fails.
+    """
+    if mode not in BUILDERS:
+        raise ValueError(f"Unknown inference mode {mode!r}; choose from {', '.join(MODES)}")
+    model.eval()
+    optimized = BUILDERS[mode](model, samples)
+    parity_samples = samples if holdout is None else holdout
+    report = parity_report(mode, model, optimized, parity_samples, min_agreement, max_drift)
+    report["calibration_samples"] = len(samples)
+    report["parity_on_calibration_samples"] = holdout is None
+    PARITY_REPORTS[mode] = report
+    if not report["passed"]:
+        raise ParityError(report)
+    return optimized, report
+
+
+def make_loader(mode, sample_dir, arch="resnet18"):
+    """
+    Registry loader for a SkinClassifier backbone in `mode`. Falls back to the
+    fp32 model (and records why) when calibration or the parity check fails.
+    """
+    from model_registry import load_skin_classifier
+
+    def loader(weights_path):
+        model = load_skin_classifier(weights_path, arch)
+        if mode == "fp32":
+            return model
+        try:
+            optimized, report = build_inference_model(model, mode, *load_calibration_split(sample_dir))
+        except (ParityError, ValueError, RuntimeError) as exc:
+            report = dict(exc.report) if isinstance(exc, ParityError) else {"mode": mode, "passed": False}
+            report.update({"fallback": "fp32", "error": str(exc)})
+            PARITY_REPORTS[mode] = report
+            print(f"⚠️ Inference mode '{mode}' not enabled, serving fp32: {exc}", file=sys.stderr)
+            return model
+        print(f"✅ Inference mode '{mode}' enabled: {json.dumps(report)}", file=sys.stderr)
+        return optimized
+
+    return loader
+
+
+def main(argv=None):
+    from model_registry import load_skin_classifier
+
+    parser = argparse.ArgumentParser(description="Calibrate and parity-check SkinClassifier CPU inference modes.")
+    parser.add_argument("--weights", default="D:/Aura_derm/models/skin_classifier.pth")
+    parser.add_argument("--arch", default="resnet18", help="Backbone the weights were trained with")
+    parser.add_argument("--samples", required=True, help="Directory of sample face images")
+    parser.add_argument("--limit", type=int, default=64, help="Images in total, split between calibration and parity")
+    parser.add_argument("--modes", default="all", help=f"Comma-separated subset of: {','.join(MODES)}")
+    parser.add_argument("--out", default=None, help="Optional JSON file for the parity reports")
+    args = parser.parse_args(argv)
+
+    modes = MODES if args.modes == "all" else args.modes.split(",")
+    samples, holdout = load_calibration_split(args.samples, args.limit)
+    reports = []
+    for mode in modes:
+        model = load_skin_classifier(args.weights, args.arch)
+        try:
+            _, report = build_inference_model(model, mode, samples, holdout)
+        except ParityError as exc:
+            report = exc.report
+        reports.append(report)
+        status = "PASS" if report["passed"] else "FAIL"
+        print(f"{mode:<14} {status}  top1={report['top1_agreement']:.3f}  "
+              f"drift={report['max_prob_drift']:.4f}  {report['ms_per_image']:.2f} ms/img "
+              f"(fp32 {report['fp32_ms_per_image']:.2f})")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
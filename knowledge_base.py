@@ -0,0 +1,145 @@
+# app/knowledge_base.py
+#
+# Condition -> products / acids / diet / timing recommendations, loaded once
+# from knowledge_base.json into an immutable, normalized index.
+#
+#   from knowledge_base import lookup
+#   lookup("Dark_Spots")["acids"]
+#   lookup(["acne", "pigmentation"])   # merged, de-duplicated recommendations
+
+import functools
+import json
+import os
+import re
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+
+KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json")
+
+
+def normalize_condition(name):
+    """'Dark_Spots', 'dark-spots ' and 'DARK SPOTS' all become 'dark spots'."""
+    return re.sub(r"[\s_\-]+", " ", str(name)).strip().lower()
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Plain dicts and lists from frozen lookup results, e.g. for pickling or JSON."""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _unique(items, key=None):
+    seen = set()
+    result = []
+    for item in items:
+        marker = item if key is None else item[key]
+        if marker not in seen:
+            seen.add(marker)
+            result.append(item)
+    return tuple(result)
+
+
+class KnowledgeBase:
+    """
+    Read-only recommendation store. Entries and lookup results are tuples and
+    MappingProxyType views, so they can be shared between sessions and threads
+    without copying.
+    """
+
+    def __init__(self, data):
+        conditions = {}
+        aliases = {}
+        for name, entry in data["conditions"].items():
+            key = normalize_condition(name)
+            entry = dict(entry)
+            entry.pop("aliases", None)
+            entry["condition"] = key
+            conditions[key] = _freeze(entry)
+            for alias in data["conditions"][name].get("aliases", ()):
+                aliases[normalize_condition(alias)] = key
+        aliases.update({key: key for key in conditions})
+
+        self.version = data.get("version")
+        self._conditions = MappingProxyType(conditions)
+        self._aliases = MappingProxyType(aliases)
+        self._cached_lookup = functools.lru_cache(maxsize=256)(self._build_result)
+
+    @classmethod
+    def from_file(cls, path=KB_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def conditions(self):
+        return tuple(self._conditions)
+
+    def resolve(self, condition):
+        """Canonical condition name, or None if it is not in the knowledge base."""
+        return self._aliases.get(normalize_condition(condition))
+
+    def get(self, condition):
+        """The frozen entry for one condition, or None."""
+        key = self.resolve(condition)
+        return None if key is None else self._conditions[key]
+
+    def lookup(self, conditions):
+        """
+        Products, acids, diet, habits to avoid and timing for one condition name
+        or a sequence of them. Results for several conditions are merged in
+        order without duplicates; repeated lookups are served from a cache.
+        """
+        if isinstance(conditions, str):
+            conditions = (conditions,)
+        return self._cached_lookup(tuple(conditions))
+
+    def _build_result(self, conditions):
+        entries, unknown = [], []
+        for condition in conditions:
+            entry = self.get(condition)
+            if entry is None:
+                unknown.append(condition)
+            elif entry not in entries:
+                entries.append(entry)
+
+        return MappingProxyType({
+            "conditions": tuple(entry["condition"] for entry in entries),
+            "products": _unique((p for entry in entries for p in entry["products"]), key="name"),
+            "acids": _unique(a for entry in entries for a in entry["acids"]),
+            "diet": MappingProxyType({
+                "eat": _unique(food for entry in entries for food in entry["diet"]["eat"]),
+                "avoid": _unique(food for entry in entries for food in entry["diet"]["avoid"]),
+            }),
+            "avoid_habits": _unique(h for entry in entries for h in entry["avoid_habits"]),
+            "timing": MappingProxyType({entry["condition"]: entry["timing"] for entry in entries}),
+            "unknown": tuple(unknown),
+        })
+
+
+_kb = None
+_kb_lock = threading.Lock()
+
+
+def get_knowledge_base():
+    """Process-wide knowledge base, compiled from KB_PATH on first use."""
+    global _kb
+    if _kb is None:
+        with _kb_lock:
+            if _kb is None:
+                _kb = KnowledgeBase.from_file()
+    return _kb
+
+
+def lookup(conditions):
+    return get_knowledge_base().lookup(conditions)
@@ -0,0 +1,461 @@
+# app/live_analysis.py
+#
+# Live analysis of a continuous frame stream: a webcam, or a video file for
+# local testing.
+#
+#   capture thread ───► latest-frame slot (one frame; an unread frame is replaced, never queued)
+#   analysis thread ──► change check ─► smoothed result at the target FPS ─► bounded results queue
+#                              └─► classify? ─► inference thread ─► EMA-smoothed probabilities
+#
+# The analysis thread emits one result per frame at up to the target FPS, using
+# the latest smoothed probabilities, while the model runs on its own thread.
+# A frame is sent to the model when the model is idle, at least one inference
+# latency (and one target frame interval) has passed since the last one
+# started, and the scene changed enough since the last classified frame, or the
+# last classification is older than max_interval. Frames that arrive faster
+# than the target FPS are dropped in the slot instead of building a backlog, so
+# output never lags the camera.
+#
+#   python live_analysis.py --source 0 --target-fps 15                 # webcam 0
+#   python live_analysis.py --source clip.mp4 --duration 30 --report live.json
+
+import argparse
+import json
+import math
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from capabilities import get_capabilities
+from preprocess import MODEL_SIZE
+from constants import CLASS_NAMES
+from tracing import span
+
+SIGNATURE_SIZE = 32
+
+
+class LiveResult:
+    """Smoothed prediction for one processed frame."""
+
+    def __init__(self, frame_index, timestamp, probabilities, label, classified, change, inference_ms,
+                 model_frame=None):
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+        self.probabilities = probabilities
+        self.label = label
+        self.classified = classified
+        self.change = change
+        self.inference_ms = inference_ms
+        # Most recent frame the smoothed probabilities include
+        self.model_frame = model_frame
+
+    def as_dict(self, class_names=CLASS_NAMES):
+        return {
+            "frame": self.frame_index,
+            "timestamp": round(self.timestamp, 3),
+            "label": self.label,
+            "probabilities": {name: round(float(p), 4) for name, p in zip(class_names, self.probabilities)},
+            "classified": self.classified,
+            "change": round(self.change, 4),
+            "inference_ms": None if self.inference_ms is None else round(self.inference_ms, 2),
+            "model_frame": self.model_frame,
+        }
+
+
+class LatestFrame:
+    """Single-slot frame buffer: put() replaces an unread frame (counted as dropped)."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._index = -1
+        self._taken = -1
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, index, frame):
+        with self._cond:
+            if self._frame is not None and self._taken < self._index:
+                self.dropped += 1
+            self._frame, self._index = frame, index
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """(index, frame) newer than the last one taken, or None on timeout / close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._index > self._taken or self.closed, timeout):
+                return None
+            if self._index <= self._taken:
+                return None
+            self._taken = self._index
+            return self._index, self._frame
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def frame_signature(frame):
+    """Tiny grayscale thumbnail in [0, 1] used to measure frame-to-frame change."""
+    cv2 = get_capabilities().load("opencv")
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32) / 255.0
+
+
+def frame_to_model_array(frame, size=MODEL_SIZE):
+    cv2 = get_capabilities().load("opencv")
+    return np.ascontiguousarray(cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA))
+
+
+class TemporalSmoother:
+    """
+    Exponential moving average of class probabilities with label hysteresis:
+    the reported label only switches when another class leads it by `margin`.
+    A scene cut (change above reset_change) restarts the average.
+    """
+
+    def __init__(self, alpha=0.4, margin=0.1, reset_change=0.04):
+        self.alpha = alpha
+        self.margin = margin
+        self.reset_change = reset_change
+        self.probabilities = None
+        self.label_index = None
+
+    def update(self, probabilities, change=0.0):
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        if self.probabilities is None or change >= self.reset_change:
+            self.probabilities = probabilities.copy()
+            self.label_index = int(probabilities.argmax())
+        else:
+            self.probabilities = self.alpha * probabilities + (1.0 - self.alpha) * self.probabilities
+            best = int(self.probabilities.argmax())
+            if self.probabilities[best] - self.probabilities[self.label_index] >= self.margin:
+                self.label_index = best
+        return self.probabilities, self.label_index
+
+
+class AdaptiveScheduler:
+    """
+    Decides per frame whether to start an inference, from inference latency and
+    frame change. The gate is time-based, so it does not depend on the source's
+    frame rate.
+    """
+
+    def __init__(self, target_fps=15.0, change_threshold=0.02, max_interval=2.0, latency_alpha=0.2):
+        self.frame_budget = 1.0 / target_fps
+        self.change_threshold = change_threshold
+        self.max_interval = max_interval
+        self.latency_alpha = latency_alpha
+        self.latency = None
+        self.last_time = -math.inf
+
+    @property
+    def min_interval(self):
+        """Seconds between inference starts: no more often than the target FPS or the model's latency allows."""
+        return self.frame_budget if self.latency is None else max(self.frame_budget, self.latency)
+
+    def should_classify(self, change, now):
+        since = now - self.last_time
+        if since < self.min_interval:
+            return False
+        return change >= self.change_threshold or since >= self.max_interval
+
+    def started(self, now):
+        self.last_time = now
+
+    def finished(self, seconds):
+        self.latency = seconds if self.latency is None else (
+            self.latency_alpha * seconds + (1.0 - self.latency_alpha) * self.latency
+        )
+
+
+class FrameSource:
+    """
+    cv2.VideoCapture on a camera index or a video file. Files are paced at
+    their own frame rate (or target_fps if unknown), so they behave like a
+    camera: frames keep coming whether or not the analysis keeps up.
+    """
+
+    def __init__(self, source, target_fps=15.0, loop=False):
+        cv2 = get_capabilities().load("opencv")
+        self.source = int(source) if str(source).isdigit() else source
+        self.is_file = not isinstance(self.source, int)
+        self.loop = loop
+        self._capture = cv2.VideoCapture(self.source)
+        if not self._capture.isOpened():
+            raise OSError(f"Could not open video source {source!r}")
+        fps = self._capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else target_fps
+
+    def frames(self, stop):
+        """Yield RGB frames until the source ends or `stop` is set."""
+        cv2 = get_capabilities().load("opencv")
+        interval = 1.0 / self.fps
+        next_time = time.perf_counter()
+        while not stop.is_set():
+            ok, frame = self._capture.read()
+            if not ok:
+                if self.is_file and self.loop:
+                    self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                return
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if self.is_file:
+                next_time += interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.perf_counter()
+
+    def release(self):
+        self._capture.release()
+
+
+class LiveAnalyzer:
+    """
+    Runs capture, analysis and inference on three threads. `predict(model_array)` returns
+    class probabilities for a 224px uint8 RGB array, e.g.
+    lambda a: service.infer_array(a)[1] for an AnalysisService.
+    """
+
+    def __init__(self, predict, class_names=CLASS_NAMES, target_fps=15.0, change_threshold=0.02,
+                 max_interval=2.0, alpha=0.4, margin=0.1, reset_change=0.04, max_results=64, history=512):
+        self.predict = predict
+        self.class_names = list(class_names)
+        self.target_fps = target_fps
+        self.scheduler = AdaptiveScheduler(target_fps, change_threshold, max_interval)
+        self.smoother = TemporalSmoother(alpha, margin, reset_change)
+        self.results = queue.Queue(maxsize=max_results)
+        self._slot = LatestFrame()
+        # At most one frame waits for the model, and only while it is idle
+        self._requests = queue.Queue(maxsize=1)
+        self._busy = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        # Guards the smoother, the scheduler's latency and the metrics, shared with the inference thread
+        self._lock = threading.Lock()
+        self._latest = None
+        self._latest_frame = None
+        self._signature = None
+        self._model_frame = None
+        self._new_inference = None
+
+        # === Metrics ===
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.frames_classified = 0
+        self.results_dropped = 0
+        self.errors = 0
+        self.started_at = None
+        self._inference_times = deque(maxlen=history)
+        self._processed_at = deque(maxlen=history)
+
+    def start(self, source, loop=False):
+        frame_source = source if isinstance(source, FrameSource) else FrameSource(source, self.target_fps, loop)
+        self.started_at = time.perf_counter()
+        self._threads = [
+            threading.Thread(target=self._capture, args=(frame_source,), name="live-capture", daemon=True),
+            threading.Thread(target=self._analyze, name="live-analysis", daemon=True),
+            threading.Thread(target=self._infer, name="live-inference", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._slot.close()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _capture(self, frame_source):
+        try:
+            for frame in frame_source.frames(self._stop):
+                self._slot.put(self.frames_captured, frame)
+                self.frames_captured += 1
+        finally:
+            frame_source.release()
+            self._slot.close()
+
+    def _analyze(self):
+        try:
+            while not self._stop.is_set():
+                item = self._slot.get(timeout=0.5)
+                if item is None:
+                    if self._slot.closed:
+                        return
+                    continue
+                index, frame = item
+                now = time.perf_counter()
+                self._process(index, frame, now)
+                # Pace the output to the target FPS; frames captured meanwhile are dropped in the slot
+                self._stop.wait(max(0.0, now + self.scheduler.frame_budget - time.perf_counter()))
+        finally:
+            # The source ended (or stop() was called): let the inference thread finish too
+            self._stop.set()
+
+    def _process(self, index, frame, now):
+        with span("live.change"):
+            signature = frame_signature(frame)
+            change = 1.0 if self._signature is None else float(np.abs(signature - self._signature).mean())
+
+        with self._lock:
+            start_inference = not self._busy.is_set() and self.scheduler.should_classify(change, now)
+            if start_inference:
+                self.scheduler.started(now)
+        if start_inference:
+            # Change is measured against the last classified frame, so slow drift still adds up
+            self._signature = signature
+            self._busy.set()
+            self._requests.put_nowait((index, frame, change))
+
+        with self._lock:
+            if self.smoother.probabilities is None:
+                return
+            smoothed, label_index = self.smoother.probabilities.copy(), self.smoother.label_index
+            model_frame, inference_ms = self._model_frame, self._new_inference
+            self._new_inference = None
+            self.frames_processed += 1
+            self._processed_at.append(time.perf_counter())
+
+        result = LiveResult(index, time.time(), smoothed, self.class_names[label_index],
+                            inference_ms is not None, change, inference_ms, model_frame)
+        with self._lock:
+            self._latest, self._latest_frame = result, frame
+        self._publish(result)
+
+    def _infer(self):
+        while not self._stop.is_set():
+            try:
+                index, frame, change = self._requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            try:
+                with span("live.classify"):
+                    probabilities = np.asarray(self.predict(frame_to_model_array(frame)), dtype=np.float32)
+            except Exception as exc:
+                with self._lock:
+                    self.errors += 1
+                print(f"⚠️ Live inference failed: {exc}", file=sys.stderr)
+            else:
+                seconds = time.perf_counter() - start
+                with self._lock:
+                    self.scheduler.finished(seconds)
+                    self.smoother.update(probabilities, change)
+                    self._model_frame = index
+                    self._new_inference = seconds * 1000.0
+                    self._inference_times.append(seconds)
+                    self.frames_classified += 1
+            finally:
+                self._busy.clear()
+
+    def _publish(self, result):
+        # Bounded: a slow consumer loses the oldest results, never stalls the analysis
+        while True:
+            try:
+                self.results.put_nowait(result)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                    self.results_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def latest(self):
+        """(LiveResult, RGB frame) of the most recently processed frame, or (None, None)."""
+        with self._lock:
+            return self._latest, self._latest_frame
+
+    def stats(self):
+        with self._lock:
+            inference_ms = np.array(list(self._inference_times)) * 1000.0
+            processed = list(self._processed_at)
+            min_interval = self.scheduler.min_interval
+        window_fps = (len(processed) - 1) / (processed[-1] - processed[0]) if len(processed) > 1 else 0.0
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            "target_fps": self.target_fps,
+            "processed_fps": round(window_fps, 2),
+            "elapsed_s": round(elapsed, 2),
+            "frames_captured": self.frames_captured,
+            "frames_processed": self.frames_processed,
+            "frames_classified": self.frames_classified,
+            "frames_dropped": self._slot.dropped,
+            "results_dropped": self.results_dropped,
+            "errors": self.errors,
+            "min_inference_interval_ms": round(min_interval * 1000.0, 1),
+            "inference_ms_p50": round(float(np.percentile(inference_ms, 50)), 2) if len(inference_ms) else None,
+            "inference_ms_p95": round(float(np.percentile(inference_ms, 95)), 2) if len(inference_ms) else None,
+        }
+
+
+def main(argv=None):
+    from analysis_service import AnalysisService
+
+    parser = argparse.ArgumentParser(description="Live skin analysis on a webcam or video file.")
+    parser.add_argument("--source", default="0", help="Camera index or video file")
+    parser.add_argument("--weights", default="D:/Aura_derm/models/skin_classifier.pth")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--arch", default="resnet18")
+    parser.add_argument("--target-fps", type=float, default=15.0)
+    parser.add_argument("--change-threshold", type=float, default=0.02,
+                        help="Mean absolute change of the 32x32 signature that triggers a new inference")
+    parser.add_argument("--max-interval", type=float, default=2.0, help="Re-classify a static scene this often")
+    parser.add_argument("--alpha", type=float, default=0.4, help="EMA weight of the newest prediction")
+    parser.add_argument("--reset-change", type=float, default=0.04, help="Change treated as a scene cut (restarts smoothing)")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument("--loop", action="store_true", help="Loop a video file")
+    parser.add_argument("--report", default=None, help="Write final stats and the result timeline as JSON")
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(args.backend, args.weights, f"live_{args.arch}_{args.backend}", arch=args.arch)
+    service.prewarm()
+    analyzer = LiveAnalyzer(
+        lambda array: service.infer_array(array)[1], target_fps=args.target_fps,
+        change_threshold=args.change_threshold, max_interval=args.max_interval, alpha=args.alpha,
+        reset_change=args.reset_change,
+    ).start(args.source, loop=args.loop)
+
+    timeline = []
+    last_print = time.perf_counter()
+    try:
+        while analyzer.running():
+            try:
+                timeline.append(analyzer.results.get(timeout=0.5).as_dict(analyzer.class_names))
+            except queue.Empty:
+                pass
+            if time.perf_counter() - last_print >= 1.0:
+                last_print = time.perf_counter()
+                stats = analyzer.stats()
+                label = timeline[-1]["label"] if timeline else "-"
+                print(f"{stats['elapsed_s']:6.1f}s  {label:<13} {stats['processed_fps']:5.1f} fps  "
+                      f"classified {stats['frames_classified']}/{stats['frames_processed']}  "
+                      f"dropped {stats['frames_dropped']}")
+            if args.duration and analyzer.stats()["elapsed_s"] >= args.duration:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        analyzer.stop()
+
+    stats = analyzer.stats()
+    print(json.dumps(stats, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"stats": stats, "timeline": timeline}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,44 @@
 
 import torch
 import torch.nn as nn
-from torchvision import models
+from torchvision import models, transforms
+
+from constants import CLASS_NAMES
+IMAGE_SIZE = 224
+
+def build_transform():
+    """Preprocessing shared by the app, batch scoring and benchmarks."""
+    return transforms.Compose([
+        transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+        transforms.ToTensor()
+    ])
+
+# === Model zoo ===
+# Backbones SkinClassifier can be built on. resnet18 is the original model;
+# the others are compact students for CPU serving (see --teacher in train_skin_model.py).
+ARCHITECTURES = ('resnet18', 'mobilenet_v3_small', 'efficientnet_b0')
+
+def build_backbone(arch, num_classes, pretrained=False):
+    """torchvision backbone with its last layer replaced by a num_classes head."""
+    weights = "DEFAULT" if pretrained else None
+    if arch == 'resnet18':
+        model = models.resnet18(weights=weights)
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    elif arch == 'mobilenet_v3_small':
+        model = models.mobilenet_v3_small(weights=weights)
+        model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, num_classes)
+    elif arch == 'efficientnet_b0':
+        model = models.efficientnet_b0(weights=weights)
+        model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, num_classes)
+    else:
+        raise ValueError(f"Unknown architecture {arch!r}; choose from {', '.join(ARCHITECTURES)}")
+    return model
 
 class SkinClassifier(nn.Module):
-    def __init__(self, num_classes=4):
+    def __init__(self, num_classes=4, arch='resnet18', pretrained=False):
         super(SkinClassifier, self).__init__()
-        self.model = models.resnet18(pretrained=False)
-        self.model.fc = nn.Linear(self.model.fc.in_features, num_classes)
+        self.arch = arch
+        self.model = build_backbone(arch, num_classes, pretrained)
 
     def forward(self, x):
         return self.model(x)
-        st.markdown("### Your Skin Condition Prediction")       
@@ -0,0 +1,158 @@
+# app/model_registry.py
+
+import hashlib
+import os
+import threading
+import time
+
+from process_stats import rss_bytes
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def load_skin_classifier(weights_path, arch="resnet18"):
+    """Default loader: a CPU SkinClassifier in eval mode."""
+    import torch
+    from main import SkinClassifier
+
+    model = SkinClassifier(arch=arch)
+    model.load_state_dict(torch.load(weights_path, map_location=torch.device('cpu')))
+    model.eval()
+    return model
+
+
+class LoadedModel:
+    """A loaded model plus the bookkeeping collected while loading it."""
+
+    def __init__(self, name, model, weights_path, version, mtime, load_seconds,
+                 warmup_seconds, param_bytes, rss_delta_bytes):
+        self.name = name
+        self.model = model
+        self.weights_path = weights_path
+        self.version = version
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+        self.param_bytes = param_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+        self.loaded_at = time.time()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "weights_path": self.weights_path,
+            "version": self.version,
+            "load_seconds": round(self.load_seconds, 4),
+            "warmup_seconds": round(self.warmup_seconds, 4),
+            "param_mb": round(self.param_bytes / 2**20, 2),
+            "rss_delta_mb": None if self.rss_delta_bytes is None else round(self.rss_delta_bytes / 2**20, 2),
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models.
+
+    Each model is loaded and warmed up once and then shared by every caller
+    (i.e. every Streamlit session). The weights file is re-checked at most every
+    `check_interval` seconds and the model is reloaded when it changes on disk.
+    torch is only imported for torch models, so loaders for other runtimes
+    (e.g. ONNX Runtime) can pass warmup_shape=None and warm up themselves.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._loaders = {}
+        self._last_check = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, weights_path, loader=load_skin_classifier, warmup_shape=(1, 3, 224, 224)):
+        entry = self._entries.get(name)
+        if entry is not None and entry.weights_path == weights_path and not self._is_stale(name, entry):
+            return entry
+
+        with self._lock:
+            # Another thread may have finished the load while we waited
+            entry = self._entries.get(name)
+            if entry is None or entry.weights_path != weights_path or self._is_stale(name, entry, force=True):
+                entry = self._load(name, weights_path, loader, warmup_shape)
+                self._entries[name] = entry
+                self._loaders[name] = (loader, warmup_shape)
+            return entry
+
+    def reload(self, name):
+        """Force a reload of an already registered model."""
+        with self._lock:
+            entry = self._entries.pop(name, None)
+        if entry is None:
+            raise KeyError(f"Model '{name}' is not loaded")
+        loader, warmup_shape = self._loaders[name]
+        return self.get(name, entry.weights_path, loader, warmup_shape)
+
+    def stats(self):
+        return {name: entry.stats() for name, entry in self._entries.items()}
+
+    def _is_stale(self, name, entry, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_check.get(name, 0.0) < self.check_interval:
+            return False
+        self._last_check[name] = now
+        try:
+            return os.stat(entry.weights_path).st_mtime_ns != entry.mtime
+        except OSError:
+            # Keep serving the loaded weights if the file disappears mid-deploy
+            return False
+
+    def _load(self, name, weights_path, loader, warmup_shape):
+        mtime = os.stat(weights_path).st_mtime_ns
+        rss_before = rss_bytes()
+
+        start = time.perf_counter()
+        model = loader(weights_path)
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if warmup_shape is not None:
+            import torch
+            with torch.inference_mode():
+                model(torch.zeros(warmup_shape))
+        warmup_seconds = time.perf_counter() - start
+
+        rss_after = rss_bytes()
+        if hasattr(model, "state_dict"):
+            import torch
+            # Quantized modules keep packed params that are not plain tensors
+            param_bytes = sum(
+                t.numel() * t.element_size() for t in model.state_dict().values() if isinstance(t, torch.Tensor)
+            )
+        else:
+            # Non-torch runtimes: size of the model file plus any external-data sidecar
+            param_bytes = sum(
+                os.path.getsize(p) for p in (weights_path, weights_path + ".data") if os.path.exists(p)
+            )
+        return LoadedModel(
+            name=name,
+            model=model,
+            weights_path=weights_path,
+            version=f"{name}-{_file_digest(weights_path)}",
+            mtime=mtime,
+            load_seconds=load_seconds,
+            warmup_seconds=warmup_seconds,
+            param_bytes=param_bytes,
+            rss_delta_bytes=None if rss_before is None or rss_after is None else rss_after - rss_before,
+        )
+
+
+_registry = ModelRegistry()
+
+
+def get_registry():
+    return _registry
@@ -0,0 +1,284 @@
+# app/onnx_backend.py
+#
+# ONNX export of SkinClassifier / UNet++ and a torch-free ONNX Runtime backend.
+#
+#   python onnx_backend.py export --weights models/skin_classifier.pth --out models/skin_classifier.onnx
+#   python onnx_backend.py export --segmenter-weights models/unetpp.pth --segmenter-out models/unetpp.onnx
+#   python onnx_backend.py verify --weights models/skin_classifier.pth --onnx models/skin_classifier.onnx \
+#       --samples "data set/acne"
+#   python onnx_backend.py verify --segmenter-weights models/unetpp.pth --segmenter-onnx models/unetpp.onnx \
+#       --samples "data set/acne"
+#
+# export verifies each exported model the same way when --samples is given.
+#
+# Only numpy, Pillow and onnxruntime are imported at module level; torch is
+# needed for export and verification only.
+
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+CLASSIFIER_SIZE = 224
+SEGMENTER_SIZE = 256
+SEGMENTER_ISSUES = ['acne', 'pigmentation', 'wrinkles']
+
+
+def preprocess_numpy(image, size=CLASSIFIER_SIZE):
+    """
+    numpy equivalent of transforms.Compose([Resize((size, size)), ToTensor()])
+    for a PIL image: bilinear PIL resize, HWC uint8 -> CHW float32 in [0, 1].
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    resized = image.resize((size, size), Image.BILINEAR)
+    array = np.asarray(resized, dtype=np.float32).transpose(2, 0, 1)
+    return np.ascontiguousarray(array / np.float32(255.0))
+
+
+def softmax_numpy(logits, axis=-1):
+    shifted = logits - logits.max(axis=axis, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=axis, keepdims=True)
+
+
+def _session(onnx_path, intra_op_threads=0):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    return ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxClassifier:
+    """Callable (N, 3, 224, 224) float32 array -> (N, num_classes) logits."""
+
+    def __init__(self, onnx_path, intra_op_threads=0):
+        self.session = _session(onnx_path, intra_op_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+
+class OnnxSegmenter:
+    """ONNX Runtime counterpart of SkinSegmenter.analyze that does not need torch."""
+
+    def __init__(self, onnx_path, intra_op_threads=0):
+        self.session = _session(onnx_path, intra_op_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def analyze(self, image_path):
+        image = Image.open(image_path).convert("RGB")
+        input_array = preprocess_numpy(image, SEGMENTER_SIZE)[None]
+        output = self.session.run(None, {self.input_name: input_array})[0]
+        probs = softmax_numpy(output, axis=1)[0]  # (3, 256, 256)
+        return {issue: bool(probs[i].mean() > 0.05) for i, issue in enumerate(SEGMENTER_ISSUES)}
+
+
+def load_onnx_classifier(onnx_path):
+    """Registry loader for the ONNX Runtime classifier, warmed up on a zero batch."""
+    model = OnnxClassifier(onnx_path)
+    model(np.zeros((1, 3, CLASSIFIER_SIZE, CLASSIFIER_SIZE), dtype=np.float32))
+    return model
+
+
+# === Export (needs torch) ===
+
+def export_classifier(weights_path, out_path, opset=17, arch="resnet18"):
+    import torch
+    from model_registry import load_skin_classifier
+
+    model = load_skin_classifier(weights_path, arch)
+    dummy = torch.zeros(1, 3, CLASSIFIER_SIZE, CLASSIFIER_SIZE)
+    torch.onnx.export(
+        model, dummy, out_path,
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+    )
+    return out_path
+
+
+def export_segmenter(weights_path, out_path, opset=17):
+    import torch
+    from unetplusplus import UNetPP
+
+    model = UNetPP(num_classes=3)
+    model.load_state_dict(torch.load(weights_path, map_location='cpu'))
+    model.eval()
+    dummy = torch.zeros(1, 3, SEGMENTER_SIZE, SEGMENTER_SIZE)
+    torch.onnx.export(
+        model, dummy, out_path,
+        input_names=["input"], output_names=["masks"],
+        dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"},
+                      "masks": {0: "batch", 2: "height", 3: "width"}},
+        opset_version=opset,
+    )
+    return out_path
+
+
+def _sample_paths(sample_dir, limit):
+    paths = []
+    for root, _, files in os.walk(sample_dir):
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    if not paths:
+        raise ValueError(f"No sample images found in {sample_dir!r}")
+    return paths[:limit]
+
+
+def verify_classifier(weights_path, onnx_path, sample_dir, limit=64, arch="resnet18"):
+    """
+    Compare the numpy+ONNX Runtime path against torchvision+torch on sample
+    images. Returns a dict with preprocessing and logit differences.
+    """
+    import torch
+    from main import build_transform
+    from model_registry import load_skin_classifier
+
+    transform = build_transform()
+    model = load_skin_classifier(weights_path, arch)
+    session = OnnxClassifier(onnx_path)
+
+    paths = _sample_paths(sample_dir, limit)
+
+    preprocess_diff = 0.0
+    torch_batch, numpy_batch = [], []
+    for path in paths:
+        image = Image.open(path).convert("RGB")
+        reference = transform(image)
+        candidate = preprocess_numpy(image)
+        preprocess_diff = max(preprocess_diff, float(np.abs(reference.numpy() - candidate).max()))
+        torch_batch.append(reference)
+        numpy_batch.append(candidate)
+
+    with torch.inference_mode():
+        torch_logits = model(torch.stack(torch_batch)).numpy()
+    onnx_logits = session(np.stack(numpy_batch))
+    return {
+        "samples": len(paths),
+        "preprocess_max_abs_diff": preprocess_diff,
+        "logits_max_abs_diff": float(np.abs(torch_logits - onnx_logits).max()),
+        "prob_max_abs_diff": float(np.abs(softmax_numpy(torch_logits) - softmax_numpy(onnx_logits)).max()),
+        "top1_agreement": float((torch_logits.argmax(1) == onnx_logits.argmax(1)).mean()),
+    }
+
+
+def verify_segmenter(weights_path, onnx_path, sample_dir, limit=16, presence_threshold=0.05, mask_threshold=0.5):
+    """
+    Compare OnnxSegmenter's numpy+ONNX Runtime path against torch UNet++ on
+    sample images: softmax mask differences and agreement of the thresholded
+    masks and of the per-issue detections.
+    """
+    import torch
+    from torchvision import transforms
+    from unetplusplus import UNetPP
+
+    transform = transforms.Compose([transforms.Resize((SEGMENTER_SIZE, SEGMENTER_SIZE)), transforms.ToTensor()])
+    model = UNetPP(num_classes=3)
+    model.load_state_dict(torch.load(weights_path, map_location='cpu'))
+    model.eval()
+    session = OnnxSegmenter(onnx_path)
+
+    preprocess_diff = prob_diff = 0.0
+    pixels_equal = pixels = detections_equal = detections = 0
+    paths = _sample_paths(sample_dir, limit)
+    for path in paths:
+        image = Image.open(path).convert("RGB")
+        reference = transform(image)
+        candidate = preprocess_numpy(image, SEGMENTER_SIZE)
+        preprocess_diff = max(preprocess_diff, float(np.abs(reference.numpy() - candidate).max()))
+        # One image at a time keeps memory flat at full mask resolution
+        with torch.inference_mode():
+            torch_probs = torch.softmax(model(reference[None]), dim=1).numpy()[0]
+        onnx_probs = softmax_numpy(session.session.run(None, {session.input_name: candidate[None]})[0], axis=1)[0]
+        prob_diff = max(prob_diff, float(np.abs(torch_probs - onnx_probs).max()))
+        pixels_equal += int(((torch_probs > mask_threshold) == (onnx_probs > mask_threshold)).sum())
+        pixels += torch_probs.size
+        detected = (torch_probs.mean(axis=(1, 2)) > presence_threshold, onnx_probs.mean(axis=(1, 2)) > presence_threshold)
+        detections_equal += int((detected[0] == detected[1]).sum())
+        detections += len(SEGMENTER_ISSUES)
+    return {
+        "samples": len(paths),
+        "preprocess_max_abs_diff": preprocess_diff,
+        "prob_max_abs_diff": prob_diff,
+        "mask_pixel_agreement": pixels_equal / pixels,
+        "detection_agreement": detections_equal / detections,
+    }
+
+
+def _check(name, report, tolerance):
+    """Print a verification report; True if it is within tolerance."""
+    print(f"{name}:")
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+    agreement = report.get("top1_agreement", report.get("detection_agreement"))
+    if report["prob_max_abs_diff"] > tolerance or agreement < 1.0:
+        print(f"❌ ONNX Runtime {name} output does not match torch", file=sys.stderr)
+        return False
+    print(f"✅ ONNX Runtime {name} output matches torch")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Aura Derm models to ONNX and verify ONNX Runtime parity.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export")
+    export.add_argument("--weights", default=None, help="SkinClassifier .pth")
+    export.add_argument("--arch", default="resnet18", help="Backbone the weights were trained with")
+    export.add_argument("--out", default="D:/Aura_derm/models/skin_classifier.onnx")
+    export.add_argument("--segmenter-weights", default=None, help="UNet++ .pth")
+    export.add_argument("--segmenter-out", default="D:/Aura_derm/models/unetpp.onnx")
+    export.add_argument("--opset", type=int, default=17)
+    export.add_argument("--samples", default=None, help="Verify the exported models on these images")
+
+    verify = sub.add_parser("verify")
+    verify.add_argument("--weights", default=None, help="SkinClassifier .pth")
+    verify.add_argument("--onnx", default=None)
+    verify.add_argument("--segmenter-weights", default=None, help="UNet++ .pth")
+    verify.add_argument("--segmenter-onnx", default=None)
+    verify.add_argument("--samples", required=True)
+    verify.add_argument("--arch", default="resnet18")
+
+    for command in (export, verify):
+        command.add_argument("--limit", type=int, default=64, help="Classifier samples (the segmenter uses at most 16)")
+        command.add_argument("--tolerance", type=float, default=1e-4, help="Max allowed probability difference")
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        if not args.weights and not args.segmenter_weights:
+            parser.error("give --weights and/or --segmenter-weights")
+        classifier = segmenter = None
+        if args.weights:
+            classifier = export_classifier(args.weights, args.out, args.opset, args.arch)
+            print("✅ Classifier exported to:", classifier)
+        if args.segmenter_weights:
+            segmenter = export_segmenter(args.segmenter_weights, args.segmenter_out, args.opset)
+            print("✅ Segmenter exported to:", segmenter)
+        if not args.samples:
+            return
+        onnx_path, segmenter_onnx = classifier, segmenter
+    else:
+        if not (args.weights and args.onnx) and not (args.segmenter_weights and args.segmenter_onnx):
+            parser.error("give --weights with --onnx and/or --segmenter-weights with --segmenter-onnx")
+        onnx_path = args.onnx if args.weights else None
+        segmenter_onnx = args.segmenter_onnx if args.segmenter_weights else None
+
+    ok = True
+    if onnx_path:
+        report = verify_classifier(args.weights, onnx_path, args.samples, args.limit, args.arch)
+        ok &= _check("classifier", report, args.tolerance)
+    if segmenter_onnx:
+        report = verify_segmenter(args.segmenter_weights, segmenter_onnx, args.samples, min(args.limit, 16))
+        ok &= _check("segmenter", report, args.tolerance)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# app/preprocess.py
+
+import io
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+MODEL_SIZE = 224
+THUMBNAIL_SIZE = 512
+
+# draft_scale: decode JPEGs at the smallest DCT scale (1/2, 1/4, 1/8) that is
+#   still at least draft_scale x the largest output size; None decodes at full size.
+# reducing_gap: Pillow's two-step resize shortcut; None is a plain bilinear resize.
+QUALITY_TIERS = {
+    "fast": {"draft_scale": 1.0, "reducing_gap": 2.0},
+    "balanced": {"draft_scale": 2.0, "reducing_gap": None},
+    "quality": {"draft_scale": None, "reducing_gap": None},
+}
+
+
+def to_model_input(model_array):
+    """(224, 224, 3) uint8 pixels -> (3, 224, 224) float32 in [0, 1], the same layout as ToTensor()."""
+    array = model_array.astype(np.float32).transpose(2, 0, 1)
+    return np.ascontiguousarray(array / np.float32(255.0))
+
+
+class PreparedImage:
+    """Model-ready 224x224 uint8 pixels plus a display thumbnail, from one decode."""
+
+    def __init__(self, model_array, thumbnail, original_size, decoded_size, tier, decode_ms):
+        self.model_array = model_array
+        self.thumbnail = thumbnail
+        self.original_size = original_size
+        self.decoded_size = decoded_size
+        self.tier = tier
+        self.decode_ms = decode_ms
+
+    def model_input(self):
+        return to_model_input(self.model_array)
+
+
+def prepare_upload(data, tier="balanced", model_size=MODEL_SIZE, thumbnail_size=THUMBNAIL_SIZE):
+    """
+    Decode uploaded image bytes only at the scale needed for the model input
+    and the display thumbnail, honouring the EXIF orientation tag.
+
+    The "quality" tier decodes at full resolution and matches the
+    Resize((224, 224)) + ToTensor() pipeline exactly.
+    """
+    if tier not in QUALITY_TIERS:
+        raise ValueError(f"Unknown decode tier {tier!r}; choose from {', '.join(QUALITY_TIERS)}")
+    settings = QUALITY_TIERS[tier]
+    start = time.perf_counter()
+
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    if settings["draft_scale"] is not None and image.format == "JPEG":
+        target = int(max(model_size, thumbnail_size) * settings["draft_scale"])
+        # Square request, so it holds whichever way the EXIF tag rotates the image
+        image.draft("RGB", (target, target))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    decoded_size = image.size
+
+    model_image = image.resize((model_size, model_size), Image.BILINEAR, reducing_gap=settings["reducing_gap"])
+    thumbnail = image.copy()
+    thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.BILINEAR,
+                        reducing_gap=settings["reducing_gap"] or 2.0)
+
+    return PreparedImage(
+        model_array=np.asarray(model_image, dtype=np.uint8),
+        thumbnail=thumbnail,
+        original_size=original_size,
+        decoded_size=decoded_size,
+        tier=tier,
+        decode_ms=(time.perf_counter() - start) * 1000.0,
+    )
@@ -0,0 +1,253 @@
+# app/prescription_store.py
+#
+# Content-addressed store for rendered prescriptions.
+#
+# A report is keyed by a hash of everything that goes into it, so an identical
+# request is served from disk instead of being rendered again. Files live in a
+# two-level sharded layout under the store root, with a small SQLite index for
+# per-user history and eviction:
+#
+#   <root>/index.sqlite
+#   <root>/3f/a2/3fa2...e1.pdf
+#
+#   python prescription_store.py stats
+#   python prescription_store.py history --user pooja
+#   python prescription_store.py evict --max-mb 500 --max-age-days 365
+#   python prescription_store.py purge-legacy      # old flat AuraDerm_*.pdf / chart_*.png files
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+
+from constants import CLASS_NAMES
+from report import RenderedReport
+
+INDEX_FILE = "index.sqlite"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prescriptions (
+    key TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    predicted_class TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    mime TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_user_created ON prescriptions (username, created);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_last_access ON prescriptions (last_access);
+"""
+
+
+def _canonical(value):
+    if isinstance(value, Mapping):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def report_key(predicted_class, products, acids, diet, username="user", probabilities=None,
+               class_names=CLASS_NAMES):
+    """sha256 of the report inputs; probabilities are rounded like the chart cache."""
+    payload = {
+        "predicted_class": predicted_class,
+        "products": _canonical(products),
+        "acids": _canonical(acids),
+        "diet": _canonical(diet),
+        "username": username,
+        "probabilities": None if probabilities is None else [round(float(p), 3) for p in probabilities],
+        "class_names": list(class_names),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PrescriptionStore:
+    """
+    Sharded on-disk prescription store with a SQLite index.
+
+    max_bytes / max_age_days bound the store; evict() runs after every put()
+    and removes expired reports first, then the least recently used ones.
+    """
+
+    def __init__(self, root, max_bytes=None, max_age_days=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = None if max_age_days is None else max_age_days * 86400.0
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, INDEX_FILE), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key, filename):
+        ext = os.path.splitext(filename)[1]
+        return os.path.join(key[:2], key[2:4], key + ext)
+
+    def get(self, key, touch=True):
+        """
+        The stored RenderedReport for `key`, or None. touch=False reads it without
+        counting a hit or miss or refreshing its LRU position (e.g. for display).
+        """
+        with self._lock:
+            row = self._db.execute("SELECT * FROM prescriptions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                try:
+                    with open(os.path.join(self.root, row["path"]), "rb") as f:
+                        data = f.read()
+                except OSError:
+                    # File removed behind our back: forget it and render again
+                    self._db.execute("DELETE FROM prescriptions WHERE key = ?", (key,))
+                    row = None
+            if not touch:
+                return None if row is None else RenderedReport(data, row["filename"], row["mime"])
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE prescriptions SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return RenderedReport(data, row["filename"], row["mime"])
+
+    def put(self, key, report, username, predicted_class):
+        rel_path = self._path(key, report.filename)
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        with open(path + ".tmp", "wb") as f:
+            f.write(report.data)
+        os.replace(path + ".tmp", path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO prescriptions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, username, predicted_class, report.filename, report.mime, rel_path, len(report.data), now, now),
+            )
+        self.evict()
+        return key
+
+    def history(self, username, since=None, until=None, limit=50):
+        """The user's stored reports, newest first, as dicts."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, predicted_class, filename, mime, size, created FROM prescriptions "
+                "WHERE username = ? AND created >= ? AND created <= ? ORDER BY created DESC LIMIT ?",
+                (username, since or 0.0, until or float("inf"), limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _delete(self, rows):
+        for row in rows:
+            try:
+                os.remove(os.path.join(self.root, row["path"]))
+            except OSError:
+                pass
+        self._db.executemany("DELETE FROM prescriptions WHERE key = ?", [(row["key"],) for row in rows])
+        return len(rows)
+
+    def evict(self, now=None):
+        """Drop reports past max_age, then least recently used ones until under max_bytes."""
+        removed = 0
+        with self._lock:
+            if self.max_age is not None:
+                cutoff = (now or time.time()) - self.max_age
+                removed += self._delete(self._db.execute(
+                    "SELECT key, path FROM prescriptions WHERE created < ?", (cutoff,)
+                ).fetchall())
+            if self.max_bytes is not None:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM prescriptions").fetchone()[0]
+                if total > self.max_bytes:
+                    victims = []
+                    for row in self._db.execute("SELECT key, path, size FROM prescriptions ORDER BY last_access"):
+                        if total <= self.max_bytes:
+                            break
+                        victims.append(row)
+                        total -= row["size"]
+                    removed += self._delete(victims)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM prescriptions"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "reports": count,
+            "size_mb": round(total / 2**20, 2),
+            "max_mb": None if self.max_bytes is None else round(self.max_bytes / 2**20, 2),
+            "max_age_days": None if self.max_age is None else self.max_age / 86400.0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def purge_legacy(self):
+        """Remove the flat AuraDerm_*.pdf/.txt and chart_*.png files older versions left in the root."""
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isfile(path) and (
+                (name.startswith("chart_") and name.endswith(".png"))
+                or (name.startswith("AuraDerm_") and name.endswith((".pdf", ".txt")))
+            ):
+                os.remove(path)
+                removed += 1
+        return removed
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_prescription_store(root, max_bytes=None, max_age_days=None):
+    """Process-wide store per root directory; the limits of the first call win."""
+    store = _stores.get(root)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(root)
+            if store is None:
+                store = _stores[root] = PrescriptionStore(root, max_bytes, max_age_days)
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and maintain the prescription store.")
+    parser.add_argument("--root", default="D:/Aura_derm/prescriptions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats")
+    history = sub.add_parser("history")
+    history.add_argument("--user", required=True)
+    history.add_argument("--limit", type=int, default=50)
+    evict = sub.add_parser("evict")
+    evict.add_argument("--max-mb", type=float, default=None)
+    evict.add_argument("--max-age-days", type=float, default=None)
+    sub.add_parser("purge-legacy")
+    args = parser.parse_args(argv)
+
+    if args.command == "evict":
+        max_bytes = None if args.max_mb is None else int(args.max_mb * 2**20)
+        store = PrescriptionStore(args.root, max_bytes, args.max_age_days)
+        print(f"✅ Evicted {store.evict()} report(s)")
+        return
+    store = PrescriptionStore(args.root)
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == "history":
+        for row in store.history(args.user, limit=args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["created"]))
+            print(f"{created}  {row['predicted_class']:<13} {row['filename']}  {row['key'][:12]}")
+    else:
+        print(f"✅ Removed {store.purge_legacy()} legacy file(s)")
+
+
+if __name__ == "__main__":
+    main()
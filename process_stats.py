@@ -0,0 +1,16 @@
+# app/process_stats.py
+#
+# Process resource readings shared by the model registry, the capability
+# registry and the benchmarks.
+
+import os
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
@@ -0,0 +1,272 @@
+# app/product_ranker.py
+#
+# Probability-weighted top-k product recommendations over a large catalog.
+#
+# The catalog is a CSV with one product per row:
+#
+#   name,type,brand,price,skin_types,ingredients
+#   Clarifying Gel Cleanser,Cleanser,CeraVe,14.99,oily;combination,salicylic acid;niacinamide
+#
+# (skin_types empty or "all" means suitable for every skin type). At load time
+# each product's ingredient tags are scored against the condition -> acids
+# table of the knowledge base, giving a (products x conditions) score matrix.
+# Ranking a prediction is then one matrix-vector product with the softmax
+# vector, boolean-mask filters and an argpartition:
+#
+#   python product_ranker.py bench --products 50000
+#   python product_ranker.py rank --catalog products.csv --probs 0.7,0.1,0.1,0.1 --skin-type oily
+
+import argparse
+import csv
+import os
+import threading
+import time
+
+import numpy as np
+
+from knowledge_base import get_knowledge_base, normalize_condition
+
+SKIN_TYPES = ('normal', 'oily', 'dry', 'combination', 'sensitive')
+ALL_SKIN_TYPES = (1 << len(SKIN_TYPES)) - 1
+
+
+def _normalize_ingredient(name):
+    return " ".join(name.lower().split())
+
+
+def _skin_bits(value):
+    names = [v.strip().lower() for v in value.split(";") if v.strip()]
+    if not names or "all" in names:
+        return ALL_SKIN_TYPES
+    return sum(1 << SKIN_TYPES.index(name) for name in names if name in SKIN_TYPES)
+
+
+def condition_weights(class_names, vocabulary):
+    """(ingredients x conditions) weights: 1.0 where the knowledge base lists the ingredient for the condition."""
+    kb = get_knowledge_base()
+    column = {ingredient: i for i, ingredient in enumerate(vocabulary)}
+    weights = np.zeros((len(vocabulary), len(class_names)), dtype=np.float32)
+    for c, condition in enumerate(class_names):
+        entry = kb.get(condition)
+        for acid in (entry["acids"] if entry is not None else ()):
+            i = column.get(_normalize_ingredient(acid))
+            if i is not None:
+                weights[i, c] = 1.0
+    return weights
+
+
+class ProductCatalog:
+    """
+    Column-oriented product catalog with a precomputed (products x conditions)
+    float32 score matrix. All per-request work is vectorized numpy.
+    """
+
+    def __init__(self, names, types, brands, prices, skin_bits, ingredient_lists, class_names, scores=None):
+        self.class_names = tuple(normalize_condition(c) for c in class_names)
+        self.names = np.asarray(names, dtype=object)
+        self.types = np.asarray(types, dtype=object)
+        self.brands = np.asarray(brands, dtype=object)
+        self.prices = np.asarray(prices, dtype=np.float32)
+        self.skin_bits = np.asarray(skin_bits, dtype=np.uint8)
+
+        # Ingredient tags as a boolean matrix; Fortran order keeps each ingredient column contiguous
+        vocabulary = sorted({_normalize_ingredient(i) for tags in ingredient_lists for i in tags})
+        self.vocabulary = {ingredient: i for i, ingredient in enumerate(vocabulary)}
+        self.tags = np.zeros((len(self.names), len(vocabulary)), dtype=bool, order="F")
+        for p, tags in enumerate(ingredient_lists):
+            for ingredient in tags:
+                self.tags[p, self.vocabulary[_normalize_ingredient(ingredient)]] = True
+
+        if scores is None:
+            # Share of a product's actives that target each condition, damped so long
+            # ingredient lists do not win on count alone
+            matches = self.tags.astype(np.float32) @ condition_weights(self.class_names, vocabulary)
+            counts = self.tags.sum(axis=1, dtype=np.float32)
+            scores = matches / np.sqrt(np.maximum(counts, 1.0))[:, None]
+        self.scores = np.ascontiguousarray(scores, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_csv(cls, path, class_names):
+        names, types, brands, prices, skin_bits, ingredients = [], [], [], [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                names.append(row["name"])
+                types.append(row.get("type") or "")
+                brands.append(row.get("brand") or "")
+                prices.append(float(row["price"]) if row.get("price") else np.nan)
+                skin_bits.append(_skin_bits(row.get("skin_types") or ""))
+                ingredients.append([i for i in (row.get("ingredients") or "").split(";") if i.strip()])
+        return cls(names, types, brands, prices, skin_bits, ingredients, class_names)
+
+    @classmethod
+    def from_knowledge_base(cls, class_names):
+        """
+        Small built-in catalog from the knowledge base products, used when no
+        catalog file is deployed. Each product scores 1.0 for its own condition;
+        ingredients are the known actives that appear in the product name.
+        """
+        kb = get_knowledge_base()
+        class_names = [normalize_condition(c) for c in class_names]
+        actives = {_normalize_ingredient(a) for c in kb.conditions for a in kb.get(c)["acids"]}
+        names, types, brands, ingredients, rows = [], [], [], [], []
+        for c, condition in enumerate(class_names):
+            entry = kb.get(condition)
+            for product in (entry["products"] if entry is not None else ()):
+                names.append(product["name"])
+                types.append(product["type"])
+                brands.append(product.get("brands", ""))
+                ingredients.append([a for a in actives if a in product["name"].lower()])
+                row = np.zeros(len(class_names), dtype=np.float32)
+                row[c] = 1.0
+                rows.append(row)
+        scores = np.stack(rows) if rows else np.zeros((0, len(class_names)), dtype=np.float32)
+        return cls(names, types, brands, [np.nan] * len(names), [ALL_SKIN_TYPES] * len(names),
+                   ingredients, class_names, scores=scores)
+
+    def filter_mask(self, skin_type=None, max_price=None, exclude_ingredients=(), product_types=None):
+        """Boolean mask of products that pass every filter; products without a price pass the budget."""
+        mask = np.ones(len(self.names), dtype=bool)
+        if skin_type:
+            bit = np.uint8(1 << SKIN_TYPES.index(skin_type.lower()))
+            mask &= (self.skin_bits & bit) != 0
+        if max_price is not None:
+            mask &= ~(self.prices > max_price)
+        columns = [self.vocabulary[i] for i in map(_normalize_ingredient, exclude_ingredients) if i in self.vocabulary]
+        if columns:
+            mask &= ~self.tags[:, columns].any(axis=1)
+        if product_types:
+            mask &= np.isin(self.types, list(product_types))
+        return mask
+
+    def top_k(self, probabilities, k=4, mask=None):
+        """Indices and scores of the k best products for a softmax vector, best first."""
+        relevance = self.scores @ np.asarray(probabilities, dtype=np.float32)
+        if mask is not None:
+            relevance = np.where(mask, relevance, -np.inf)
+        k = min(k, len(relevance))
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        candidates = np.argpartition(-relevance, k - 1)[:k]
+        order = candidates[np.argsort(-relevance[candidates], kind="stable")]
+        order = order[np.isfinite(relevance[order])]
+        return order, relevance[order]
+
+    def recommend(self, probabilities, k=4, **filters):
+        """Top-k products as dicts in the format the app and report already render."""
+        indices, relevance = self.top_k(probabilities, k, self.filter_mask(**filters))
+        products = []
+        for i, score in zip(indices, relevance):
+            product = {"name": self.names[i], "type": self.types[i], "score": round(float(score), 4)}
+            if self.brands[i]:
+                product["brands"] = self.brands[i]
+            if not np.isnan(self.prices[i]):
+                product["price"] = float(self.prices[i])
+            products.append(product)
+        return products
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path, class_names):
+    """
+    Process-wide catalog loaded from `path`, or the built-in knowledge base
+    catalog when the file does not exist.
+    """
+    key = (path if path and os.path.exists(path) else None, tuple(class_names))
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                if key[0] is None:
+                    catalog = ProductCatalog.from_knowledge_base(class_names)
+                else:
+                    catalog = ProductCatalog.from_csv(path, class_names)
+                _catalogs[key] = catalog
+    return catalog
+
+
+# === Synthetic catalog and benchmark ===
+
+def synthetic_catalog(n_products, class_names, n_ingredients=200, seed=0):
+    """Random catalog with realistic tag density, including every knowledge base active."""
+    rng = np.random.default_rng(seed)
+    kb = get_knowledge_base()
+    actives = sorted({_normalize_ingredient(a) for c in kb.conditions for a in kb.get(c)["acids"]})
+    vocabulary = actives + [f"ingredient {i}" for i in range(n_ingredients - len(actives))]
+    counts = rng.integers(3, 12, size=n_products)
+    ingredients = [list(rng.choice(vocabulary, size=n, replace=False)) for n in counts]
+    product_types = ['Cleanser', 'Serum', 'Moisturizer', 'Toner', 'Sunscreen', 'Cream', 'Gel']
+    return ProductCatalog(
+        names=[f"Product {i}" for i in range(n_products)],
+        types=rng.choice(product_types, size=n_products),
+        brands=[f"Brand {b}" for b in rng.integers(0, 500, size=n_products)],
+        prices=rng.uniform(5, 120, size=n_products).round(2),
+        skin_bits=rng.integers(1, ALL_SKIN_TYPES + 1, size=n_products),
+        ingredient_lists=ingredients,
+        class_names=class_names,
+    )
+
+
+def benchmark(n_products=50000, k=10, iterations=1000, seed=0):
+    from constants import CLASS_NAMES
+
+    start = time.perf_counter()
+    catalog = synthetic_catalog(n_products, CLASS_NAMES, seed=seed)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    probs = rng.dirichlet(np.ones(len(CLASS_NAMES)), size=iterations).astype(np.float32)
+    filters = {"skin_type": "oily", "max_price": 60.0, "exclude_ingredients": ["retinol", "ingredient 7"]}
+    results = {"products": n_products, "k": k, "build_seconds": round(build_seconds, 3)}
+    for label, kwargs in (("unfiltered", {}), ("filtered", filters)):
+        timings = np.empty(iterations)
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            catalog.top_k(probs[i], k, catalog.filter_mask(**kwargs) if kwargs else None)
+            timings[i] = time.perf_counter() - t0
+        ms = timings * 1000.0
+        results[label] = {"p50_ms": round(float(np.percentile(ms, 50)), 4),
+                          "p99_ms": round(float(np.percentile(ms, 99)), 4)}
+    return results
+
+
+def main(argv=None):
+    import json
+
+    parser = argparse.ArgumentParser(description="Rank catalog products for a predicted condition distribution.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bench = sub.add_parser("bench", help="Latency on a synthetic catalog")
+    bench.add_argument("--products", type=int, default=50000)
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--iterations", type=int, default=1000)
+
+    rank = sub.add_parser("rank", help="Top-k products for a probability vector")
+    rank.add_argument("--catalog", default=None, help="Catalog CSV (built-in catalog if omitted)")
+    rank.add_argument("--probs", required=True, help="Comma-separated class probabilities")
+    rank.add_argument("--k", type=int, default=4)
+    rank.add_argument("--skin-type", choices=SKIN_TYPES, default=None)
+    rank.add_argument("--max-price", type=float, default=None)
+    rank.add_argument("--exclude", default="", help="Semicolon-separated ingredients to avoid")
+
+    args = parser.parse_args(argv)
+    if args.command == "bench":
+        print(json.dumps(benchmark(args.products, args.k, args.iterations), indent=2))
+    else:
+        from constants import CLASS_NAMES
+        catalog = get_catalog(args.catalog, CLASS_NAMES)
+        products = catalog.recommend(
+            [float(p) for p in args.probs.split(",")], args.k, skin_type=args.skin_type,
+            max_price=args.max_price, exclude_ingredients=[e for e in args.exclude.split(";") if e],
+        )
+        print(json.dumps(products, indent=2))
+
+
+if __name__ == "__main__":
+    main()
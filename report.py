@@ -0,0 +1,165 @@
+# app/report.py
+#
+# Prescription report rendering. Everything is built in memory: the chart is
+# drawn on an object-oriented Agg figure (no global pyplot state, so concurrent
+# sessions cannot interfere) and the PDF or text fallback is returned as bytes.
+# matplotlib and fpdf are imported on the first report, not with this module.
+
+import datetime
+import functools
+import io
+import os
+import threading
+from collections.abc import Mapping
+
+from capabilities import get_capabilities
+from constants import CLASS_NAMES, DOWNLOAD_FOLDER
+from tracing import span
+
+REPORT_TITLE = "Aura Derm - Skin Analysis Report"
+SECTIONS = ("Recommended Products", "Recommended Acids", "Foods to Eat", "Foods to Avoid")
+
+
+class RenderedReport:
+    """A finished report: file contents plus the name and MIME type to serve it under."""
+
+    def __init__(self, data, filename, mime):
+        self.data = data
+        self.filename = filename
+        self.mime = mime
+
+
+# === Chart ===
+# Each thread keeps one figure per class list with the axes, labels and title
+# already laid out; a report only updates the bar heights and re-renders.
+_chart_local = threading.local()
+
+
+def _chart_figure(class_names):
+    figures = getattr(_chart_local, "figures", None)
+    if figures is None:
+        figures = _chart_local.figures = {}
+    if class_names not in figures:
+        # Figure + Agg canvas only, never pyplot
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(6, 4))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        bars = ax.bar(class_names, [0.0] * len(class_names), color="#e75480")
+        ax.set_ylim(0, 1)
+        ax.set_xlabel("Skin Issues")
+        ax.set_ylabel("Prediction Confidence")
+        ax.set_title("Skin Issue Prediction Confidence")
+        fig.tight_layout()
+        figures[class_names] = (fig, bars)
+    return figures[class_names]
+
+
+@functools.lru_cache(maxsize=128)
+def _chart_png(probabilities, class_names):
+    fig, bars = _chart_figure(class_names)
+    for bar, value in zip(bars, probabilities):
+        bar.set_height(value)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def render_chart(probabilities, class_names=CLASS_NAMES):
+    """PNG bytes of the confidence bar chart, or None if matplotlib is unavailable."""
+    if not probabilities or not get_capabilities().available("matplotlib"):
+        return None
+    # Rounded so near-identical predictions share a cached image
+    return _chart_png(tuple(round(float(p), 3) for p in probabilities), tuple(class_names))
+
+
+# === Report body ===
+
+def _product_line(item):
+    if isinstance(item, Mapping):
+        return f"{item['name']} ({item['type']})"
+    return str(item)
+
+
+def _sections(products, acids, diet):
+    return zip(SECTIONS, (
+        [_product_line(item) for item in products],
+        [str(item) for item in acids],
+        [str(item) for item in diet.get('eat', [])],
+        [str(item) for item in diet.get('avoid', [])],
+    ))
+
+
+def _render_text(predicted_class, products, acids, diet, username, now):
+    lines = [
+        "AURA DERM - SKIN ANALYSIS REPORT",
+        "=" * 50,
+        "",
+        f"Date: {now.strftime('%Y-%m-%d %H:%M')}",
+        f"User: {username}",
+        f"Detected Skin Issue: {predicted_class.title()}",
+        "",
+    ]
+    for section, items in _sections(products, acids, diet):
+        lines.append(f"{section}:")
+        lines.extend(f"  - {item}" for item in items)
+        lines.append("")
+    return "\n".join(lines).encode("utf-8")
+
+
+def _render_pdf(predicted_class, products, acids, diet, username, now, chart):
+    pdf = get_capabilities().load("fpdf").FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=REPORT_TITLE, ln=True, align="C")
+    pdf.ln(10)
+    pdf.cell(200, 10, txt=f"Date: {now.strftime('%Y-%m-%d %H:%M')}", ln=True)
+    pdf.cell(200, 10, txt=f"User: {username}", ln=True)
+    pdf.set_font("Arial", 'B', size=12)
+    pdf.cell(200, 10, txt=f"Detected Skin Issue: {predicted_class.title()}", ln=True)
+    pdf.set_font("Arial", size=12)
+    pdf.ln(5)
+
+    for section, items in _sections(products, acids, diet):
+        pdf.cell(200, 10, txt=section + ":", ln=True)
+        for item in items:
+            pdf.cell(200, 10, txt=f" - {item}", ln=True)
+        pdf.ln(2)
+
+    if chart:
+        pdf.ln(5)
+        pdf.cell(200, 10, txt="Prediction Confidence Chart:", ln=True)
+        pdf.image(io.BytesIO(chart), x=10, y=None, w=180)
+
+    return bytes(pdf.output())
+
+
+def render_report(predicted_class, products, acids, diet, username="user", probabilities=None,
+                  class_names=CLASS_NAMES, now=None):
+    """
+    Build the prescription in memory. Returns a RenderedReport holding PDF
+    bytes, or plain-text bytes when fpdf is not installed.
+    """
+    now = now or datetime.datetime.now()
+    stem = f"AuraDerm_{username}_{now.strftime('%Y%m%d_%H%M%S')}"
+    if not get_capabilities().available("fpdf"):
+        with span("report.text"):
+            data = _render_text(predicted_class, products, acids, diet, username, now)
+        return RenderedReport(data, stem + ".txt", "text/plain")
+    with span("report.chart"):
+        chart = render_chart(probabilities, class_names)
+    with span("report.pdf"):
+        data = _render_pdf(predicted_class, products, acids, diet, username, now, chart)
+    return RenderedReport(data, stem + ".pdf", "application/pdf")
+
+
+def generate_pdf(predicted_class, products, acids, diet, username="user", probabilities=None,
+                 download_folder=DOWNLOAD_FOLDER, class_names=CLASS_NAMES):
+    """render_report() written to download_folder; returns the file path."""
+    with span("generate_pdf"):
+        report = render_report(predicted_class, products, acids, diet, username, probabilities, class_names)
+        path = os.path.join(download_folder, report.filename)
+        with span("report.write"), open(path, "wb") as f:
+            f.write(report.data)
+    return path
@@ -0,0 +1,260 @@
+# app/report_jobs.py
+#
+# Background report rendering on a process pool, so matplotlib + FPDF never
+# run in (or hold the GIL of) the Streamlit script threads.
+#
+#   handle = get_report_queue().submit("acne", products, acids, diet, username="pooja")
+#   handle.status()        # "queued" / "running" / "done" / "failed"
+#   handle.result()        # RenderedReport
+#
+# Bulk mode renders many stored analyses at once, one JSON object per line
+# with at least "predicted_class" (plus optional "username", "probabilities"
+# and "timestamp" in ISO format):
+#
+#   python report_jobs.py analyses.jsonl --out-dir D:/Aura_derm/prescriptions --workers 4
+
+import argparse
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from knowledge_base import thaw
+from constants import CLASS_NAMES
+from tracing import get_tracer
+
+
+def _render_job(kwargs):
+    # Runs in a pool process; imported there on first use
+    from report import render_report
+    start = time.perf_counter()
+    report = render_report(**kwargs)
+    return report, time.perf_counter() - start
+
+
+def _warm_up():
+    # report imports matplotlib and fpdf lazily; resolve them now, once per worker
+    from capabilities import get_capabilities
+    caps = get_capabilities()
+    caps.available("matplotlib")
+    caps.available("fpdf")
+    return os.getpid()
+
+
+class ReportJob:
+    """Handle for one submitted report."""
+
+    def __init__(self, job_id, future, username):
+        self.job_id = job_id
+        self.username = username
+        self.submitted_at = time.time()
+        self._future = future
+
+    def status(self):
+        if self._future.done():
+            return "failed" if self._future.exception() is not None else "done"
+        return "running" if self._future.running() else "queued"
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """The RenderedReport; re-raises the rendering error if the job failed."""
+        return self._future.result(timeout=timeout)[0]
+
+    def error(self):
+        return self._future.exception() if self._future.done() else None
+
+    async def result_async(self):
+        """result() for asyncio callers (the HTTP API), without blocking the event loop."""
+        import asyncio
+        return (await asyncio.wrap_future(self._future))[0]
+
+
+class ReportJobQueue:
+    """
+    Process-pool job queue for render_report(). Workers use the "spawn" start
+    method, so forking a multi-threaded server process is never an issue, and
+    the pool is only started on the first submission.
+    """
+
+    def __init__(self, max_workers=2, history=1024):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        # === Metrics ===
+        self.submitted = 0
+        self.completed = 0
+        self.failures = 0
+        self.cancelled = 0
+        self._latencies = deque(maxlen=history)
+        self._render_times = deque(maxlen=history)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def prewarm(self):
+        """Start the pool and import the renderers in every worker without waiting for them."""
+        if self._executor is not None:
+            return
+        pool = self._pool()
+        for _ in range(self.max_workers):
+            pool.submit(_warm_up)
+
+    def submit(self, predicted_class, products, acids, diet, username="user", probabilities=None,
+               class_names=CLASS_NAMES, now=None):
+        kwargs = {
+            "predicted_class": predicted_class,
+            # Knowledge base views (MappingProxyType, tuples) cannot be pickled
+            "products": thaw(products),
+            "acids": thaw(acids),
+            "diet": thaw(diet),
+            "username": username,
+            "probabilities": None if probabilities is None else [float(p) for p in probabilities],
+            "class_names": list(class_names),
+            # Stamped at submission, so the file name reflects the click, not the render
+            "now": now or datetime.datetime.now(),
+        }
+        submitted_at = time.perf_counter()
+        future = self._pool().submit(_render_job, kwargs)
+        with self._lock:
+            self.submitted += 1
+        future.add_done_callback(lambda f: self._record(f, submitted_at))
+        return ReportJob(next(self._ids), future, username)
+
+    def submit_bulk(self, analyses):
+        """Submit every analysis dict (keyword arguments of submit()); returns the handles in order."""
+        return [self.submit(**analysis) for analysis in analyses]
+
+    def _record(self, future, submitted_at):
+        with self._lock:
+            if future.cancelled():
+                self.cancelled += 1
+                return
+            if future.exception() is not None:
+                self.failures += 1
+                return
+            self.completed += 1
+            latency, render_seconds = time.perf_counter() - submitted_at, future.result()[1]
+            self._latencies.append(latency)
+            self._render_times.append(render_seconds)
+        # Rendered in another process: feed its timings into this process's stage histograms
+        get_tracer().record("report.render", render_seconds)
+        get_tracer().record("report.latency", latency)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        # _record() appends from the executor's callback thread: copy under the lock, compute outside
+        with self._lock:
+            latency_ms = np.array(list(self._latencies)) * 1000.0
+            render_ms = np.array(list(self._render_times)) * 1000.0
+            submitted, completed, failures, cancelled = self.submitted, self.completed, self.failures, self.cancelled
+        return {
+            "workers": self.max_workers,
+            "queue_length": submitted - completed - failures - cancelled,
+            "submitted": submitted,
+            "completed": completed,
+            "failures": failures,
+            "cancelled": cancelled,
+            "latency_ms_p50": round(float(np.percentile(latency_ms, 50)), 2) if len(latency_ms) else None,
+            "latency_ms_p95": round(float(np.percentile(latency_ms, 95)), 2) if len(latency_ms) else None,
+            "render_ms_p50": round(float(np.percentile(render_ms, 50)), 2) if len(render_ms) else None,
+            "render_ms_p95": round(float(np.percentile(render_ms, 95)), 2) if len(render_ms) else None,
+        }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_report_queue(max_workers=2):
+    """Process-wide ReportJobQueue; the settings of the first call win."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ReportJobQueue(max_workers)
+    return _queue
+
+
+# === Bulk rendering ===
+
+def load_analyses(path):
+    """Stored analyses as submit() keyword arguments, with recommendations from the knowledge base."""
+    from knowledge_base import lookup
+
+    analyses = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            recommendations = lookup(record["predicted_class"])
+            analyses.append({
+                "predicted_class": record["predicted_class"],
+                "products": recommendations["products"],
+                "acids": recommendations["acids"],
+                "diet": recommendations["diet"],
+                "username": record.get("username", "user"),
+                "probabilities": record.get("probabilities"),
+                "now": datetime.datetime.fromisoformat(record["timestamp"]) if record.get("timestamp") else None,
+            })
+    return analyses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render prescription reports for many stored analyses.")
+    parser.add_argument("analyses", help="JSON-lines file of analyses")
+    parser.add_argument("--out-dir", default="D:/Aura_derm/prescriptions")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    analyses = load_analyses(args.analyses)
+    queue = ReportJobQueue(max_workers=args.workers)
+    start = time.perf_counter()
+    jobs = queue.submit_bulk(analyses)
+    written = set()
+    for job in jobs:
+        try:
+            report = job.result()
+        except Exception as exc:
+            print(f"❌ job {job.job_id} ({job.username}): {exc}", file=sys.stderr)
+            continue
+        filename = report.filename
+        if filename in written:
+            # Same user and second: keep both reports
+            stem, ext = os.path.splitext(filename)
+            filename = f"{stem}_{job.job_id}{ext}"
+        written.add(filename)
+        with open(os.path.join(args.out_dir, filename), "wb") as f:
+            f.write(report.data)
+    queue.shutdown()
+    elapsed = time.perf_counter() - start
+    print(json.dumps(queue.stats(), indent=2))
+    print(f"✅ {queue.completed}/{len(jobs)} reports in {elapsed:.1f}s "
+          f"({len(jobs) / elapsed:.1f} reports/sec) -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# app/session_media.py
+#
+# Memory-bounded storage for each session's uploaded photo.
+#
+# A session keeps only a small id in st.session_state. The store holds the
+# compressed upload bytes (for the inference cache key and re-decoding) and
+# the model-ready 224x224 uint8 array, never a decoded full-resolution image.
+# Every upload is also written to a local spill directory, so evicting an
+# entry under the global memory budget costs no I/O; a later get() reads it
+# back transparently (e.g. when the results page reruns).
+#
+#   store = get_session_media(max_bytes=256 * 2**20)
+#   store.put(session_id, upload_bytes, prepared.model_array)
+#   media = store.get(session_id)          # None once discarded or swept
+#   media.model_input()
+#
+#   python session_media.py bench --sessions 500 --budget-mb 32
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from preprocess import to_model_input
+from process_stats import rss_bytes
+
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "aura_derm_media")
+
+
+class SessionMedia:
+    """One session's upload: compressed bytes plus the 224px model array."""
+
+    def __init__(self, data, model_array):
+        self.data = data
+        self.model_array = model_array
+        self.digest = hashlib.sha256(data).hexdigest()
+        # Last time the spill file's mtime was refreshed
+        self.touched = time.time()
+
+    @property
+    def nbytes(self):
+        return len(self.data) + self.model_array.nbytes
+
+    def model_input(self):
+        return to_model_input(self.model_array)
+
+
+class SessionMediaStore:
+    """
+    LRU of SessionMedia under a global byte budget, backed by a spill
+    directory. Spill files of sessions idle for more than max_idle_seconds are
+    swept (at most every sweep_interval seconds, on put()).
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, spill_dir=None, max_idle_seconds=86400.0, sweep_interval=600.0):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir or DEFAULT_SPILL_DIR
+        self.max_idle_seconds = max_idle_seconds
+        self.sweep_interval = sweep_interval
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+        # === Metrics ===
+        self.hits = 0
+        self.rehydrations = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _spill_path(self, session_id):
+        # Session ids come from the app (uuid hex), but never trust them as a path
+        return os.path.join(self.spill_dir, hashlib.sha1(session_id.encode("utf-8")).hexdigest() + ".npz")
+
+    def _write_spill(self, session_id, media):
+        path = self._spill_path(session_id)
+        buf = io.BytesIO()
+        np.savez(buf, data=np.frombuffer(media.data, dtype=np.uint8), model_array=media.model_array)
+        # Write then rename, so a concurrent rehydration never reads a partial file
+        with open(path + ".tmp", "wb") as f:
+            f.write(buf.getvalue())
+        os.replace(path + ".tmp", path)
+
+    def _read_spill(self, session_id):
+        path = self._spill_path(session_id)
+        try:
+            with np.load(path) as archive:
+                media = SessionMedia(archive["data"].tobytes(), archive["model_array"])
+            # Touch it so the idle sweep measures from the last use
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+        return media
+
+    def _insert(self, session_id, media):
+        # Caller holds the lock
+        old = self._entries.pop(session_id, None)
+        if old is not None:
+            self._resident_bytes -= old.nbytes
+        self._entries[session_id] = media
+        self._resident_bytes += media.nbytes
+        # Keep at least the newest entry, even if it alone is over budget
+        while self._resident_bytes > self.max_bytes and len(self._entries) > 1:
+            _, victim = self._entries.popitem(last=False)
+            self._resident_bytes -= victim.nbytes
+            self.evictions += 1
+
+    def put(self, session_id, data, model_array):
+        """Store a session's upload, replacing its previous one; returns the content digest."""
+        media = SessionMedia(bytes(data), np.ascontiguousarray(model_array, dtype=np.uint8))
+        self._write_spill(session_id, media)
+        with self._lock:
+            self._insert(session_id, media)
+        self.sweep()
+        return media.digest
+
+    def get(self, session_id):
+        """The session's SessionMedia, read back from the spill directory if it was evicted; else None."""
+        if session_id is None:
+            return None
+        with self._lock:
+            media = self._entries.get(session_id)
+            if media is not None:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                now = time.time()
+                touch = now - media.touched > self.sweep_interval
+                if touch:
+                    media.touched = now
+        if media is not None:
+            if touch:
+                # Still in use: keep the spill file from being swept as idle
+                try:
+                    os.utime(self._spill_path(session_id))
+                except OSError:
+                    pass
+            return media
+        media = self._read_spill(session_id)
+        with self._lock:
+            if media is None:
+                self.misses += 1
+                return None
+            self.rehydrations += 1
+            if session_id in self._entries:
+                # A newer upload landed while we were reading
+                media = self._entries[session_id]
+            else:
+                self._insert(session_id, media)
+        return media
+
+    def discard(self, session_id):
+        """Forget a session's upload (logout)."""
+        if session_id is None:
+            return
+        with self._lock:
+            media = self._entries.pop(session_id, None)
+            if media is not None:
+                self._resident_bytes -= media.nbytes
+        try:
+            os.remove(self._spill_path(session_id))
+        except OSError:
+            pass
+
+    def sweep(self, now=None, force=False):
+        """Remove spill files of sessions idle past max_idle_seconds; returns how many."""
+        now = now or time.time()
+        if not force and now - self._last_sweep < self.sweep_interval:
+            return 0
+        self._last_sweep = now
+        removed = 0
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.name.endswith(".npz") and now - entry.stat().st_mtime > self.max_idle_seconds:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def stats(self):
+        with self._lock:
+            resident, resident_bytes = len(self._entries), self._resident_bytes
+        lookups = self.hits + self.rehydrations + self.misses
+        return {
+            "resident_sessions": resident,
+            "resident_mb": round(resident_bytes / 2**20, 2),
+            "budget_mb": round(self.max_bytes / 2**20, 2),
+            "hits": self.hits,
+            "rehydrations": self.rehydrations,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_media(max_bytes=256 * 2**20, spill_dir=None):
+    """Process-wide SessionMediaStore; the settings of the first call win."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionMediaStore(max_bytes, spill_dir)
+    return _store
+
+
+# === Benchmark ===
+
+def benchmark(sessions=500, budget_mb=32.0, upload_kb=800, revisits=2000, seed=0):
+    """Simulate many sessions uploading and revisiting their results page under a fixed budget."""
+    rng = np.random.default_rng(seed)
+    store = SessionMediaStore(int(budget_mb * 2**20), tempfile.mkdtemp(prefix="aura_media_bench_"))
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    for i in range(sessions):
+        upload = rng.integers(0, 256, size=upload_kb * 1024, dtype=np.uint8).tobytes()
+        store.put(f"session-{i}", upload, rng.integers(0, 256, size=(224, 224, 3), dtype=np.uint8))
+    put_seconds = time.perf_counter() - start
+
+    # Recent sessions are far more likely to rerun than old ones
+    ids = np.minimum(rng.geometric(8.0 / sessions, size=revisits), sessions) - 1
+    latencies = np.empty(revisits)
+    for n, i in enumerate(ids):
+        t0 = time.perf_counter()
+        store.get(f"session-{sessions - 1 - i}").model_input()
+        latencies[n] = (time.perf_counter() - t0) * 1000.0
+    rss_after = rss_bytes()
+    shutil.rmtree(store.spill_dir, ignore_errors=True)
+    return {
+        "sessions": sessions,
+        "upload_kb": upload_kb,
+        "put_ms_mean": round(put_seconds / sessions * 1000.0, 3),
+        "get_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "get_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+        "rss_growth_mb": None if rss_before is None or rss_after is None
+        else round((rss_after - rss_before) / 2**20, 1),
+        "store": store.stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Session media store tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Memory and latency under many simulated sessions")
+    bench.add_argument("--sessions", type=int, default=500)
+    bench.add_argument("--budget-mb", type=float, default=32.0)
+    bench.add_argument("--upload-kb", type=int, default=800)
+    bench.add_argument("--revisits", type=int, default=2000)
+    sweep = sub.add_parser("sweep", help="Remove spill files of idle sessions")
+    sweep.add_argument("--dir", default=DEFAULT_SPILL_DIR)
+    sweep.add_argument("--max-idle-hours", type=float, default=24.0)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(benchmark(args.sessions, args.budget_mb, args.upload_kb, args.revisits), indent=2))
+    else:
+        store = SessionMediaStore(spill_dir=args.dir, max_idle_seconds=args.max_idle_hours * 3600.0)
+        print(f"✅ Removed {store.sweep(force=True)} idle session file(s)")
+
+
+if __name__ == "__main__":
+    main()
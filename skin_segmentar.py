@@ -1,40 +1,139 @@
 # app/skin_segmenter.py
 
 import torch
+import torch.nn.functional as F
 import numpy as np
 from torchvision import transforms
 from PIL import Image
 from unetplusplus import UNetPP  # Import your custom UNet++ model
 
+from tracing import span, traced
+
+ISSUES = ['acne', 'pigmentation', 'wrinkles']
+
 class SkinSegmenter:
-    def __init__(self, weights_path):
+    def __init__(self, weights_path, input_size=256, presence_threshold=0.05, mask_threshold=0.5):
         self.model = UNetPP(num_classes=3)  # 3: acne, pigmentation, wrinkles
         self.model.load_state_dict(torch.load(weights_path, map_location='cpu'))
         self.model.eval()
 
+        self.input_size = input_size
+        self.presence_threshold = presence_threshold  # mean probability to report an issue
+        self.mask_threshold = mask_threshold  # per-pixel probability for the masks
+
         self.transform = transforms.Compose([
-            transforms.Resize((256, 256)),
+            transforms.Resize((input_size, input_size)),
             transforms.ToTensor()
         ])
 
     def analyze(self, image_path):
-        image = Image.open(image_path).convert("RGB")
-        input_tensor = self.transform(image).unsqueeze(0)  # (1, 3, 256, 256)
+        """Legacy API: {issue: bool} for a single image file."""
+        return self.analyze_batch([image_path], return_masks=False)[0]['detected']
+
+    @traced("segment")
+    def analyze_batch(self, images, tiled=False, tile_size=256, overlap=32, tile_batch=8,
+                      max_side=2048, batch_size=16, return_masks=True):
+        """
+        Segment many images at once. `images` may be file paths, PIL images,
+        HWC numpy arrays or CHW / NCHW float tensors in [0, 1].
 
-        with torch.no_grad():
-            output = self.model(input_tensor)
+        By default every image is resized to input_size x input_size and the
+        batch runs in one forward pass. With tiled=True each image is kept at
+        its own resolution (downscaled so its longest side is at most max_side)
+        and segmented with overlapping tile_size windows, `tile_batch` tiles at
+        a time, so small lesions are not lost and memory stays bounded.
 
-        output = torch.softmax(output, dim=1)[0]  # (3, 256, 256)
+        Returns one dict per image with per-issue 'fractions' (share of pixels
+        above mask_threshold), 'mean_prob', 'detected' booleans and, if
+        return_masks, the thresholded boolean 'masks'.
+        """
+        with span("segment.transform"):
+            tensors = self._to_tensors(images, resize=not tiled)
+        if tiled:
+            results = []
+            for t in tensors:
+                with span("segment.tiled"):
+                    probs = self._segment_tiled(t, tile_size, overlap, tile_batch, max_side)[None]
+                with span("segment.summarize"):
+                    results.append(self._summarize(probs, return_masks)[0])
+            return results
 
-        # Class labels
-        issues = ['acne', 'pigmentation', 'wrinkles']
-        predictions = {}
+        results = []
+        for i in range(0, len(tensors), batch_size):
+            batch = torch.stack([self._resize(t) for t in tensors[i:i + batch_size]])
+            with span("segment.forward"), torch.inference_mode():
+                probs = torch.softmax(self.model(batch), dim=1)  # (N, 3, H, W)
+            with span("segment.summarize"):
+                results.extend(self._summarize(probs, return_masks))
+        return results
 
-        for i, issue in enumerate(issues):
-            prob_map = output[i].numpy()
-            if np.mean(prob_map) > 0.05:  # Confidence threshold
-                predictions[issue] = True
+    def _summarize(self, probs, return_masks):
+        # One vectorized reduction over the whole batch instead of a per-class loop
+        masks = probs > self.mask_threshold
+        mean_prob = probs.mean(dim=(2, 3)).tolist()
+        fractions = masks.float().mean(dim=(2, 3)).tolist()
+        masks_np = masks.numpy() if return_masks else None
+        results = []
+        for n in range(probs.shape[0]):
+            result = {
+                'fractions': dict(zip(ISSUES, fractions[n])),
+                'mean_prob': dict(zip(ISSUES, mean_prob[n])),
+                'detected': {issue: p > self.presence_threshold for issue, p in zip(ISSUES, mean_prob[n])},
+            }
+            if return_masks:
+                result['masks'] = {issue: masks_np[n, i] for i, issue in enumerate(ISSUES)}
+            results.append(result)
+        return results
+
+    def _to_tensors(self, images, resize):
+        if isinstance(images, torch.Tensor) and images.dim() == 4:
+            return list(images)
+        tensors = []
+        for image in images:
+            if isinstance(image, str):
+                image = Image.open(image)
+            if isinstance(image, Image.Image):
+                # PIL inputs go through the same Resize + ToTensor as before when not tiling
+                image = image.convert("RGB")
+                tensors.append(self.transform(image) if resize else transforms.functional.to_tensor(image))
+            elif isinstance(image, np.ndarray):
+                array = image.astype(np.float32) / 255.0 if image.dtype == np.uint8 else image.astype(np.float32)
+                tensors.append(torch.from_numpy(np.ascontiguousarray(array.transpose(2, 0, 1))))
+            elif isinstance(image, torch.Tensor):
+                tensors.append(image.float())
             else:
-                predictions[issue] = False
+                raise TypeError(f"Unsupported image type: {type(image).__name__}")
+        return tensors
+
+    def _resize(self, tensor, size=None):
+        size = size or (self.input_size, self.input_size)
+        if tuple(tensor.shape[-2:]) == tuple(size):
+            return tensor
+        return F.interpolate(tensor[None], size=size, mode='bilinear', align_corners=False, antialias=True)[0]
+
+    def _segment_tiled(self, tensor, tile_size, overlap, tile_batch, max_side):
+        _, h, w = tensor.shape
+        scale = min(1.0, max_side / max(h, w))
+        if scale < 1.0:
+            h, w = int(round(h * scale)), int(round(w * scale))
+            tensor = self._resize(tensor, (h, w))
+
+        # Pad so that a whole number of strides covers the image
+        stride = tile_size - overlap
+        def covered(n):
+            return tile_size if n <= tile_size else n + (-(n - tile_size)) % stride
+        padded = F.pad(tensor, (0, covered(w) - w, 0, covered(h) - h), mode='replicate')
+        H, W = padded.shape[-2:]
 
-        return predictions
+        prob_sum = torch.zeros(len(ISSUES), H, W)
+        counts = torch.zeros(1, H, W)
+        origins = [(y, x) for y in range(0, H - tile_size + 1, stride) for x in range(0, W - tile_size + 1, stride)]
+        for i in range(0, len(origins), tile_batch):
+            chunk = origins[i:i + tile_batch]
+            tiles = torch.stack([padded[:, y:y + tile_size, x:x + tile_size] for y, x in chunk])
+            with torch.inference_mode():
+                probs = torch.softmax(self.model(tiles), dim=1)
+            for (y, x), tile_probs in zip(chunk, probs):
+                prob_sum[:, y:y + tile_size, x:x + tile_size] += tile_probs
+                counts[:, y:y + tile_size, x:x + tile_size] += 1
+        return (prob_sum / counts)[:, :h, :w]
@@ -1,283 +1,195 @@
 import streamlit as st
-import os
 import datetime
-from PIL import Image
+import os
+import time
+import uuid
+from collections.abc import Mapping
 import numpy as np
 
-# Try to import bcrypt
-try:
-    import bcrypt
-    HAS_BCRYPT = True
-except ImportError:
-    HAS_BCRYPT = False
-
-# Try to import matplotlib
-try:
-    import matplotlib.pyplot as plt
-    HAS_MATPLOTLIB = True
-except ImportError:
-    HAS_MATPLOTLIB = False
-    plt = None
-
-# Try to import fpdf
-try:
-    from fpdf import FPDF
-    HAS_FPDF = True
-except ImportError:
-    FPDF = None
-    HAS_FPDF = False
-
-# Try to import yaml
-try:
-    import yaml
-    from yaml.loader import SafeLoader
-    HAS_YAML = True
-except ImportError:
-    HAS_YAML = False
-
-# Try to import torch and torchvision
-try:
-    import torch
-    from torchvision import transforms
-    HAS_TORCH = True
-except ImportError:
-    HAS_TORCH = False
-
-# Try to import streamlit_authenticator, fallback to simple auth if not available
-try:
-    import streamlit_authenticator as stauth
-    HAS_AUTHENTICATOR = True
-except ImportError:
-    HAS_AUTHENTICATOR = False
-
-# Custom imports (optional, will skip if torch not available)
-if HAS_TORCH:
-    from app.main import SkinClassifier
-    from app.recommender import get_products
-    from app.food_map import get_diet
-    from app.acid_map import get_acids_for_skin_problem
-else:
-    # Demo mode with realistic recommendations
-    SkinClassifier = None
-    
-    def get_products(skin_issue):
-        skin_issue = skin_issue.lower()
-        recommendations = {
-            "acne": [
-                {"name": "Salicylic Acid Cleanser (2%)", "type": "Cleanser", "brands": "CeraVe, La Roche-Posay, Neutrogena"},
-                {"name": "Benzoyl Peroxide Gel (2.5-5%)", "type": "Spot Treatment", "brands": "Differin, Clean & Clear"},
-                {"name": "Niacinamide Serum (10%)", "type": "Serum", "brands": "The Ordinary, Paula's Choice"},
-                {"name": "Oil-Free Moisturizer with SPF 30+", "type": "Moisturizer", "brands": "Cetaphil, Neutrogena"}
-            ],
-            "wrinkles": [
-                {"name": "Retinol Serum (0.5-1%)", "type": "Serum", "brands": "RoC, Olay Regenerist, The Ordinary"},
-                {"name": "Peptide Complex Cream", "type": "Night Cream", "brands": "The INKEY List, Drunk Elephant"},
-                {"name": "Hyaluronic Acid Moisturizer", "type": "Moisturizer", "brands": "Neutrogena, CeraVe, La Roche-Posay"},
-                {"name": "Broad Spectrum Sunscreen SPF 50+", "type": "Sunscreen", "brands": "EltaMD, Supergoop, Neutrogena"}
-            ],
-            "dark spots": [
-                {"name": "Kojic Acid Cream (2%)", "type": "Cream", "brands": "ADMIRE MY SKIN, PCA Skin"},
-                {"name": "Vitamin C Serum (15-20%)", "type": "Serum", "brands": "Drunk Elephant, SkinCeuticals, TruSkin"},
-                {"name": "Glycolic Acid Toner (7%)", "type": "Toner", "brands": "The Ordinary, Pixi, Paula's Choice"},
-                {"name": "Alpha Arbutin Serum (2%)", "type": "Serum", "brands": "The Ordinary, Good Molecules"}
-            ],
-            "pigmentation": [
-                {"name": "Niacinamide + Zinc Serum (10%)", "type": "Serum", "brands": "The Ordinary, Paula's Choice, CeraVe"},
-                {"name": "Azelaic Acid Suspension (10%)", "type": "Cream", "brands": "The Ordinary, Paula's Choice, Finacea"},
-                {"name": "Tranexamic Acid Solution (3%)", "type": "Serum", "brands": "The INKEY List, Good Molecules"},
-                {"name": "Licorice Root + Kojic Acid", "type": "Serum", "brands": "Krave Beauty, Acwell"}
-            ]
-        }
-        return recommendations.get(skin_issue, [{"name": "No products found", "type": "N/A"}])
-    
-    def get_diet(skin_issue):
-        skin_issue = skin_issue.lower()
-        diet_map = {
-            "acne": {
-                "eat": ["Green leafy vegetables", "Berries", "Whole grains", "Zinc-rich foods"],
-                "avoid": ["Sugar", "Dairy products", "Refined carbs", "Fast food"]
-            },
-            "wrinkles": {
-                "eat": ["Blueberries", "Avocados", "Nuts", "Green tea"],
-                "avoid": ["Red meat", "Alcohol", "Deep-fried snacks"]
-            },
-            "dark spots": {
-                "eat": ["Citrus fruits", "Papaya", "Tomatoes", "Pumpkin seeds"],
-                "avoid": ["Sugary drinks", "Greasy food", "Processed snacks"]
-            },
-            "pigmentation": {
-                "eat": ["Carrots", "Spinach", "Almonds", "Sunflower seeds"],
-                "avoid": ["Soda", "White bread", "Overcooked meat"]
-            }
-        }
-        return diet_map.get(skin_issue, {"eat": ["No data"], "avoid": ["No data"]})
-    
-    def get_acids_for_skin_problem(skin_problem):
-        acids = {
-            "acne": ["Salicylic Acid", "Niacinamide", "Tea Tree Oil"],
-            "pigmentation": ["Kojic Acid", "Glycolic Acid", "Alpha Arbutin"],
-            "wrinkles": ["Retinol", "Peptides", "Hyaluronic Acid"],
-            "dark spots": ["Vitamin C", "Tranexamic Acid", "Licorice Extract"]
-        }
-        return acids.get(skin_problem.lower(), ["No specific acids found"])
+# Optional heavy dependencies (torch, onnxruntime, matplotlib, fpdf, yaml, bcrypt,
+# streamlit_authenticator) are imported on first use through the capability
+# registry, so the login page never pays for the model stack.
+from capabilities import get_capabilities
+
+caps = get_capabilities()
+caps.mark("script_start")
+
+# Classifier backend: "torch" or "onnx" (ONNX Runtime, never imports torch)
+INFERENCE_BACKEND = os.environ.get("AURA_INFERENCE_BACKEND", "torch")
+INFERENCE_CAPABILITY = "torch" if INFERENCE_BACKEND == "torch" else "onnxruntime"
+# Demo mode when the backend is not installed; recommendations still come from the knowledge base
+HAS_INFERENCE = caps.installed(INFERENCE_CAPABILITY)
+
+from constants import CLASS_NAMES, DOWNLOAD_FOLDER
+from report_jobs import get_report_queue
+from prescription_store import get_prescription_store, report_key
+from user_store import UserExistsError, get_user_store
+from analysis_service import AnalysisService
+from inference_cache import get_inference_cache
+from preprocess import prepare_upload
+from session_media import get_session_media
+from tracing import get_tracer, set_enabled, span
+from knowledge_base import lookup as lookup_recommendations
+from product_ranker import SKIN_TYPES
 
 # === Configuration ===
 CONFIG_PATH = "config.yaml"
-MODEL_PATH = "D:/Aura_derm/models/skin_classifier.pth"
+# User accounts live in SQLite; config.yaml and user_db.json are imported at startup when new or edited
+USER_DB_PATH = os.environ.get("AURA_USER_DB", "D:/Aura_derm/users.sqlite")
+LEGACY_USER_FILES = (CONFIG_PATH, "user_db.json")
+# Classifier backbone: resnet18 (original) or a distilled student such as mobilenet_v3_small,
+# trained with 'python train_skin_model.py --arch mobilenet_v3_small --teacher ...'
+MODEL_ARCH = os.environ.get("AURA_MODEL_ARCH", "resnet18")
+MODEL_NAME = "skin_classifier" if MODEL_ARCH == "resnet18" else f"skin_classifier_{MODEL_ARCH}"
+MODEL_PATH = f"D:/Aura_derm/models/{MODEL_NAME}.pth"
+ONNX_MODEL_PATH = f"D:/Aura_derm/models/{MODEL_NAME}.onnx"
+# Upload decoding: "fast" / "balanced" decode JPEGs at reduced DCT scale, "quality" at full size
+DECODE_TIER = os.environ.get("AURA_DECODE_TIER", "balanced")
+# Sessions keep only an id; upload bytes + 224px arrays share this budget and spill to
+# AURA_SESSION_MEDIA_DIR (default: <system temp>/aura_derm_media) when it is exceeded
+SESSION_MEDIA_MB = float(os.environ.get("AURA_SESSION_MEDIA_MB", 256))
+SESSION_MEDIA_DIR = os.environ.get("AURA_SESSION_MEDIA_DIR") or None
 LOGO_PATH = "D:/Aura_derm/logo.png"
-DOWNLOAD_FOLDER = "D:/Aura_derm/prescriptions"
-CLASS_NAMES = ['acne', 'dark spots', 'pigmentation', 'wrinkles']
+# Product catalog CSV ranked against the class probabilities; the knowledge base products are used if missing
+CATALOG_PATH = os.environ.get("AURA_CATALOG_PATH", "D:/Aura_derm/data/products.csv")
+PRODUCT_TOP_K = int(os.environ.get("AURA_PRODUCT_TOP_K", 4))
+# Reports are rendered in a background process pool of this size
+REPORT_WORKERS = int(os.environ.get("AURA_REPORT_WORKERS", 2))
+# Stored prescriptions are evicted past this total size (oldest access first) or age
+PRESCRIPTION_MAX_MB = float(os.environ.get("AURA_PRESCRIPTION_MAX_MB", 500))
+PRESCRIPTION_MAX_AGE_DAYS = float(os.environ.get("AURA_PRESCRIPTION_MAX_AGE_DAYS", 365))
+# Cross-session micro-batching: trade a few ms of queueing for batched forwards
+BATCH_MAX_SIZE = int(os.environ.get("AURA_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("AURA_BATCH_MAX_WAIT_MS", 10))
+BATCH_MAX_QUEUE = int(os.environ.get("AURA_BATCH_MAX_QUEUE", 256))
+# CPU inference mode: fp32, channels_last, int8_dynamic, int8_static or torchscript.
+# Non-fp32 modes are calibrated on CALIBRATION_DIR and only enabled if they pass parity.
+INFERENCE_MODE = os.environ.get("AURA_INFERENCE_MODE", "fp32")
+CALIBRATION_DIR = os.environ.get("AURA_CALIBRATION_DIR", "D:/Aura_derm/data set/")
+MODEL_KEY = MODEL_NAME if INFERENCE_MODE == "fp32" else f"{MODEL_NAME}_{INFERENCE_MODE}"
+# Per-stage timing (tracing.py): AURA_TRACING=1 turns it on, AURA_DEBUG_PANEL=1 also shows
+# this run's stages in the sidebar. Metrics go to AURA_METRICS_PATH (.prom or .json, rewritten
+# every METRICS_INTERVAL_S) and/or http://127.0.0.1:AURA_METRICS_PORT/metrics
+DEBUG_PANEL = os.environ.get("AURA_DEBUG_PANEL", "0") == "1"
+METRICS_PATH = os.environ.get("AURA_METRICS_PATH", "")
+METRICS_PORT = int(os.environ.get("AURA_METRICS_PORT", 0))
+METRICS_INTERVAL_S = float(os.environ.get("AURA_METRICS_INTERVAL_S", 15))
+# After the first page is rendered, import the inference backend, load the model and
+# start the report workers on a background thread ("0" loads them on first use instead)
+PREWARM = os.environ.get("AURA_PREWARM", "1") == "1"
 
 if not os.path.exists(DOWNLOAD_FOLDER):
     os.makedirs(DOWNLOAD_FOLDER)
 
-# === Load YAML Config ===
-config = None
-if HAS_YAML:
-    if not os.path.exists(CONFIG_PATH):
-        st.warning("Configuration file not found. Using demo mode without authentication.")
-        config = None
-    else:
-        with open(CONFIG_PATH) as file:
-            config = yaml.load(file, Loader=SafeLoader)
-else:
-    st.warning("⚠️ YAML module not available. Using demo mode without configuration file.")
-    config = None
+# === Tracing ===
+tracer = get_tracer()
+if DEBUG_PANEL:
+    set_enabled(True)
+if tracer.enabled:
+    if METRICS_PATH:
+        tracer.start_exporter(METRICS_PATH, METRICS_INTERVAL_S)
+    if METRICS_PORT:
+        tracer.serve(METRICS_PORT)
+# Spans of this script run, shown by the debug panel
+tracer.begin_trace()
+run_started = time.perf_counter()
+
+# === User Store ===
+user_store = get_user_store(USER_DB_PATH, LEGACY_USER_FILES)
 
 # === Initialize Authenticator ===
-if HAS_AUTHENTICATOR and config:
+# Falls back to the simple store login below if streamlit_authenticator is not installed
+if user_store.has_credentials() and caps.available("authenticator"):
+    stauth = caps.load("authenticator")
+    cookie = user_store.get_setting('cookie', {})
     authenticator = stauth.Authenticate(
-        config.get('credentials', {}),
-        config.get('cookie', {}).get('name', 'aura_derm_cookie'),
-        config.get('cookie', {}).get('key', 'aura_derm_key'),
-        config.get('cookie', {}).get('expiry_days', 1),
-        config.get('preauthorized', {})
+        user_store.credentials(),
+        cookie.get('name', 'aura_derm_cookie'),
+        cookie.get('key', 'aura_derm_key'),
+        cookie.get('expiry_days', 1),
+        user_store.get_setting('preauthorized', {})
     )
 else:
     authenticator = None
 
-# === Load Model ===
-model = None
-transform = None
+# === Model ===
+# Loaded on first use (results page or background prewarm), once per server process
+# and shared by every session; reloaded automatically when the weights file changes on disk.
+# api_server.py builds the same service from the same AURA_* settings.
+service = AnalysisService(
+    INFERENCE_BACKEND,
+    MODEL_PATH if INFERENCE_BACKEND == "torch" else ONNX_MODEL_PATH,
+    MODEL_KEY if INFERENCE_BACKEND == "torch" else f"{MODEL_NAME}_onnx",
+    arch=MODEL_ARCH,
+    inference_mode=INFERENCE_MODE,
+    calibration_dir=CALIBRATION_DIR,
+    class_names=CLASS_NAMES,
+    catalog_path=CATALOG_PATH,
+    decode_tier=DECODE_TIER,
+    batch_max_size=BATCH_MAX_SIZE,
+    batch_max_wait_ms=BATCH_MAX_WAIT_MS,
+    batch_max_queue=BATCH_MAX_QUEUE,
+)
 
-if HAS_TORCH:
-    if not os.path.exists(MODEL_PATH):
-        st.error("Model file not found. Please ensure 'skin_classifier.pth' exists.")
-        st.stop()
-    
-    model = SkinClassifier()
-    model.load_state_dict(torch.load(MODEL_PATH, map_location=torch.device('cpu')))
-    model.eval()
-    
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor()
-    ])
-else:
-    # Demo mode - no model available
-    model = None
-    transform = None
+
+prescription_store = get_prescription_store(
+    DOWNLOAD_FOLDER, int(PRESCRIPTION_MAX_MB * 2**20), PRESCRIPTION_MAX_AGE_DAYS
+)
+session_media = get_session_media(int(SESSION_MEDIA_MB * 2**20), SESSION_MEDIA_DIR)
 
 # === Session State Defaults ===
-for key in ['authentication_status', 'page', 'user', 'image', 'prediction', 'register']:
+for key in ['authentication_status', 'page', 'user', 'media_id', 'prediction', 'register',
+            'report_job', 'report', 'report_key']:
     if key not in st.session_state:
         st.session_state[key] = None if key != 'register' else False
 if st.session_state.page is None:
     st.session_state.page = 'login'
+run_page = st.session_state.page
+# Trace of the previous run, which often ends early in st.rerun() (e.g. right after an upload)
+previous_trace = st.session_state.get("last_trace")
+run_finished = False
+if st.session_state.media_id is None:
+    # Key of this session's upload in the shared session media store
+    st.session_state.media_id = uuid.uuid4().hex
 
-# === PDF Generator ===
-def generate_pdf(predicted_class, products, acids, diet, username="user", probabilities=None):
-    # === Setup filenames ===
-    now = datetime.datetime.now()
-    date_str = now.strftime('%Y%m%d_%H%M%S')
-    filename = f"AuraDerm_{username}_{date_str}.pdf"
-    path = os.path.join(DOWNLOAD_FOLDER, filename)
-    
-    if not HAS_FPDF:
-        # Fallback: create a simple text file instead of PDF
-        filename = filename.replace('.pdf', '.txt')
-        path = os.path.join(DOWNLOAD_FOLDER, filename)
-        with open(path, 'w') as f:
-            f.write("AURA DERM - SKIN ANALYSIS REPORT\n")
-            f.write("=" * 50 + "\n\n")
-            f.write(f"Date: {now.strftime('%Y-%m-%d %H:%M')}\n")
-            f.write(f"User: {username}\n")
-            f.write(f"Detected Skin Issue: {predicted_class.title()}\n\n")
-            
-            f.write("Recommended Products:\n")
-            for item in products:
-                if isinstance(item, dict):
-                    f.write(f"  - {item['name']} ({item['type']})\n")
-                else:
-                    f.write(f"  - {item}\n")
-            f.write("\n")
-            
-            f.write("Recommended Acids:\n")
-            for item in acids:
-                f.write(f"  - {item}\n")
-            f.write("\n")
-            
-            f.write("Foods to Eat:\n")
-            for item in diet.get('eat', []):
-                f.write(f"  - {item}\n")
-            f.write("\n")
-            
-            f.write("Foods to Avoid:\n")
-            for item in diet.get('avoid', []):
-                f.write(f"  - {item}\n")
-        
-        return path
-    
-    # === Optional: Save bar chart of model probabilities ===
-    chart_path = None
-    if probabilities and HAS_MATPLOTLIB and plt is not None:
-        try:
-            chart_path = os.path.join(DOWNLOAD_FOLDER, f"chart_{date_str}.png")
-            plt.figure(figsize=(6, 4))
-            plt.bar(CLASS_NAMES, probabilities, color="#e75480")
-            plt.xlabel("Skin Issues")
-            plt.ylabel("Prediction Confidence")
-            plt.title("Skin Issue Prediction Confidence")
-            plt.tight_layout()
-            plt.savefig(chart_path)
-            plt.close()
-        except Exception:
-            chart_path = None
+
+def logout():
+    session_media.discard(st.session_state.media_id)
+    st.session_state.page = "login"
+    st.session_state.user = None
+
+
+def finish_run():
+    """Record this run's page time once and keep its trace for the next run's debug panel."""
+    global run_finished
+    if not run_finished:
+        run_finished = True
+        tracer.record(f"page.{run_page}", time.perf_counter() - run_started)
+        st.session_state.last_trace = (run_page, tracer.current_trace())
+
+
+def sidebar_logout():
+    """Logout button in the sidebar; both login paths end in logout()."""
+    if authenticator:
+        authenticator.logout("Logout", "sidebar")
+        # The authenticator's button clears authentication_status rather than returning
+        logged_out = not st.session_state.get("authentication_status")
     else:
-        chart_path = None
-
-    # === Generate PDF ===
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="Aura Derm - Skin Analysis Report", ln=True, align="C")
-    pdf.ln(10)
-    pdf.cell(200, 10, txt=f"Date: {now.strftime('%Y-%m-%d %H:%M')}", ln=True)
-    pdf.cell(200, 10, txt=f"User: {username}", ln=True)
-    pdf.set_font("Arial", 'B', size=12)
-    pdf.cell(200, 10, txt=f"Detected Skin Issue: {predicted_class.title()}", ln=True)
-    pdf.set_font("Arial", size=12)
-    pdf.ln(5)
-
-    for section, items in zip(
-        ["Recommended Products", "Recommended Acids", "Foods to Eat", "Foods to Avoid"],
-        [products, acids, diet.get('eat', []), diet.get('avoid', [])]
-    ):
-        pdf.cell(200, 10, txt=section + ":", ln=True)
-        for item in items:
-            if isinstance(item, dict):
-                pdf.cell(200, 10, txt=f" - {item['name']} ({item['type']})", ln=True)
-            else:
-                pdf.cell(200, 10, txt=f" - {item}", ln=True)
-        pdf.ln(2)
+        logged_out = st.sidebar.button("Logout")
+    if logged_out:
+        logout()
+        rerun()
+
 
-    if chart_path and os.path.exists(chart_path):
-        pdf.ln(5)
-        pdf.cell(200, 10, txt="Prediction Confidence Chart:", ln=True)
-        pdf.image(chart_path, x=10, y=None, w=180)
+# st.rerun() / st.stop() end the script by raising, so the timing section at the bottom never runs
+def rerun():
+    finish_run()
+    st.rerun()
 
-    pdf.output(path)
-    return path
+
+def stop():
+    finish_run()
+    st.stop()
 
 # === Aesthetic Styling ===
 st.set_page_config(page_title="Aura Derm", layout="wide")
@@ -317,6 +229,41 @@ if os.path.exists(LOGO_PATH):
 else:
     st.sidebar.title("Aura Derm")
 
+# Only what is already loaded; opening the sidebar never loads the model
+model_stats = service.loaded_stats()
+if model_stats is not None:
+    with st.sidebar.expander("⚙️ Model Info", expanded=False):
+        st.json(model_stats)
+        if INFERENCE_BACKEND == "torch":
+            from inference_modes import PARITY_REPORTS
+            if INFERENCE_MODE in PARITY_REPORTS:
+                st.json({"inference_mode": PARITY_REPORTS[INFERENCE_MODE]})
+        st.json({"inference_cache": get_inference_cache().stats()})
+        st.json({"micro_batcher": service.batcher().stats()})
+        st.json({"report_jobs": get_report_queue(REPORT_WORKERS).stats()})
+        st.json({"prescription_store": prescription_store.stats()})
+        st.json({"session_media": session_media.stats()})
+
+# Filled in at the end of the run, once every stage has been timed
+debug_slot = st.sidebar.empty() if DEBUG_PANEL else None
+
+with st.sidebar.expander("⏱️ Startup", expanded=False):
+    st.json(caps.report())
+
+if st.session_state.user:
+    history = prescription_store.history(st.session_state.user, limit=20)
+    if history:
+        with st.sidebar.expander("📜 My Prescriptions", expanded=False):
+            labels = {
+                f"{datetime.datetime.fromtimestamp(row['created']):%Y-%m-%d %H:%M:%S} - {row['predicted_class'].title()}": row
+                for row in history
+            }
+            choice = st.selectbox("Previous reports", list(labels))
+            # Runs on every rerun: peek, so the sidebar neither counts as a cache hit nor keeps reports from eviction
+            stored = prescription_store.get(labels[choice]["key"], touch=False)
+            if stored is not None:
+                st.download_button("⬇️ Download", stored.data, file_name=stored.filename, mime=stored.mime)
+
 # === Register Section ===
 if st.session_state.register:
     st.markdown('<div class="title">📝 Register</div>', unsafe_allow_html=True)
@@ -324,21 +271,17 @@ if st.session_state.register:
     new_name = st.text_input("Full Name")
     new_password = st.text_input("Password", type="password")
     if st.button("Register"):
-        if new_username in config["credentials"]["usernames"]:
-            st.error("Username already exists.")
+        if not new_username or not new_password:
+            st.error("Username and password are required.")
         else:
-            if HAS_BCRYPT and HAS_YAML:
-                hashed_pw = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
-                config["credentials"]["usernames"][new_username] = {
-                    "name": new_name,
-                    "password": hashed_pw
-                }
-                with open(CONFIG_PATH, "w") as f:
-                    yaml.dump(config, f)
+            try:
+                # One atomic INSERT; a concurrent sign-up for the same name fails here
+                user_store.register(new_username, new_name or new_username, new_password)
+            except UserExistsError:
+                st.error("Username already exists.")
+            else:
                 st.success("✅ Registered Successfully! You can now log in.")
                 st.session_state.register = False
-            else:
-                st.warning("⚠️ Registration unavailable in demo mode. Please use demo credentials.")
 else:
     st.sidebar.button("Register", on_click=lambda: st.session_state.update({"register": True}))
 
@@ -346,16 +289,29 @@ else:
 if st.session_state.page == "login":
     st.markdown('<div class="title">💆‍♀️ Aura Derm</div>', unsafe_allow_html=True)
     
-    if HAS_AUTHENTICATOR and authenticator:
+    if authenticator:
         name, auth_status, username = authenticator.login("Login", location="main")
         if auth_status:
             st.session_state.page = "upload"
             st.session_state.user = name
-            st.rerun()
+            rerun()
         elif auth_status is False:
             st.error("Invalid username or password")
         elif auth_status is None:
             st.warning("Please enter login credentials.")
+    elif user_store.has_credentials():
+        # No streamlit-authenticator: check passwords against the user store directly
+        st.info("📌 Simple login: streamlit-authenticator is not installed.")
+        login_username = st.text_input("Username")
+        login_password = st.text_input("Password", type="password")
+        if st.button("Login"):
+            account = user_store.authenticate(login_username, login_password)
+            if account:
+                st.session_state.page = "upload"
+                st.session_state.user = account["name"]
+                rerun()
+            else:
+                st.error("Invalid username or password")
     else:
         # Simple demo mode without authentication
         st.info("📌 Demo Mode: No authentication configured. Using demo user.")
@@ -363,17 +319,11 @@ if st.session_state.page == "login":
         if st.button("Enter"):
             st.session_state.page = "upload"
             st.session_state.user = demo_user
-            st.rerun()
+            rerun()
 
 # === Upload Page ===
 elif st.session_state.page == "upload":
-    if HAS_AUTHENTICATOR and authenticator:
-        authenticator.logout("Logout", "sidebar")
-    else:
-        if st.sidebar.button("Logout"):
-            st.session_state.page = "login"
-            st.session_state.user = None
-            st.rerun()
+    sidebar_logout()
     
     st.sidebar.success(f"Logged in as {st.session_state.user}")
     st.markdown('<div class="title">💆‍♀️ Upload or Capture Image</div>', unsafe_allow_html=True)
@@ -403,59 +353,91 @@ elif st.session_state.page == "upload":
         """)
     
     input_method = st.radio("Select Image Input", ['📄 Upload Image', '📸 Camera'])
-    image = None
     if input_method == "📄 Upload Image":
-        uploaded = st.file_uploader("Upload face image", type=["jpg", "jpeg", "png"])
-        if uploaded:
-            image = Image.open(uploaded).convert("RGB")
-            st.image(image, caption="Uploaded Image", use_column_width=True)
+        source = st.file_uploader("Upload face image", type=["jpg", "jpeg", "png"])
+        caption = "Uploaded Image"
     else:
-        cam = st.camera_input("Take a clear face photo")
-        if cam:
-            image = Image.open(cam).convert("RGB")
-            st.image(image, caption="Captured Image", use_column_width=True)
-    if image:
-        st.session_state.image = image
+        source = st.camera_input("Take a clear face photo")
+        caption = "Captured Image"
+    if source:
+        upload = source.getvalue()
+        # One reduced-scale decode gives both the model input and the display thumbnail
+        with span("decode"):
+            prepared = prepare_upload(upload, tier=DECODE_TIER)
+        st.image(prepared.thumbnail, caption=caption, use_column_width=True)
+        # Only the compressed bytes and the 224px array outlive this run
+        with span("media.put"):
+            session_media.put(st.session_state.media_id, upload, prepared.model_array)
+        st.session_state.report_job = None
+        st.session_state.report = None
         st.session_state.page = "results"
-        st.rerun()
+        rerun()
 
 # === Results Page ===
 elif st.session_state.page == "results":
-    if HAS_AUTHENTICATOR and authenticator:
-        authenticator.logout("Logout", "sidebar")
-    else:
-        if st.sidebar.button("Logout"):
-            st.session_state.page = "login"
-            st.session_state.user = None
-            st.rerun()
+    sidebar_logout()
     st.sidebar.success(f"Logged in as {st.session_state.user}")
-    image = st.session_state.image
     
-    # Handle both torch and demo modes
-    if HAS_TORCH and model and transform:
-        img_tensor = transform(image).unsqueeze(0)
-        with torch.no_grad():
-            output = model(img_tensor)
-            _, pred = torch.max(output, 1)
-            pred_class = CLASS_NAMES[pred.item()]
-            st.session_state.prediction = pred_class
+    # Handle both inference and demo modes
+    if HAS_INFERENCE:
+        if not os.path.exists(service.weights_path):
+            if INFERENCE_BACKEND == "torch":
+                st.error(f"Model file not found. Please ensure '{os.path.basename(MODEL_PATH)}' exists.")
+            else:
+                st.error("ONNX model not found. Export it with 'python onnx_backend.py export'.")
+            stop()
+        # Read back from the spill directory if it was evicted from memory since the upload
+        with span("media.get"):
+            media = session_media.get(st.session_state.media_id)
+        if media is None:
+            st.warning("⚠️ Your photo is no longer available. Please upload it again.")
+            if st.button("Upload again"):
+                st.session_state.page = "upload"
+                rerun()
+            stop()
+        # Loads the model unless the background prewarm already did. One forward pass per
+        # (image, model version); reruns such as "Generate PDF" reuse the cached probabilities.
+        result = service.classify(media.data, media.model_array)
+        pred_class = result.predicted_class(CLASS_NAMES)
+        probabilities = result.probabilities.tolist()
+        st.session_state.prediction = pred_class
     else:
         # Demo mode: randomly select a skin condition
         pred_class = CLASS_NAMES[0]  # Default to first class in demo mode
         st.info("📌 Demo Mode: Using sample prediction (acne) since ML model unavailable. Real app will analyze your skin condition.")
         st.session_state.prediction = pred_class
-        output = None
+        # Demo mode: use dummy probabilities
+        probabilities = [0.7, 0.15, 0.1, 0.05]
 
     st.markdown(f'<div class="subtitle">🧐 Detected: <span style="color:#e75480">{pred_class.title()}</span></div>', unsafe_allow_html=True)
-    products = get_products(pred_class)
-    acids = get_acids_for_skin_problem(pred_class)
-    diet = get_diet(pred_class)
+    with span("recommend.lookup"):
+        recommendations = lookup_recommendations(pred_class)
+    acids = recommendations["acids"]
+    diet = recommendations["diet"]
+
+    # Rank the whole catalog against the full probability vector, not just the top class
+    catalog = service.catalog()
+    with st.expander("🎯 Personalize Products"):
+        skin_type = st.selectbox("Skin type", ["any"] + list(SKIN_TYPES))
+        budget = st.number_input("Max price per product (0 = no limit)", min_value=0.0, value=0.0, step=5.0)
+        excluded = st.multiselect("Ingredients to avoid", sorted(catalog.vocabulary))
+    with span("recommend.rank"):
+        products = catalog.recommend(
+            probabilities, k=PRODUCT_TOP_K,
+            skin_type=None if skin_type == "any" else skin_type,
+            max_price=budget or None,
+            exclude_ingredients=excluded,
+        )
 
     st.markdown(f'<div class="subtitle">🧴 Recommended Products</div>', unsafe_allow_html=True)
     st.markdown('<div class="section">', unsafe_allow_html=True)
+    if not products:
+        st.warning("No products match these filters.")
     for item in products:
-        if isinstance(item, dict):
+        if isinstance(item, Mapping):
             product_text = f"✔️ **{item['name']}** - {item['type']}"
+            if 'price' in item:
+                product_text += f" - ${item['price']:.2f}"
             if 'brands' in item:
                 product_text += f"\n   *Suggested brands: {item['brands']}*"
             st.markdown(product_text)
@@ -477,31 +459,71 @@ elif st.session_state.page == "results":
 
     st.subheader("📄 Download Prescription")
     if st.button("Generate PDF"):
-        # Calculate probabilities (optional)
-        if HAS_TORCH and output is not None:
-            probabilities = torch.nn.functional.softmax(output, dim=1).numpy().flatten().tolist()
+        key = report_key(
+            pred_class, products, acids, diet,
+            username=st.session_state.user,
+            probabilities=probabilities,
+            class_names=CLASS_NAMES
+        )
+        st.session_state.report_key = key
+        # Identical inputs were rendered before: serve the stored file instead of rendering again
+        with span("report.store_get"):
+            st.session_state.report = prescription_store.get(key)
+        st.session_state.report_job = None
+        if st.session_state.report is None:
+            # Rendered in a worker process; this session only keeps the job handle
+            with span("report.submit"):
+                st.session_state.report_job = get_report_queue(REPORT_WORKERS).submit(
+                    pred_class, products, acids, diet,
+                    username=st.session_state.user,
+                    probabilities=probabilities,
+                    class_names=CLASS_NAMES
+                )
+
+    job = st.session_state.report_job
+    if job is not None:
+        if not job.done():
+            st.info("⏳ Generating your prescription...")
+            time.sleep(0.3)
+            rerun()
+        st.session_state.report_job = None
+        if job.status() == "failed":
+            st.error(f"Report generation failed: {job.error()}")
         else:
-            # Demo mode: use dummy probabilities
-            probabilities = [0.7, 0.15, 0.1, 0.05]
-        
-        if HAS_FPDF:
-            path = generate_pdf(
-                pred_class, products, acids, diet,
-                username=st.session_state.user,
-                probabilities=probabilities
-            )
-            with open(path, "rb") as f:
-                st.download_button("⬇️ Download PDF", f, file_name=os.path.basename(path))
-            st.success(f"Prescription generated: {os.path.basename(path)}")
+            st.session_state.report = job.result()
+            prescription_store.put(st.session_state.report_key, st.session_state.report,
+                                   st.session_state.user, pred_class)
+
+    report = st.session_state.report
+    if report is not None:
+        if report.mime == "application/pdf":
+            st.download_button("⬇️ Download PDF", report.data, file_name=report.filename, mime=report.mime)
+            st.success(f"Prescription generated: {report.filename}")
         else:
-            # Fallback: generate as text file
-            path = generate_pdf(
-                pred_class, products, acids, diet,
-                username=st.session_state.user,
-                probabilities=probabilities
-            )
-            with open(path, "rb") as f:
-                st.download_button("⬇️ Download Report (Text)", f, file_name=os.path.basename(path))
+            st.download_button("⬇️ Download Report (Text)", report.data, file_name=report.filename,
+                               mime=report.mime)
             st.info("📌 PDF generation unavailable - generated text report instead. Install fpdf2 for PDF support.")
 # === Footer ===
 st.markdown("<hr><center>Made with 💗 by Pooja • Aura Derm 2025</center>", unsafe_allow_html=True)
+
+# === Timing ===
+finish_run()
+if debug_slot is not None:
+    with debug_slot.container():
+        with st.expander("🔬 Stage Timings", expanded=False):
+            st.caption("This run")
+            st.table([{"stage": "  " * depth + name, "ms": round(ms, 2)} for name, depth, ms in tracer.current_trace()])
+            if previous_trace:
+                page, trace = previous_trace
+                st.caption(f"Previous run ({page})")
+                st.table([{"stage": "  " * depth + name, "ms": round(ms, 2)} for name, depth, ms in trace])
+            st.caption("All sessions since startup")
+            st.json(tracer.snapshot())
+
+# === Background Prewarm ===
+# The page is out; load what the results page and "Generate PDF" need before the user gets there
+# The first-render time and the prewarm progress are shown in the "⏱️ Startup" report
+caps.mark("first_render")
+if PREWARM:
+    caps.prewarm([INFERENCE_CAPABILITY] if HAS_INFERENCE else [],
+                 then=(service.prewarm, get_report_queue(REPORT_WORKERS).prewarm))
@@ -1,12 +1,67 @@
+import os
+import time
+
 import streamlit as st
 from PIL import Image
 
 st.title("📸 Webcam Camera Test")
 
-camera_image = st.camera_input("Take a selfie")
+mode = st.radio("Mode", ["Snapshot", "Live"], horizontal=True)
+
+if mode == "Snapshot":
+    camera_image = st.camera_input("Take a selfie")
 
-if camera_image:
-    img = Image.open(camera_image)
-    st.image(img, caption="This is your captured photo!")
+    if camera_image:
+        img = Image.open(camera_image)
+        st.image(img, caption="This is your captured photo!")
+    else:
+        st.warning("📷 No image captured. Make sure your camera is working.")
 else:
-    st.warning("📷 No image captured. Make sure your camera is working.")
+    # Live mode reads the camera attached to the machine running Streamlit (cv2), or a video file
+    from analysis_service import AnalysisService
+    from live_analysis import LiveAnalyzer
+
+    backend = st.sidebar.selectbox("Backend", ["torch", "onnx"])
+    weights = st.sidebar.text_input("Weights", os.environ.get("AURA_LIVE_WEIGHTS", "D:/Aura_derm/models/skin_classifier.pth"))
+    source = st.sidebar.text_input("Camera index or video file", "0")
+    target_fps = st.sidebar.slider("Target FPS", 1, 30, 15)
+    running = st.checkbox("▶️ Run live analysis")
+
+    # The analyzer keeps the settings it was built with; any change rebuilds it
+    settings = (backend, weights, source, target_fps)
+    analyzer = st.session_state.get("live_analyzer")
+    if analyzer is not None and (not running or st.session_state.get("live_settings") != settings):
+        analyzer.stop()
+        del st.session_state["live_analyzer"]
+        analyzer = None
+    if not running:
+        st.info("Tick the box to start analyzing the stream.")
+    else:
+        if analyzer is None:
+            service = AnalysisService(backend, weights, f"live_{backend}")
+            if not service.ready():
+                st.error(f"Model not available: check that '{weights}' exists and {backend} is installed.")
+                st.stop()
+            try:
+                analyzer = LiveAnalyzer(lambda array: service.infer_array(array)[1], target_fps=target_fps)
+                analyzer.start(source, loop=not source.isdigit())
+            except OSError as exc:
+                st.error(str(exc))
+                st.stop()
+            st.session_state["live_analyzer"] = analyzer
+            st.session_state["live_settings"] = settings
+
+        frame_slot, result_slot = st.empty(), st.empty()
+        # Redraw until the stream ends; unticking the box reruns the script, which stops the analyzer
+        while analyzer.running():
+            result, frame = analyzer.latest()
+            if result is not None:
+                frame_slot.image(frame, caption=f"Frame {result.frame_index}: {result.label}")
+                with result_slot.container():
+                    for name, p in sorted(result.as_dict()["probabilities"].items(), key=lambda item: -item[1]):
+                        st.progress(min(max(p, 0.0), 1.0), text=f"{name}: {p:.0%}")
+                    st.caption(str(analyzer.stats()))
+            time.sleep(1.0 / target_fps)
+        analyzer.stop()
+        del st.session_state["live_analyzer"]
+        st.warning("📷 Stream ended. Untick and tick the box to restart.")
@@ -0,0 +1,282 @@
+# app/tracing.py
+#
+# Lightweight per-stage timing. Spans are aggregated in-process into one
+# histogram per stage name and exported as Prometheus text or JSON.
+#
+#   with span("decode"):
+#       prepared = prepare_upload(data)
+#
+#   @traced("face_crop.detect")
+#   def detect_faces_batch(...): ...
+#
+# Tracing is off unless AURA_TRACING=1 (or set_enabled(True)); a disabled
+# span() returns a shared no-op context manager, so instrumented code pays one
+# attribute check. Metrics can be written to a file (.prom or .json) on an
+# interval or served over HTTP:
+#
+#   get_tracer().start_exporter("D:/Aura_derm/metrics.prom", interval=15)
+#   get_tracer().serve(9464)                 # GET /metrics (Prometheus), /metrics.json
+#
+#   python tracing.py bench                  # per-span overhead, enabled vs disabled
+
+import argparse
+import bisect
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Histogram bucket upper bounds in seconds (Prometheus convention), plus +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_NAME = "aura_stage_seconds"
+
+_NOOP = contextlib.nullcontext()
+
+
+class StageStats:
+    """Bucket counts, totals and a window of recent durations for one stage."""
+
+    def __init__(self, history=1024):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=history)
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent_ms = np.array(self.recent) * 1000.0
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000.0, 3),
+            "mean_ms": round(self.total / self.count * 1000.0, 3) if self.count else None,
+            "p50_ms": round(float(np.percentile(recent_ms, 50)), 3) if len(recent_ms) else None,
+            "p95_ms": round(float(np.percentile(recent_ms, 95)), 3) if len(recent_ms) else None,
+            "max_ms": round(self.max * 1000.0, 3),
+        }
+
+
+class _Span:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.depth = len(stack)
+        stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.tracer._stack().pop()
+        self.tracer.record(self.name, seconds, self.depth)
+        return False
+
+
+class Tracer:
+    """
+    Process-wide span aggregator. begin_trace() additionally collects the
+    spans of the calling thread (e.g. one Streamlit script run) for display.
+    """
+
+    def __init__(self, enabled=False, history=1024):
+        self.enabled = enabled
+        self.history = history
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._exporter = None
+        self._server = None
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name):
+        return _Span(self, name) if self.enabled else _NOOP
+
+    def record(self, name, seconds, depth=0):
+        """Add one duration to a stage; also usable for times measured elsewhere (e.g. worker processes)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats(self.history)
+            stats.add(seconds)
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.append((name, depth, seconds * 1000.0))
+
+    def begin_trace(self):
+        """Start collecting this thread's spans, dropping any previous trace."""
+        self._local.trace = [] if self.enabled else None
+
+    def current_trace(self):
+        """(stage, depth, ms) for this thread's spans since begin_trace(), in completion order."""
+        return list(getattr(self._local, "trace", None) or ())
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    # === Export ===
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.summary() for name, stats in sorted(self._stages.items())}
+
+    def export_json(self):
+        return json.dumps({"enabled": self.enabled, "stages": self.snapshot()}, indent=2)
+
+    def export_prometheus(self):
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent per processing stage.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            stages = [(name, list(s.buckets), s.total, s.count) for name, s in sorted(self._stages.items())]
+        for name, buckets, total, count in stages:
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), buckets):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {total!r}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to `path`: JSON for *.json, Prometheus text otherwise."""
+        text = self.export_json() if path.endswith(".json") else self.export_prometheus()
+        # Write then rename, so a scraper never reads a partial file
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+    def start_exporter(self, path, interval=15.0):
+        """Rewrite `path` every `interval` seconds on a daemon thread; only the first call starts it."""
+        with self._lock:
+            if self._exporter is not None:
+                return False
+            self._exporter = threading.Thread(
+                target=self._export_loop, args=(path, interval), name="metrics-exporter", daemon=True
+            )
+        self._exporter.start()
+        return True
+
+    def _export_loop(self, path, interval):
+        while True:
+            try:
+                self.write(path)
+            except OSError as exc:
+                print(f"⚠️ Could not write metrics to {path}: {exc}")
+            time.sleep(interval)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread; only the first call binds."""
+        with self._lock:
+            if self._server is not None:
+                return self._server
+            tracer = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.startswith("/metrics.json"):
+                        body, content_type = tracer.export_json(), "application/json"
+                    elif self.path.startswith("/metrics"):
+                        body, content_type = tracer.export_prometheus(), "text/plain; version=0.0.4"
+                    else:
+                        self.send_error(404)
+                        return
+                    data = body.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+            return self._server
+
+
+_tracer = Tracer(enabled=os.environ.get("AURA_TRACING", "0") == "1")
+
+
+def get_tracer():
+    return _tracer
+
+
+def set_enabled(enabled):
+    _tracer.enabled = enabled
+
+
+def span(name):
+    """Context manager timing one stage; a shared no-op when tracing is off."""
+    return _tracer.span(name)
+
+
+def traced(name=None):
+    """Decorator form of span(); the stage name defaults to module.function."""
+    def decorate(func):
+        stage = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(_tracer, stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# === Overhead benchmark ===
+
+def benchmark(iterations=200000):
+    """Nanoseconds per span() on an empty body, disabled and enabled."""
+    tracer = Tracer()
+    results = {"iterations": iterations}
+    for label, enabled in (("disabled", False), ("enabled", True)):
+        tracer.enabled = enabled
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with tracer.span("bench"):
+                pass
+        results[f"{label}_ns_per_span"] = round((time.perf_counter() - start) / iterations * 1e9, 1)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tracing utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Per-span overhead with tracing disabled and enabled")
+    bench.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(benchmark(args.iterations), indent=2))
+
+
+if __name__ == "__main__":
+    main()
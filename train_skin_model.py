@@ -1,13 +1,29 @@
+import argparse
+import json
+import random
+import socket
+import time
+import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.optim as optim
-from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader
+from torchvision import datasets, transforms
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Subset
+from torch.utils.data.distributed import DistributedSampler
 import os
 
+from dataset_cache import MemmapImageDataset, load_or_build_cache
+from main import ARCHITECTURES, SkinClassifier
+
 # ===== Paths =====
 data_dir = "D:/Aura_derm/data set/"
 model_save_path = "D:/Aura_derm/models/skin_classifier.pth"
+cache_dir = "D:/Aura_derm/cache/train"
+checkpoint_dir = "D:/Aura_derm/models/checkpoints"
 
 # ===== Image Transforms =====
 transform = transforms.Compose([
@@ -15,59 +31,385 @@ transform = transforms.Compose([
     transforms.ToTensor()
 ])
 
+# ===== Distillation =====
+def load_teacher(path, arch, num_classes, device):
+    teacher = SkinClassifier(num_classes=num_classes, arch=arch)
+    teacher.load_state_dict(torch.load(path, map_location="cpu"))
+    teacher.eval().requires_grad_(False)
+    return teacher.to(device)
+
+def distillation_loss(student_logits, teacher_logits, labels, alpha, temperature):
+    """Soft-target KL to the teacher (scaled by T^2) mixed with hard-label cross-entropy."""
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.log_softmax(teacher_logits / temperature, dim=1),
+        reduction="batchmean",
+        log_target=True,
+    ) * temperature ** 2
+    hard = F.cross_entropy(student_logits, labels)
+    return alpha * soft + (1 - alpha) * hard
+
+def split_holdout(targets, fraction, seed=0):
+    """
+    (train_indices, holdout) with `fraction` of every class held out of training.
+    holdout is one index list per class; the split only depends on the seed, so
+    every rank computes the same one.
+    """
+    by_class = {}
+    for i, target in enumerate(targets):
+        by_class.setdefault(int(target), []).append(i)
+    rng = random.Random(seed)
+    train_indices, holdout = [], []
+    for _, indices in sorted(by_class.items()):
+        rng.shuffle(indices)
+        count = min(len(indices) - 1, max(1, round(len(indices) * fraction))) if fraction > 0 else 0
+        holdout.append(sorted(indices[:count]))
+        train_indices.extend(indices[count:])
+    return sorted(train_indices), holdout
+
+def _report_samples(dataset, holdout, limit=256):
+    """(images, labels) taken round-robin over the held-out indices of each class."""
+    indices = []
+    for i in range(max(map(len, holdout), default=0)):
+        indices.extend(per_class[i] for per_class in holdout if i < len(per_class))
+    items = [dataset[i] for i in indices[:limit]]
+    batch = torch.stack([image for image, _ in items])
+    labels = torch.tensor([label for _, label in items])
+    return (batch.float().div_(255) if batch.dtype == torch.uint8 else batch), labels
+
 # ===== Load Dataset =====
-dataset = datasets.ImageFolder(root=data_dir, transform=transform)
-class_names = dataset.classes  # Automatically grabs folder names
-print("Detected classes:", class_names)
-
-dataloader = DataLoader(dataset, batch_size=16, shuffle=True)
-
-# ===== Build Model =====
-class SkinClassifier(nn.Module):
-    def __init__(self, num_classes):
-        super(SkinClassifier, self).__init__()
-        self.model = models.resnet18(pretrained=True)
-        self.model.fc = nn.Linear(self.model.fc.in_features, num_classes)
-
-    def forward(self, x):
-        return self.model(x)
-
-model = SkinClassifier(num_classes=len(class_names))
-
-# ===== Training Setup =====
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = model.to(device)
-
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=0.001)
-
-# ===== Train Loop =====
-epochs = 10
-model.train()
-for epoch in range(epochs):
-    running_loss = 0.0
-    correct = 0
-    total = 0
-
-    for images, labels in dataloader:
-        images, labels = images.to(device), labels.to(device)
-
-        optimizer.zero_grad()
-        outputs = model(images)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-
-        running_loss += loss.item()
-        _, predicted = torch.max(outputs, 1)
-        total += labels.size(0)
-        correct += (predicted == labels).sum().item()
-
-    acc = 100 * correct / total
-    print(f"Epoch {epoch+1}/{epochs}, Loss: {running_loss:.4f}, Accuracy: {acc:.2f}%")
-
-# ===== Save Model =====
-torch.save(model.state_dict(), model_save_path)
-print("✅ Model saved to:", model_save_path)
-import streamlit as st
-from PIL import Image   
\ No newline at end of file
+def build_dataloader(args, rank=0, world_size=1):
+    if args.no_cache:
+        dataset = datasets.ImageFolder(root=args.data_dir, transform=transform)
+    else:
+        # Decoded and resized once; later epochs and runs read the memory-mapped shards.
+        # One process per host (local rank 0) builds its own cache, since cache_dir is
+        # usually a local disk; with --shared-cache only global rank 0 builds it.
+        # The other ranks wait for it and then map it.
+        local_rank = int(os.environ.get("LOCAL_RANK", rank))
+        if (rank if args.shared_cache else local_rank) == 0:
+            load_or_build_cache(args.data_dir, args.cache_dir, size=224, workers=args.workers)
+        if world_size > 1:
+            dist.barrier()
+        dataset = MemmapImageDataset(args.cache_dir)
+
+    # Held-out images are never trained on; the distillation report is computed on them
+    holdout_fraction = args.holdout if args.holdout is not None else (0.1 if args.teacher else 0.0)
+    train_indices, holdout = split_holdout(dataset.targets, holdout_fraction, args.seed)
+    train_set = dataset if holdout_fraction <= 0 else Subset(dataset, train_indices)
+
+    sampler = None
+    if world_size > 1:
+        # Each rank sees a disjoint 1/world_size slice, reshuffled every epoch via set_epoch()
+        sampler = DistributedSampler(train_set, num_replicas=world_size, rank=rank, shuffle=True, seed=args.seed)
+    dataloader = DataLoader(
+        train_set,
+        batch_size=args.batch_size,
+        shuffle=sampler is None,
+        sampler=sampler,
+        num_workers=args.workers,
+        persistent_workers=args.workers > 0,
+    )
+    return dataset, dataloader, sampler, holdout
+
+# ===== Distributed =====
+def init_distributed(args, local_rank=None):
+    """
+    Join the gloo process group and return (rank, world_size).
+
+    Processes started by --nproc pass their local_rank; under torchrun the
+    rank and world size come from RANK / WORLD_SIZE / LOCAL_RANK / LOCAL_WORLD_SIZE.
+    Hosts rendezvous through MASTER_ADDR / MASTER_PORT.
+    """
+    if local_rank is not None:
+        rank = args.node_rank * args.nproc + local_rank
+        world_size = args.nnodes * args.nproc
+        local_world_size = args.nproc
+        os.environ["LOCAL_RANK"] = str(local_rank)
+        os.environ.setdefault("MASTER_ADDR", args.master_addr)
+        os.environ.setdefault("MASTER_PORT", str(args.master_port))
+    else:
+        rank = int(os.environ["RANK"])
+        world_size = int(os.environ["WORLD_SIZE"])
+        local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+
+    # Split the cores between the local processes instead of oversubscribing them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    dist.init_process_group("gloo", init_method="env://", rank=rank, world_size=world_size)
+    return rank, world_size
+
+def _distributed_worker(local_rank, args):
+    rank, world_size = init_distributed(args, local_rank)
+    try:
+        train(args, rank, world_size)
+    finally:
+        dist.destroy_process_group()
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# ===== Checkpoints =====
+def save_checkpoint(path, epoch, model, optimizer, class_names):
+    state = {
+        "epoch": epoch,
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "class_names": class_names,
+        "rng": {
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            "numpy": np.random.get_state(),
+            "python": random.getstate(),
+        },
+    }
+    # Write then rename, so a crash mid-save never corrupts the last good checkpoint
+    torch.save(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def read_checkpoint(path):
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+def restore_checkpoint(state, model, optimizer):
+    """Load a checkpoint's weights, optimizer and RNG state; returns the epoch it was saved after."""
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    torch.set_rng_state(state["rng"]["torch"])
+    if state["rng"]["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["rng"]["cuda"])
+    np.random.set_state(state["rng"]["numpy"])
+    random.setstate(state["rng"]["python"])
+    return state["epoch"]
+
+def train(args, rank=0, world_size=1):
+    is_main = rank == 0
+    distributed = world_size > 1
+    # Same seed everywhere, so every rank starts from identical weights
+    torch.manual_seed(args.seed)
+    np.random.seed(args.seed)
+    random.seed(args.seed)
+
+    dataset, dataloader, sampler, holdout = build_dataloader(args, rank, world_size)
+    class_names = dataset.classes  # Automatically grabs folder names
+    if is_main:
+        print("Detected classes:", class_names)
+
+    model = SkinClassifier(num_classes=len(class_names), arch=args.arch, pretrained=True)
+
+    # ===== Training Setup =====
+    # gloo is a CPU backend, so distributed runs always train on the CPU
+    device = torch.device("cuda" if torch.cuda.is_available() and not distributed else "cpu")
+    model = model.to(device)
+
+    teacher = None
+    if args.teacher:
+        teacher = load_teacher(args.teacher, args.teacher_arch, len(class_names), device)
+        if is_main:
+            print(f"Distilling {args.teacher_arch} teacher {args.teacher} into {args.arch} "
+                  f"(alpha={args.kd_alpha}, T={args.kd_temperature})")
+
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+
+    # ===== Resume =====
+    save_outputs = not args.no_save
+    if save_outputs and is_main:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.checkpoint_dir, "last.pt" if args.arch == "resnet18" else f"last_{args.arch}.pt")
+    start_epoch = 0
+    if args.resume:
+        state = read_checkpoint(checkpoint_path) if is_main and os.path.exists(checkpoint_path) else None
+        if distributed:
+            # Only rank 0 writes checkpoints, so other hosts may not have the file: every rank
+            # restores rank 0's copy and weights, optimizer state and start epoch stay in step
+            received = [state]
+            dist.broadcast_object_list(received, src=0)
+            state = received[0]
+        if state is not None:
+            start_epoch = restore_checkpoint(state, model, optimizer)
+            if is_main:
+                print(f"Resumed from {checkpoint_path} after epoch {start_epoch}")
+
+    train_model = DistributedDataParallel(model) if distributed else model
+
+    # ===== Train Loop =====
+    epochs = args.epochs
+    epoch_stats = []
+    train_model.train()
+    for epoch in range(start_epoch, epochs):
+        if sampler is not None:
+            sampler.set_epoch(epoch)
+        epoch_start = time.perf_counter()
+        # Accumulated on the device and read once per epoch, so batches never sync
+        running_loss = torch.zeros((), device=device)
+        correct = torch.zeros((), dtype=torch.long, device=device)
+        total = torch.zeros((), dtype=torch.long, device=device)
+
+        for step, (images, labels) in enumerate(dataloader):
+            if args.max_steps and step >= args.max_steps:
+                break
+            images, labels = images.to(device), labels.to(device)
+            if images.dtype == torch.uint8:
+                # Cached shards hold raw pixels; same scaling as ToTensor()
+                images = images.float().div_(255)
+
+            optimizer.zero_grad()
+            with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=args.bf16):
+                outputs = train_model(images)
+                if teacher is not None:
+                    with torch.no_grad():
+                        teacher_outputs = teacher(images)
+                    loss = distillation_loss(outputs, teacher_outputs, labels, args.kd_alpha, args.kd_temperature)
+                else:
+                    loss = criterion(outputs, labels)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.detach()
+            _, predicted = torch.max(outputs, 1)
+            total += labels.size(0)
+            correct += (predicted == labels).sum()
+
+        if distributed:
+            # One collective per epoch: sum loss, hits and sample counts over all ranks
+            totals = torch.stack([running_loss.double(), correct.double(), total.double()])
+            dist.all_reduce(totals)
+            running_loss, correct, total = totals[0] / world_size, totals[1], totals[2]
+        epoch_time = time.perf_counter() - epoch_start
+        total = int(total.item())
+        acc = 100 * correct.item() / max(total, 1)
+        epoch_stats.append({"epoch": epoch + 1, "seconds": epoch_time, "images_per_sec": total / epoch_time})
+        if is_main:
+            print(f"Epoch {epoch+1}/{epochs}, Loss: {running_loss.item():.4f}, Accuracy: {acc:.2f}%, "
+                  f"Time: {epoch_time:.1f}s, {total / epoch_time:.1f} images/sec")
+
+        if save_outputs and is_main and ((epoch + 1) % args.checkpoint_every == 0 or epoch + 1 == epochs):
+            # model is the unwrapped module, so checkpoints load the same with or without DDP
+            save_checkpoint(checkpoint_path, epoch + 1, model, optimizer, class_names)
+
+    if args.stats_path and is_main:
+        with open(args.stats_path, "w") as f:
+            json.dump({"world_size": world_size, "epochs": epoch_stats}, f)
+
+    # ===== Save Model =====
+    if save_outputs and is_main:
+        torch.save(model.state_dict(), args.model_save_path)
+        print("✅ Model saved to:", args.model_save_path)
+
+        if teacher is not None:
+            from distill_report import compare
+            if not any(holdout):
+                print("⚠️ No held-out images (--holdout 0); the distillation report is in-sample")
+                holdout = split_holdout(dataset.targets, 0.1, args.seed)[1]
+            samples, labels = _report_samples(dataset, holdout)
+            report = compare(teacher.cpu(), model.cpu(), samples, labels=labels)
+            report_path = os.path.splitext(args.model_save_path)[0] + "_report.json"
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Student: {report['student']['params']:,} params ({report['param_ratio']:.1%} of teacher), "
+                  f"{report['speedup_batch1']}x faster at batch 1, "
+                  f"top-1 agreement {report['top1_agreement']:.1%}; report: {report_path}")
+
+def launch(args):
+    """Run train() in this process, under torchrun, or across args.nproc spawned processes."""
+    if args.nproc > 1 or args.nnodes > 1:
+        mp.spawn(_distributed_worker, args=(args,), nprocs=args.nproc, join=True)
+    elif int(os.environ.get("WORLD_SIZE", "1")) > 1:
+        # Started by torchrun, which has already set RANK / WORLD_SIZE / MASTER_*
+        rank, world_size = init_distributed(args)
+        try:
+            train(args, rank, world_size)
+        finally:
+            dist.destroy_process_group()
+    else:
+        train(args)
+
+def scaling_report(args, process_counts):
+    """
+    Train for a few epochs at each local process count and report throughput
+    relative to a single process. Checkpoints and the model file are not written.
+    """
+    results = []
+    for nproc in process_counts:
+        run_args = argparse.Namespace(**vars(args))
+        run_args.nproc, run_args.nnodes, run_args.node_rank = nproc, 1, 0
+        run_args.no_save, run_args.resume = True, False
+        run_args.stats_path = os.path.join(args.checkpoint_dir, f"scaling_{nproc}.json")
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+        # Fresh port per run; the previous group's socket may still be in TIME_WAIT
+        os.environ["MASTER_ADDR"] = "127.0.0.1"
+        os.environ["MASTER_PORT"] = str(_free_port())
+        print(f"--- {nproc} process(es) ---")
+        launch(run_args)
+        with open(run_args.stats_path) as f:
+            stats = json.load(f)
+        os.remove(run_args.stats_path)
+        # The first epoch includes worker start-up; report the last one
+        results.append({"processes": nproc, "images_per_sec": stats["epochs"][-1]["images_per_sec"]})
+
+    base = results[0]["images_per_sec"] / results[0]["processes"]
+    for row in results:
+        row["speedup"] = round(row["images_per_sec"] / results[0]["images_per_sec"], 2)
+        row["efficiency"] = round(row["images_per_sec"] / (base * row["processes"]), 2)
+        row["images_per_sec"] = round(row["images_per_sec"], 1)
+
+    print(f"{'procs':>5} {'images/sec':>11} {'speedup':>8} {'efficiency':>10}")
+    for row in results:
+        print(f"{row['processes']:>5} {row['images_per_sec']:>11} {row['speedup']:>8} {row['efficiency']:>10}")
+    return {"cpu_count": os.cpu_count(), "batch_size": args.batch_size, "epochs": args.epochs, "results": results}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fine-tune the Aura Derm skin classifier.")
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--model-save-path", default=None,
+                        help="Defaults to skin_classifier.pth, or skin_classifier_<arch>.pth for other backbones")
+    parser.add_argument("--arch", default="resnet18", choices=ARCHITECTURES)
+    parser.add_argument("--cache-dir", default=cache_dir)
+    parser.add_argument("--no-cache", action="store_true", help="Decode JPEGs every epoch instead of using the cache")
+    parser.add_argument("--shared-cache", action="store_true",
+                        help="--cache-dir is on a filesystem shared by all hosts: build it once, on rank 0")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--checkpoint-dir", default=checkpoint_dir)
+    parser.add_argument("--checkpoint-every", type=int, default=1, help="Save a checkpoint every N epochs")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint if there is one")
+    parser.add_argument("--bf16", action="store_true", help="Run forward/loss under bfloat16 autocast")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=0, help="Stop each epoch after N batches (0 = full epoch)")
+
+    distill = parser.add_argument_group("knowledge distillation")
+    distill.add_argument("--teacher", default=None, help="Trained classifier weights to distill from")
+    distill.add_argument("--teacher-arch", default="resnet18", choices=ARCHITECTURES)
+    distill.add_argument("--kd-alpha", type=float, default=0.7, help="Weight of the soft-target loss")
+    distill.add_argument("--kd-temperature", type=float, default=4.0)
+    distill.add_argument("--holdout", type=float, default=None,
+                         help="Fraction of each class kept out of training for the report (default 0.1 with --teacher)")
+
+    distributed = parser.add_argument_group("distributed (gloo, CPU)")
+    distributed.add_argument("--nproc", type=int, default=1, help="Training processes to start on this host")
+    distributed.add_argument("--nnodes", type=int, default=1, help="Hosts taking part in the run")
+    distributed.add_argument("--node-rank", type=int, default=0, help="Index of this host, 0 on the master")
+    distributed.add_argument("--master-addr", default=os.environ.get("MASTER_ADDR", "127.0.0.1"))
+    distributed.add_argument("--master-port", type=int, default=int(os.environ.get("MASTER_PORT", "29500")))
+    distributed.add_argument("--scaling-report", default=None, metavar="COUNTS",
+                             help="Comma-separated process counts, e.g. 1,2,4,8; prints throughput vs. processes")
+    distributed.add_argument("--report-path", default=None, help="Write the scaling report as JSON")
+    args = parser.parse_args(argv)
+    if args.model_save_path is None:
+        args.model_save_path = model_save_path if args.arch == "resnet18" else \
+            model_save_path.replace("skin_classifier.pth", f"skin_classifier_{args.arch}.pth")
+    args.no_save = False
+    args.stats_path = None
+
+    if args.scaling_report:
+        report = scaling_report(args, [int(n) for n in args.scaling_report.split(",")])
+        if args.report_path:
+            with open(args.report_path, "w") as f:
+                json.dump(report, f, indent=2)
+    else:
+        launch(args)
+
+if __name__ == "__main__":
+    main()
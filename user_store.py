@@ -0,0 +1,298 @@
+# app/user_store.py
+#
+# SQLite (WAL) user accounts for the app, replacing credential writes to config.yaml.
+#
+# Registrations are single-row atomic INSERTs on a primary-key (case-insensitive)
+# username, so concurrent sign-ups cannot overwrite each other. Existing users
+# are migrated once from config.yaml (streamlit-authenticator format) and
+# user_db.json; a source file is imported again only if it changes.
+#
+#   python user_store.py migrate --db D:/Aura_derm/users.sqlite config.yaml user_db.json
+#   python user_store.py list --db D:/Aura_derm/users.sqlite
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from capabilities import get_capabilities
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY COLLATE NOCASE,
+    name TEXT NOT NULL,
+    email TEXT,
+    password TEXT NOT NULL,
+    skin_type TEXT,
+    created REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email COLLATE NOCASE) WHERE email IS NOT NULL;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+PBKDF2_ITERATIONS = 200000
+BCRYPT_HASH = re.compile(r"^\$2[aby]?\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+
+class UserExistsError(ValueError):
+    pass
+
+
+# === Passwords ===
+
+def hash_password(password):
+    """bcrypt when available (readable by streamlit-authenticator), else salted PBKDF2-SHA256."""
+    caps = get_capabilities()
+    if caps.available("bcrypt"):
+        bcrypt = caps.load("bcrypt")
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ITERATIONS)
+    return "pbkdf2_sha256${}${}${}".format(
+        PBKDF2_ITERATIONS, base64.b64encode(salt).decode(), base64.b64encode(digest).decode()
+    )
+
+
+def check_password(password, hashed):
+    if hashed.startswith("pbkdf2_sha256$"):
+        _, iterations, salt, digest = hashed.split("$")
+        candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+        return hmac.compare_digest(candidate, base64.b64decode(digest))
+    caps = get_capabilities()
+    if not caps.available("bcrypt"):
+        return False
+    try:
+        return caps.load("bcrypt").checkpw(password.encode(), hashed.encode())
+    except ValueError:
+        # Malformed or placeholder hash
+        return False
+
+
+def is_password_hash(hashed):
+    """True for a well-formed bcrypt or PBKDF2 hash (not a placeholder like '$2b$12$abc...xyz')."""
+    if not isinstance(hashed, str):
+        return False
+    if hashed.startswith("pbkdf2_sha256$"):
+        return len(hashed.split("$")) == 4
+    return BCRYPT_HASH.match(hashed) is not None
+
+
+# === Legacy files ===
+
+def _strip_json_comments(text):
+    """Drop // line comments outside of strings (user_db.json carries some)."""
+    return re.sub(r'("(?:\\.|[^"\\])*")|//[^\n]*', lambda m: m.group(1) or "", text)
+
+
+def read_legacy_users(path):
+    """
+    (users, settings) from a legacy file: config.yaml in streamlit-authenticator
+    format, or a user_db.json style {"users": [...]} list. settings holds the
+    non-credential config sections (cookie, preauthorized).
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        # yaml is only needed here, so a migrated install never imports it
+        if not get_capabilities().available("yaml"):
+            raise ImportError("PyYAML is needed to migrate " + path)
+        config = get_capabilities().load("yaml").safe_load(text) or {}
+        users = [
+            {"username": username, "name": entry.get("name", username), "email": entry.get("email"),
+             "password": entry["password"], "skin_type": entry.get("skin_type")}
+            for username, entry in (config.get("credentials", {}).get("usernames") or {}).items()
+        ]
+        settings = {key: value for key, value in config.items() if key != "credentials"}
+        return users, settings
+    data = json.loads(_strip_json_comments(text))
+    users = [
+        {"username": entry.get("username") or entry["email"], "name": entry.get("name", ""),
+         "email": entry.get("email"), "password": entry["password"], "skin_type": entry.get("skin_type")}
+        for entry in data.get("users", [])
+    ]
+    return users, {}
+
+
+class UserStore:
+    """Thread-safe user accounts on one SQLite connection in WAL mode."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._writes = 0
+        self._credentials = None
+        self._credentials_version = None
+
+    def _version(self):
+        # data_version changes when another connection commits; _writes covers our own
+        return self._db.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    def create_user(self, username, name, password_hash, email=None, skin_type=None):
+        """Insert a new user; raises UserExistsError if the username or email is taken."""
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT INTO users (username, name, email, password, skin_type, created) VALUES (?, ?, ?, ?, ?, ?)",
+                    (username, name, email, password_hash, skin_type, time.time()),
+                )
+            except sqlite3.IntegrityError as exc:
+                raise UserExistsError(f"User '{username}' already exists") from exc
+            self._writes += 1
+
+    def register(self, username, name, password, email=None, skin_type=None):
+        self.create_user(username, name, hash_password(password), email, skin_type)
+
+    def get(self, username):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return None if row is None else dict(row)
+
+    def exists(self, username):
+        return self.get(username) is not None
+
+    def authenticate(self, username, password):
+        """The user's record if the password matches, else None."""
+        user = self.get(username)
+        if user is None or not check_password(password, user["password"]):
+            return None
+        return user
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def has_credentials(self):
+        """True if at least one user has a password hash someone can log in with."""
+        with self._lock:
+            cursor = self._db.execute("SELECT password FROM users")
+            return any(is_password_hash(row["password"]) for row in cursor)
+
+    def credentials(self):
+        """
+        Users in streamlit-authenticator's {"usernames": {...}} format. Rebuilt
+        only after a write; each call gets its own copy, since the authenticator
+        mutates it.
+        """
+        with self._lock:
+            version = self._version()
+            if self._credentials is None or version != self._credentials_version:
+                rows = self._db.execute("SELECT username, name, email, password FROM users").fetchall()
+                self._credentials = {
+                    row["username"]: {"name": row["name"], "email": row["email"], "password": row["password"]}
+                    for row in rows
+                }
+                self._credentials_version = version
+            return {"usernames": {username: dict(entry) for username, entry in self._credentials.items()}}
+
+    # === Settings and migration ===
+
+    def get_setting(self, key, default=None):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else json.loads(row["value"])
+
+    def set_setting(self, key, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def migrate(self, path):
+        """
+        Import users from a legacy file unless this exact version was imported
+        before. Existing usernames are kept, and entries without a valid password
+        hash (e.g. the placeholder in user_db.json) are skipped. Returns the
+        number of users added.
+        """
+        stat = os.stat(path)
+        marker = f"migrated:{os.path.abspath(path)}"
+        fingerprint = [stat.st_size, stat.st_mtime_ns]
+        if self.get_setting(marker) == fingerprint:
+            return 0
+        users, settings = read_legacy_users(path)
+        users = [user for user in users if is_password_hash(user["password"])]
+        added = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for user in users:
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO users (username, name, email, password, skin_type, created) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (user["username"], user["name"], user["email"], user["password"], user["skin_type"],
+                         time.time()),
+                    )
+                    added += cursor.rowcount
+                for key, value in settings.items():
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (marker, json.dumps(fingerprint)))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+        return added
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(path, legacy_paths=()):
+    """
+    Process-wide store per database path. Legacy files that exist are migrated
+    on first use; a file that cannot be read is reported and skipped.
+    """
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = UserStore(path)
+                for legacy in legacy_paths:
+                    if not os.path.exists(legacy):
+                        continue
+                    try:
+                        added = store.migrate(legacy)
+                    except (ImportError, ValueError, KeyError) as exc:
+                        print(f"⚠️ Could not migrate users from {legacy}: {exc}")
+                        continue
+                    if added:
+                        print(f"✅ Migrated {added} user(s) from {legacy}")
+                _stores[path] = store
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the Aura Derm user database.")
+    parser.add_argument("--db", default="D:/Aura_derm/users.sqlite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Import users from config.yaml / user_db.json")
+    migrate.add_argument("paths", nargs="+")
+    sub.add_parser("list")
+    args = parser.parse_args(argv)
+
+    store = UserStore(args.db)
+    if args.command == "migrate":
+        for path in args.paths:
+            print(f"{path}: {store.migrate(path)} user(s) added")
+    else:
+        for username in sorted(store.credentials()["usernames"]):
+            user = store.get(username)
+            print(f"{username:<24} {user['name']:<24} {user['email'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
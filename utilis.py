@@ -1,28 +1,12 @@
+from knowledge_base import get_knowledge_base
+
 def get_recommendation(problem):
-    data = {
-        'Acne': {
-            'avoid': ['Sugary foods', 'Dairy'],
-            'eat': ['Zinc-rich foods', 'Green tea'],
-            'products': ['Salicylic acid cleanser', 'Niacinamide serum'],
-            'timing': 'Morning and Night'
-        },
-        'Pigmentation': {
-            'avoid': ['Excessive sun', 'Fried foods'],
-            'eat': ['Vitamin C', 'Papaya'],
-            'products': ['Kojic acid cream', 'Vitamin C serum'],
-            'timing': 'Night'
-        },
-        'Dark_Spots': {
-            'avoid': ['Scrubbing', 'Picking skin'],
-            'eat': ['Citrus fruits', 'Antioxidants'],
-            'products': ['Retinol', 'Glycolic acid cream'],
-            'timing': 'Night'
-        },
-        'Wrinkles': {
-            'avoid': ['Smoking', 'Dehydration'],
-            'eat': ['Omega-3', 'Hyaluronic acid rich foods'],
-            'products': ['Retinoids', 'Peptides serum'],
-            'timing': 'Night'
-        }
+    entry = get_knowledge_base().get(problem)
+    if entry is None:
+        return {}
+    return {
+        'avoid': list(entry['diet']['avoid'] + entry['avoid_habits']),
+        'eat': list(entry['diet']['eat']),
+        'products': [product['name'] for product in entry['products']],
+        'timing': entry['timing']
     }
-    return data.get(problem, {})